@@ -51,13 +51,21 @@ def create_app():
     login_manager.init_app(app)
     mail.init_app(app)
     
+    # Per-request time budget for outbound calls
+    from app.utils import deadline, identity, order_code, query_budget
+    deadline.init_app(app)
+    order_code.init_app(app)
+    query_budget.init_app(app)
+    identity.init_app(app)
+    
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Vui lòng đăng nhập để truy cập trang này.'
     login_manager.login_message_category = 'info'
     
     # Import models
-    from app.models import User, Payment
+    from app.models import User, Payment, WebhookInbox, DailyStat, UserEmailTrigram, AdminAuditLog, EmailOutbox
+    from app.utils import user_search  # keeps user_email_trigrams in sync with users.email
       # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
@@ -71,6 +79,22 @@ def create_app():
     app.register_blueprint(admin_bp)
     app.register_blueprint(test_bp)
     
+    # Background consumer for stored PayOS webhooks (one per worker process)
+    if app.config.get('WEBHOOK_INBOX_CONSUMER'):
+        from app.utils.webhook_inbox import start_consumer
+        
+        @app.before_request
+        def ensure_webhook_consumer():
+            start_consumer(app)
+    
+    # Delivery workers for queued transactional emails (threads in each worker process)
+    if app.config.get('EMAIL_OUTBOX_WORKERS'):
+        from app.utils.outbox import start_workers
+        
+        @app.before_request
+        def ensure_outbox_workers():
+            start_workers(app)
+    
     # Create database tables (wrapped to avoid crash if DB unreachable)
     skip_db_init = os.environ.get('SKIP_DB_INIT', 'False').lower() in ['1', 'true', 'yes']
     if not skip_db_init:
@@ -86,5 +110,6 @@ def create_app():
 
 @login_manager.user_loader
 def load_user(user_id):
-    from app.models import User
-    return User.query.get(int(user_id))
+    # Chỉ các cột cần cho current_user, lấy từ cache theo phiên bản (xem app.utils.identity)
+    from app.utils.identity import load_identity
+    return load_identity(int(user_id))
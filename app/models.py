@@ -1,10 +1,10 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
 from app import db
+from app.utils import passwords
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -21,13 +21,22 @@ class User(UserMixin, db.Model):
     # Relationship
     payments = db.relationship('Payment', backref='user', lazy=True)
     
+    __table_args__ = (
+        # Keyset pagination of the admin user list
+        db.Index('ix_users_created', 'created_at', 'id'),
+    )
+    
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password (configured scheme, computed in the hashing pool)"""
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Stored hash uses another scheme or cost than PASSWORD_HASH_METHOD"""
+        return passwords.needs_rehash(self.password_hash)
     
     def generate_verification_token(self):
         """Generate email verification token"""
@@ -39,6 +48,11 @@ class User(UserMixin, db.Model):
         serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
         return serializer.dumps(self.email, salt='password-reset')
     
+    def generate_activation_token(self):
+        """Generate the token of an imported account's activation link"""
+        serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+        return serializer.dumps(self.email, salt='account-activation')
+    
     @staticmethod
     def verify_verification_token(token, max_age=3600):
         """Verify email verification token"""
@@ -59,6 +73,16 @@ class User(UserMixin, db.Model):
         except:
             return None
     
+    @staticmethod
+    def verify_activation_token(token, max_age=604800):
+        """Verify account activation token"""
+        serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+        try:
+            email = serializer.loads(token, salt='account-activation', max_age=max_age)
+            return User.query.filter_by(email=email).first()
+        except:
+            return None
+    
     def can_download(self):
         """Check if user can download the app"""
         return self.is_verified and self.has_paid
@@ -68,6 +92,14 @@ class User(UserMixin, db.Model):
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        # Keyset pagination of a user's payment history
+        db.Index('ix_payments_user_created', 'user_id', 'created_at', 'id'),
+        # Keyset pagination of the admin payment list
+        db.Index('ix_payments_created', 'created_at', 'id'),
+        # Revenue / paid counts over completed_at ranges (time_ranges.paid_between)
+        db.Index('ix_payments_status_completed', 'status', 'completed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -78,6 +110,109 @@ class Payment(db.Model):
     status = db.Column(db.String(50), nullable=False)  # PAID, PENDING, CANCELLED, etc.
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
+    checkout_url = db.Column(db.String(512))  # PayOS hosted checkout link
+    checkout_expires_at = db.Column(db.DateTime)  # Link validity (UTC)
+    
+    @staticmethod
+    def find_reusable_checkout(user_id, amount):
+        """Return the user's latest PENDING payment whose checkout link is still valid"""
+        return Payment.query.filter(
+            Payment.user_id == user_id,
+            Payment.status == 'PENDING',
+            Payment.amount == amount,
+            Payment.checkout_url.isnot(None),
+            Payment.checkout_expires_at > datetime.utcnow()
+        ).order_by(Payment.id.desc()).first()
     
     def __repr__(self):
         return f'<Payment {self.payos_order_id}: {self.status}>'
+
+class WebhookInbox(db.Model):
+    """PayOS webhook bodies, stored on receipt and applied by a background consumer"""
+    __tablename__ = 'webhook_inbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_code = db.Column(db.String(255), index=True)
+    payload = db.Column(db.Text, nullable=False)  # Raw JSON body
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.String(255))
+    
+    def __repr__(self):
+        return f'<WebhookInbox {self.id}: {self.order_code}>'
+
+class DailyStat(db.Model):
+    """Per-day rollup of registrations, verifications and payments for admin statistics"""
+    __tablename__ = 'daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)  # UTC day
+    new_users = db.Column(db.Integer, default=0, nullable=False)  # by users.created_at
+    verified_users = db.Column(db.Integer, default=0, nullable=False)  # by users.verified_at
+    paid_payments = db.Column(db.Integer, default=0, nullable=False)  # PAID, by payments.completed_at
+    revenue = db.Column(db.BigInteger, default=0, nullable=False)  # VND, PAID, by payments.completed_at
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DailyStat {self.day}>'
+
+class UserEmailTrigram(db.Model):
+    """Trigram postings of users.email for indexed substring search (see app.utils.user_search)"""
+    __tablename__ = 'user_email_trigrams'
+    
+    trigram = db.Column(db.String(3), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, index=True)
+    
+    def __repr__(self):
+        return f'<UserEmailTrigram {self.trigram} {self.user_id}>'
+
+class AdminAuditLog(db.Model):
+    """Admin actions (who did what to whom), written in batches by app.utils.audit"""
+    __tablename__ = 'admin_audit_log'
+    __table_args__ = (
+        # Keyset pagination of the audit view, alone or filtered by actor / action / target
+        db.Index('ix_admin_audit_created', 'created_at', 'id'),
+        db.Index('ix_admin_audit_actor', 'actor_email', 'created_at', 'id'),
+        db.Index('ix_admin_audit_action', 'action', 'created_at', 'id'),
+        db.Index('ix_admin_audit_target', 'target_type', 'target_id', 'created_at', 'id'),
+    )
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # When the action happened
+    actor_id = db.Column(db.Integer)  # No FK: entries outlive deleted users
+    actor_email = db.Column(db.String(120))
+    action = db.Column(db.String(50), nullable=False)  # e.g. user.toggle_verified, users.bulk_verify
+    target_type = db.Column(db.String(20))  # user, users, export
+    target_id = db.Column(db.Integer)
+    target_label = db.Column(db.String(255))  # Email or summary at the time of the action
+    before_state = db.Column(db.Text)  # JSON
+    after_state = db.Column(db.Text)  # JSON
+    ip_address = db.Column(db.String(45))
+    
+    def __repr__(self):
+        return f'<AdminAuditLog {self.id}: {self.action}>'
+
+class EmailOutbox(db.Model):
+    """Transactional emails, queued in the transaction that needs them and sent by app.utils.outbox"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # Delivery workers claim PENDING rows whose next attempt is due, oldest first
+        db.Index('ix_email_outbox_due', 'status', 'next_attempt_at', 'id'),
+    )
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)  # verification, reset
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_content = db.Column(db.Text, nullable=False)  # Rendered when queued
+    text_content = db.Column(db.Text)
+    status = db.Column(db.String(20), default='PENDING', nullable=False)  # PENDING, SENT, FAILED
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Also the claim lease
+    lease_token = db.Column(db.String(32))  # Worker currently holding the row
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime)
+    error = db.Column(db.String(255))
+    
+    def __repr__(self):
+        return f'<EmailOutbox {self.id}: {self.kind} to {self.to_email}>'
@@ -1,13 +1,21 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from functools import wraps
 from app import db
-from app.models import User, Payment
-from datetime import datetime, timedelta
-from sqlalchemy import func, extract
+from app.models import User, Payment, AdminAuditLog
+from datetime import datetime
+from sqlalchemy import select
+from app.utils.stats import cached_cohort_report, cached_dashboard_stats, list_total
+from app.utils.pagination import keyset_paginate
+from app.utils.query_budget import query_budget
+from app.utils import audit, bulk_actions, events, export, identity, rollup, user_import, user_search
+from app.utils.time_ranges import between
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+ADMIN_PER_PAGE = 20
+AUDIT_MAX_IDS = 500  # user ids per audit entry of a bulk action
+
 def admin_required(f):
     """Decorator để kiểm tra quyền admin"""
     @wraps(f)
@@ -15,178 +23,278 @@ def admin_required(f):
         if not current_user.is_authenticated or not current_user.is_admin:
             flash('Bạn không có quyền truy cập trang này.', 'error')
             return redirect(url_for('main.index'))
+        # current_user có thể là bản cache: quyền admin vừa bị thu hồi phải có hiệu lực ngay
+        if not db.session.scalar(select(User.is_admin).where(User.id == current_user.id)):
+            flash('Bạn không có quyền truy cập trang này.', 'error')
+            return redirect(url_for('main.index'))
         return f(*args, **kwargs)
     return decorated_function
 
+def _user_filters(args):
+    """Conditions for the verified/paid/search filters of the user list"""
+    filters = []
+    filter_verified = args.get('verified')
+    filter_paid = args.get('paid')
+    search = args.get('search', '').strip()
+    
+    if filter_verified == 'true':
+        filters.append(User.is_verified == True)
+    elif filter_verified == 'false':
+        filters.append(User.is_verified == False)
+        
+    if filter_paid == 'true':
+        filters.append(User.has_paid == True)
+    elif filter_paid == 'false':
+        filters.append(User.has_paid == False)
+        
+    if search:
+        filters.append(user_search.email_condition(search))
+    
+    return filters
+
+def _payment_filters(args):
+    """Conditions for the status/search filters of the payment list (search needs a JOIN to users)"""
+    filters = []
+    filter_status = args.get('status')
+    search = args.get('search', '').strip()
+    
+    if filter_status:
+        filters.append(Payment.status == filter_status)
+        
+    if search:
+        # Search by order ID or user email
+        filters.append(db.or_(
+            Payment.payos_order_id.contains(search),
+            User.email.contains(search)
+        ))
+    
+    return filters
+
 @admin_bp.route('/dashboard')
+@query_budget(4)
 @login_required
 @admin_required
 def dashboard():
     """Trang dashboard admin"""
-    # Thống kê tổng quan
-    total_users = User.query.count()
-    verified_users = User.query.filter_by(is_verified=True).count()
-    paid_users = User.query.filter_by(has_paid=True).count()
-    total_payments = Payment.query.filter_by(status='PAID').count()
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(status='PAID').scalar() or 0
-    
-    # Thống kê hôm nay
-    today = datetime.utcnow().date()
-    today_users = User.query.filter(func.date(User.created_at) == today).count()
-    today_payments = Payment.query.filter(
-        func.date(Payment.completed_at) == today,
-        Payment.status == 'PAID'
-    ).count()
-    today_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        func.date(Payment.completed_at) == today,
-        Payment.status == 'PAID'
-    ).scalar() or 0
-    
-    # Thống kê 30 ngày gần nhất
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_users = User.query.filter(User.created_at >= thirty_days_ago).count()
-    recent_payments = Payment.query.filter(
-        Payment.completed_at >= thirty_days_ago,
-        Payment.status == 'PAID'
-    ).count()
-    recent_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.completed_at >= thirty_days_ago,
-        Payment.status == 'PAID'
-    ).scalar() or 0
-    
-    stats = {
-        'total_users': total_users,
-        'verified_users': verified_users,
-        'paid_users': paid_users,
-        'total_payments': total_payments,
-        'total_revenue': total_revenue,
-        'today_users': today_users,
-        'today_payments': today_payments,
-        'today_revenue': today_revenue,
-        'recent_users': recent_users,
-        'recent_payments': recent_payments,
-        'recent_revenue': recent_revenue
-    }
-    
-    return render_template('admin/dashboard.html', stats=stats)
+    # Thống kê tổng quan, hôm nay và 30 ngày gần nhất (cache ngắn hạn trong worker)
+    stats, event_id = cached_dashboard_stats(ttl=current_app.config.get('ADMIN_STATS_TTL', 30))
+    
+    return render_template('admin/dashboard.html', stats=stats, event_id=event_id)
+
+@admin_bp.route('/events')
+@query_budget(1)
+@login_required
+@admin_required
+def event_stream():
+    """Luồng sự kiện (Server-Sent Events) cho dashboard: đăng ký, xác thực, thanh toán"""
+    if not events.bus.try_subscribe(current_app.config.get('ADMIN_EVENTS_MAX_SUBSCRIBERS', 4)):
+        # Hết chỗ trong worker này; EventSource sẽ tự kết nối lại sau
+        return Response('retry: 10000\n\n', status=503, mimetype='text/event-stream')
+    
+    last_id = events.bus.resume_point(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    stream = events.sse_stream(last_id, max_seconds=current_app.config.get('ADMIN_EVENTS_MAX_SECONDS', 25))
+    response = Response(stream, mimetype='text/event-stream')
+    response.call_on_close(events.bus.unsubscribe)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @admin_bp.route('/users')
+@query_budget(5)
 @login_required
 @admin_required
 def users():
     """Danh sách người dùng"""
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
+    cursor = request.args.get('cursor')
     
     # Filter options
     filter_verified = request.args.get('verified')
     filter_paid = request.args.get('paid')
     search = request.args.get('search', '').strip()
     
-    query = User.query
+    query = User.query.filter(*_user_filters(request.args))
     
-    # Apply filters
-    if filter_verified == 'true':
-        query = query.filter_by(is_verified=True)
-    elif filter_verified == 'false':
-        query = query.filter_by(is_verified=False)
-        
-    if filter_paid == 'true':
-        query = query.filter_by(has_paid=True)
-    elif filter_paid == 'false':
-        query = query.filter_by(has_paid=False)
-        
-    if search:
-        query = query.filter(User.email.contains(search))
-    
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    users = keyset_paginate(query, User.created_at, User.id, cursor=cursor, per_page=ADMIN_PER_PAGE)
+    total = list_total(
+        ('users', filter_verified, filter_paid), query,
+        table_name=None if filter_verified or filter_paid else 'users',
+        search=bool(search), ttl=current_app.config.get('ADMIN_COUNT_TTL', 60)
     )
     
-    return render_template('admin/users.html', users=users, 
+    return render_template('admin/users.html', users=users, total=total,
                          filter_verified=filter_verified, 
                          filter_paid=filter_paid, 
                          search=search)
 
 @admin_bp.route('/statistics')
+@query_budget(3)
 @login_required
 @admin_required
 def statistics():
     """Thống kê chi tiết"""
-    # Thống kê theo tháng (12 tháng gần nhất)
-    monthly_stats = []
-    for i in range(12):
-        date = datetime.utcnow() - timedelta(days=30 * i)
-        month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if i == 0:
-            month_end = datetime.utcnow()
-        else:
-            next_month = month_start.replace(month=month_start.month + 1) if month_start.month < 12 else month_start.replace(year=month_start.year + 1, month=1)
-            month_end = next_month - timedelta(seconds=1)
-        
-        payments_count = Payment.query.filter(
-            Payment.completed_at >= month_start,
-            Payment.completed_at <= month_end,
-            Payment.status == 'PAID'
-        ).count()
-        
-        revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.completed_at >= month_start,
-            Payment.completed_at <= month_end,
-            Payment.status == 'PAID'
-        ).scalar() or 0
-        
-        new_users = User.query.filter(
-            User.created_at >= month_start,
-            User.created_at <= month_end
-        ).count()
-        
-        monthly_stats.append({
-            'month': month_start.strftime('%m/%Y'),
-            'payments_count': payments_count,
-            'revenue': revenue,
-            'new_users': new_users
-        })
+    # Thống kê theo tháng (12 tháng gần nhất), đọc từ bảng tổng hợp daily_stats
+    monthly_stats = rollup.monthly_totals(months=12)
     
-    monthly_stats.reverse()  # Hiển thị từ tháng cũ đến mới
+    # Phễu đăng ký -> xác thực -> thanh toán theo tuần (một truy vấn GROUP BY, có cache)
+    cohorts, cohorts_at = cached_cohort_report(
+        weeks=current_app.config.get('ADMIN_COHORT_WEEKS', 12),
+        ttl=current_app.config.get('ADMIN_COHORT_TTL', 600)
+    )
     
-    return render_template('admin/statistics.html', monthly_stats=monthly_stats)
+    return render_template('admin/statistics.html', monthly_stats=monthly_stats,
+                           cohorts=cohorts, cohorts_at=cohorts_at)
 
 @admin_bp.route('/payments')
+@query_budget(4)
 @login_required
 @admin_required
 def payments():
     """Danh sách giao dịch"""
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
+    cursor = request.args.get('cursor')
     
     # Filter options
     filter_status = request.args.get('status')
     search = request.args.get('search', '').strip()
     
-    query = Payment.query
+    filters = _payment_filters(request.args)
     
-    # Apply filters
-    if filter_status:
-        query = query.filter_by(status=filter_status)
-        
-    if search:
-        # Search by order ID or user email
-        query = query.join(User).filter(
-            db.or_(
-                Payment.payos_order_id.contains(search),
-                User.email.contains(search)
-            )
-        )
-    
-    payments = query.order_by(Payment.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    # Chỉ lấy các cột trang hiển thị, kèm email/quyền admin của user qua JOIN (không N+1)
+    query = db.session.query(
+        Payment.id,
+        Payment.payos_order_id,
+        Payment.payos_transaction_id,
+        Payment.amount,
+        Payment.currency,
+        Payment.status,
+        Payment.created_at,
+        Payment.completed_at,
+        User.email.label('user_email'),
+        User.is_admin.label('user_is_admin')
+    ).join(User, Payment.user_id == User.id).filter(*filters)
+    
+    payments = keyset_paginate(query, Payment.created_at, Payment.id, cursor=cursor, per_page=ADMIN_PER_PAGE)
+    count_query = Payment.query.join(User).filter(*filters) if search else Payment.query.filter(*filters)
+    total = list_total(
+        ('payments', filter_status), count_query,
+        table_name=None if filter_status else 'payments',
+        search=bool(search), ttl=current_app.config.get('ADMIN_COUNT_TTL', 60)
     )
     
-    return render_template('admin/payments.html', payments=payments,
+    return render_template('admin/payments.html', payments=payments, total=total,
                          filter_status=filter_status, search=search)
 
+def _export_response(kind, filters, date_column):
+    """Streamed CSV/NDJSON download of a filtered list, limited to ?from=&to= (YYYY-MM-DD)"""
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('gzip') in ('1', 'true')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    try:
+        start, end = export.parse_date_range(request.args.get('from'), request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    filters = filters + between(date_column, start, end)
+    
+    current_app.logger.info(f'📤 [EXPORT] {current_user.email} exporting {kind} ({fmt}{", gzip" if compress else ""})')
+    audit.record(f'export.{kind}', target_type='export', target_label=request.query_string.decode('utf-8', 'replace'),
+                 after={'format': fmt, 'gzip': compress, 'filters': request.args.to_dict()})
+    
+    chunks = export.stream_export(kind, filters, fmt=fmt, compress=compress)
+    response = Response(stream_with_context(chunks),
+                        content_type='application/gzip' if compress else export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename={export.export_filename(kind, fmt, compress)}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@admin_bp.route('/export/users')
+@query_budget(2)
+@login_required
+@admin_required
+def export_users():
+    """Xuất danh sách người dùng (cùng bộ lọc với trang người dùng, lọc ngày theo created_at)"""
+    return _export_response('users', _user_filters(request.args), User.created_at)
+
+@admin_bp.route('/export/payments')
+@query_budget(2)
+@login_required
+@admin_required
+def export_payments():
+    """Xuất danh sách giao dịch (cùng bộ lọc với trang giao dịch, lọc ngày theo created_at)"""
+    return _export_response('payments', _payment_filters(request.args), Payment.created_at)
+
+BULK_ACTION_LABELS = {
+    'verify': 'xác thực',
+    'unverify': 'bỏ xác thực',
+    'grant': 'cấp quyền tải',
+    'revoke': 'thu hồi quyền tải',
+}
+
+@admin_bp.route('/users/bulk', methods=['POST'])
+@query_budget(60)
+@login_required
+@admin_required
+def bulk_users():
+    """Thao tác hàng loạt trên nhiều user (UPDATE theo lô, bỏ qua admin)"""
+    data = request.get_json(silent=True) if request.is_json else None
+    if data is not None:
+        action, user_ids = data.get('action'), data.get('user_ids') or []
+    else:
+        action, user_ids = request.form.get('action'), request.form.getlist('user_ids')
+    
+    try:
+        result = bulk_actions.apply_bulk_action(action, user_ids)
+    except ValueError as e:
+        if data is not None:
+            return jsonify({'error': str(e)}), 400
+        flash('Thao tác không hợp lệ', 'error')
+        return redirect(request.referrer or url_for('admin.users'))
+    
+    # Một entry cho mỗi AUDIT_MAX_IDS user thực sự bị đổi, trước/sau là giá trị cột
+    column, value = bulk_actions.ACTIONS[action]
+    changed_ids = result.pop('user_ids')
+    for start in range(0, len(changed_ids), AUDIT_MAX_IDS):
+        batch = changed_ids[start:start + AUDIT_MAX_IDS]
+        audit.record(f'users.bulk_{action}', target_type='users',
+                     target_label=f'{len(batch)} users ({result["affected"]}/{result["requested"]} updated)',
+                     before={column: not value, 'user_ids': batch},
+                     after={column: value, 'user_ids': batch})
+    
+    if data is not None:
+        return jsonify(result)
+    
+    skipped = result['requested'] - result['affected']
+    message = f'Đã {BULK_ACTION_LABELS[action]} {result["affected"]}/{result["requested"]} người dùng'
+    if skipped:
+        message += f' ({skipped} bỏ qua: admin hoặc đã ở trạng thái này)'
+    flash(message, 'success')
+    return redirect(request.referrer or url_for('admin.users'))
+
+@admin_bp.route('/users/import', methods=['GET', 'POST'])
+@query_budget(1)
+@login_required
+@admin_required
+def import_users():
+    """Nhập người dùng từ file CSV (chạy nền, xem tiến độ trên trang này)"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename.lower().endswith('.csv'):
+            flash('Vui lòng chọn file .csv', 'error')
+            return redirect(url_for('admin.import_users'))
+        
+        send_emails = request.form.get('send_emails') == 'on'
+        job = user_import.start_job(upload, send_emails=send_emails)
+        audit.record('users.import', target_type='users', target_label=upload.filename,
+                     after={'job': job['id'], 'send_emails': send_emails})
+        
+        flash(f'Đang nhập {upload.filename} ở nền. Tải lại trang để xem tiến độ.', 'success')
+        return redirect(url_for('admin.import_users'))
+    
+    return render_template('admin/import.html', jobs=user_import.recent_jobs())
+
 @admin_bp.route('/user/<int:user_id>/toggle-verified')
+@query_budget(5)
 @login_required
 @admin_required
 def toggle_user_verified(user_id):
@@ -199,6 +307,13 @@ def toggle_user_verified(user_id):
     user.is_verified = not user.is_verified
     if user.is_verified:
         user.verified_at = datetime.utcnow()
+        rollup.record_verification(user.verified_at)
+    elif user.verified_at:
+        rollup.record_verification(user.verified_at, delta=-1)
+    events.publish_after_commit(events.USER_VERIFIED, delta=1 if user.is_verified else -1, email=user.email)
+    identity.invalidate_after_commit(user.id)
+    audit.record_after_commit('user.toggle_verified', target_type='user', target_id=user.id, target_label=user.email,
+                              before={'is_verified': not user.is_verified}, after={'is_verified': user.is_verified})
     
     db.session.commit()
     status = 'đã xác thực' if user.is_verified else 'chưa xác thực'
@@ -206,6 +321,7 @@ def toggle_user_verified(user_id):
     return redirect(url_for('admin.users'))
 
 @admin_bp.route('/user/<int:user_id>/toggle-paid')
+@query_budget(4)
 @login_required
 @admin_required
 def toggle_user_paid(user_id):
@@ -216,8 +332,53 @@ def toggle_user_paid(user_id):
         return redirect(url_for('admin.users'))
     
     user.has_paid = not user.has_paid
+    events.publish_after_commit(events.USER_PAID, delta=1 if user.has_paid else -1)
+    identity.invalidate_after_commit(user.id)
+    audit.record_after_commit('user.toggle_paid', target_type='user', target_id=user.id, target_label=user.email,
+                              before={'has_paid': not user.has_paid}, after={'has_paid': user.has_paid})
     db.session.commit()
     
     status = 'đã thanh toán' if user.has_paid else 'chưa thanh toán'
     flash(f'Đã cập nhật trạng thái user {user.email} thành {status}', 'success')
     return redirect(url_for('admin.users'))
+
+def _audit_filters(args):
+    """Conditions for the action/actor/target/date filters of the audit log"""
+    filters = []
+    action = args.get('action')
+    actor = args.get('actor', '').strip()
+    target = args.get('target', '').strip()
+    
+    if action:
+        filters.append(AdminAuditLog.action == action)
+    if actor:
+        filters.append(AdminAuditLog.actor_email == actor)
+    if target.isdigit():
+        filters.append(AdminAuditLog.target_type == 'user')
+        filters.append(AdminAuditLog.target_id == int(target))
+    
+    start, end = export.parse_date_range(args.get('from'), args.get('to'))
+    return filters + between(AdminAuditLog.created_at, start, end)
+
+@admin_bp.route('/audit')
+@query_budget(2)
+@login_required
+@admin_required
+def audit_log():
+    """Nhật ký thao tác của admin"""
+    cursor = request.args.get('cursor')
+    
+    try:
+        filters = _audit_filters(request.args)
+    except ValueError:
+        flash('Ngày phải có dạng YYYY-MM-DD', 'error')
+        return redirect(url_for('admin.audit_log'))
+    
+    query = AdminAuditLog.query.filter(*filters)
+    entries = keyset_paginate(query, AdminAuditLog.created_at, AdminAuditLog.id,
+                              cursor=cursor, per_page=ADMIN_PER_PAGE)
+    
+    filter_args = {name: request.args.get(name) for name in ('action', 'actor', 'target', 'from', 'to')
+                   if request.args.get(name)}
+    return render_template('admin/audit.html', entries=entries, actions=audit.ACTIONS,
+                           filter_args=filter_args)
@@ -1,9 +1,9 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash
 from app import db
 from app.models import User
-from app.utils.email import send_email
+from app.utils import rate_limit
+from app.utils import events, identity, outbox, passwords, rollup
 from datetime import datetime, timezone, timedelta
 import re
 
@@ -32,14 +32,12 @@ def validate_password(password):
         return False, "Mật khẩu phải có ít nhất 1 số"
     return True, "Mật khẩu hợp lệ"
 
-def send_verification_email(user):
-    """Send email verification using Brevo API"""
+def queue_verification_email(user):
+    """Queue the email verification message in the current transaction (sent by app.utils.outbox)"""
     try:
-        current_app.logger.info(f"🔵 [VERIFICATION EMAIL] Starting verification email process for user: {user.email}")
+        current_app.logger.info(f"🔵 [VERIFICATION EMAIL] Queuing verification email for user: {user.email}")
         
         token = user.generate_verification_token()
-        current_app.logger.info(f"🔵 [VERIFICATION EMAIL] Token generated successfully for {user.email}")
-        
         verification_url = url_for('auth.verify_email', token=token, _external=True)
         current_app.logger.info(f"🔵 [VERIFICATION EMAIL] Verification URL: {verification_url}")
         
@@ -50,38 +48,28 @@ def send_verification_email(user):
                                        verification_url=verification_url,
                                        current_time_vn=current_time_vn)
         
-        current_app.logger.info(f"🔵 [VERIFICATION EMAIL] Email template rendered for {user.email}")
-        
-        # Send email using new email utility (Brevo API with SMTP fallback)
-        result = send_email(
+        # Delivered after commit by the outbox workers (Brevo API with SMTP fallback)
+        outbox.enqueue(
             to_email=user.email,
             subject='Xác thực tài khoản Mahika của bạn',
             html_content=html_content,
-            text_content=f'Vui lòng truy cập liên kết sau để xác thực tài khoản: {verification_url}'
+            text_content=f'Vui lòng truy cập liên kết sau để xác thực tài khoản: {verification_url}',
+            kind='verification'
         )
-        
-        if result['success']:
-            current_app.logger.info(f"✅ [VERIFICATION EMAIL] Email sent successfully for {user.email}")
-            return True
-        else:
-            current_app.logger.error(f"❌ [VERIFICATION EMAIL] Failed to send email for {user.email}: {result['message']}")
-            return False
+        return True
             
     except Exception as e:
         current_app.logger.error(f'❌ [VERIFICATION EMAIL] Error preparing verification email for {user.email}')
         current_app.logger.error(f'❌ [VERIFICATION EMAIL] Error: {str(e)}', exc_info=True)
         return False
 
-def send_reset_email(user):
-    """Send password reset email using Brevo API"""
+def queue_reset_email(user):
+    """Queue the password reset message in the current transaction (sent by app.utils.outbox)"""
     try:
-        current_app.logger.info(f"🔵 [RESET EMAIL] Starting password reset email process for user: {user.email}")
+        current_app.logger.info(f"🔵 [RESET EMAIL] Queuing password reset email for user: {user.email}")
         
         token = user.generate_reset_token()
-        current_app.logger.info(f"🔵 [RESET EMAIL] Token generated successfully for {user.email}")
-        
         reset_url = url_for('auth.reset_password', token=token, _external=True)
-        current_app.logger.info(f"🔵 [RESET EMAIL] Reset URL: {reset_url}")
         
         current_time_vn = get_vietnam_time()
         
@@ -90,28 +78,35 @@ def send_reset_email(user):
                                        reset_url=reset_url,
                                        current_time_vn=current_time_vn)
         
-        current_app.logger.info(f"🔵 [RESET EMAIL] Email template rendered for {user.email}")
-        
-        # Send email using new email utility (Brevo API with SMTP fallback)
-        result = send_email(
+        # Delivered after commit by the outbox workers (Brevo API with SMTP fallback)
+        outbox.enqueue(
             to_email=user.email,
             subject='Đặt lại mật khẩu Mahika',
             html_content=html_content,
-            text_content=f'Vui lòng truy cập liên kết sau để đặt lại mật khẩu: {reset_url}'
+            text_content=f'Vui lòng truy cập liên kết sau để đặt lại mật khẩu: {reset_url}',
+            kind='reset'
         )
-        
-        if result['success']:
-            current_app.logger.info(f"✅ [RESET EMAIL] Email sent successfully for {user.email}")
-            return True
-        else:
-            current_app.logger.error(f"❌ [RESET EMAIL] Failed to send email for {user.email}: {result['message']}")
-            return False
+        return True
             
     except Exception as e:
         current_app.logger.error(f'❌ [RESET EMAIL] Error preparing reset email for {user.email}')
         current_app.logger.error(f'❌ [RESET EMAIL] Error: {str(e)}', exc_info=True)
         return False
 
+def _too_many_attempts(template, wait):
+    """429 page for a request rejected by the rate limiter"""
+    flash(f'Bạn đã thử quá nhiều lần. Vui lòng thử lại sau {max(1, (wait + 59) // 60)} phút.', 'error')
+    response = current_app.make_response((render_template(template), 429))
+    response.headers['Retry-After'] = str(wait)
+    return response
+
+def _hashing_busy(template, **context):
+    """503 page when the password hashing pool did not answer in time"""
+    flash('Hệ thống đang bận, vui lòng thử lại sau ít phút.', 'error')
+    response = current_app.make_response((render_template(template, **context), 503))
+    response.headers['Retry-After'] = '30'
+    return response
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -154,16 +149,16 @@ def register():
             user = User(email=email)
             user.set_password(password)
             db.session.add(user)
+            rollup.record_registration()
+            events.publish_after_commit(events.USER_REGISTERED, email=email)
+            # Email xác thực nằm trong cùng transaction với user (outbox)
+            email_sent = queue_verification_email(user)
             db.session.commit()
             
             current_app.logger.info(f"✅ [REGISTER] User created successfully: {email}")
-            current_app.logger.info(f"🔵 [REGISTER] Attempting to send verification email to: {email}")
-            
-            # Send verification email asynchronously
-            email_sent = send_verification_email(user)
             
             if email_sent:
-                current_app.logger.info(f"✅ [REGISTER] Verification email process initiated for: {email}")
+                current_app.logger.info(f"✅ [REGISTER] Verification email queued for: {email}")
                 flash('Đăng ký thành công! Email xác thực đang được gửi, vui lòng kiểm tra hộp thư.', 'success')
             else:
                 current_app.logger.error(f"❌ [REGISTER] Failed to initiate verification email for: {email}")
@@ -171,6 +166,9 @@ def register():
             
             return redirect(url_for('auth.login'))
             
+        except passwords.HashingBusy:
+            db.session.rollback()
+            return _hashing_busy('auth/register.html')
         except Exception as e:
             db.session.rollback()
             current_app.logger.error(f'❌ [REGISTER] Registration error for {email}: {str(e)}', exc_info=True)
@@ -193,9 +191,28 @@ def login():
             flash('Vui lòng điền đầy đủ thông tin', 'error')
             return render_template('auth/login.html')
         
+        # Chặn trước khi truy vấn DB / băm mật khẩu (credential stuffing)
+        wait = rate_limit.check('login', email)
+        if wait:
+            return _too_many_attempts('auth/login.html', wait)
+        
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        try:
+            authenticated = user is not None and user.check_password(password)
+        except passwords.HashingBusy:
+            return _hashing_busy('auth/login.html')
+        
+        if authenticated:
+            try:
+                if user.password_needs_rehash():
+                    # Nâng cấp hash cũ lên cấu hình hiện tại khi đã biết mật khẩu đúng
+                    user.set_password(password)
+                    db.session.commit()
+                    current_app.logger.info(f'🔐 [LOGIN] Password hash of {email} upgraded to the current policy')
+            except passwords.HashingBusy:
+                # Pool đang bận: vẫn cho đăng nhập, nâng cấp hash ở lần sau
+                db.session.rollback()
             login_user(user, remember=remember_me)
             next_page = request.args.get('next')
             if next_page:
@@ -228,6 +245,9 @@ def verify_email(token):
     
     user.is_verified = True
     user.verified_at = datetime.utcnow()
+    rollup.record_verification(user.verified_at)
+    events.publish_after_commit(events.USER_VERIFIED, delta=1, email=user.email)
+    identity.invalidate_after_commit(user.id)
     db.session.commit()
     
     flash('Xác thực email thành công! Bạn có thể đăng nhập ngay bây giờ.', 'success')
@@ -246,14 +266,19 @@ def forgot_password():
             flash('Vui lòng nhập email', 'error')
             return render_template('auth/forgot_password.html')
         
+        wait = rate_limit.check('reset', email)
+        if wait:
+            return _too_many_attempts('auth/forgot_password.html', wait)
+        
         current_app.logger.info(f"🔵 [FORGOT PASSWORD] Password reset requested for: {email}")
         
         user = User.query.filter_by(email=email).first()
         if user:
-            current_app.logger.info(f"🔵 [FORGOT PASSWORD] User found, sending reset email to: {email}")
-            email_sent = send_reset_email(user)
-            if not email_sent:
-                current_app.logger.error(f'❌ [FORGOT PASSWORD] Failed to send reset email to {email}')
+            current_app.logger.info(f"🔵 [FORGOT PASSWORD] User found, queuing reset email to: {email}")
+            if queue_reset_email(user):
+                db.session.commit()
+            else:
+                current_app.logger.error(f'❌ [FORGOT PASSWORD] Failed to queue reset email to {email}')
         else:
             current_app.logger.info(f"⚠️ [FORGOT PASSWORD] User not found for email: {email} (security: still showing success message)")
         
@@ -291,7 +316,10 @@ def reset_password(token):
             flash(message, 'error')
             return render_template('auth/reset_password.html', token=token)
         
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except passwords.HashingBusy:
+            return _hashing_busy('auth/reset_password.html', token=token)
         db.session.commit()
         
         flash('Đặt lại mật khẩu thành công! Bạn có thể đăng nhập với mật khẩu mới.', 'success')
@@ -299,6 +327,53 @@ def reset_password(token):
     
     return render_template('auth/reset_password.html', token=token)
 
+@auth_bp.route('/activate/<token>', methods=['GET', 'POST'])
+def activate_account(token):
+    """Set the first password of an imported account (activation link)"""
+    if current_user.is_authenticated:
+        return redirect(url_for('main.dashboard'))
+    
+    user = User.verify_activation_token(token, max_age=current_app.config.get('IMPORT_ACTIVATION_MAX_AGE', 604800))
+    if not user or passwords.has_usable_password(user.password_hash):
+        flash('Link kích hoạt không hợp lệ, đã hết hạn hoặc đã được sử dụng', 'error')
+        return redirect(url_for('auth.login'))
+    
+    if request.method == 'POST':
+        password = request.form.get('password', '')
+        confirm_password = request.form.get('confirm_password', '')
+        
+        if not password or not confirm_password:
+            flash('Vui lòng điền đầy đủ thông tin', 'error')
+            return render_template('auth/activate.html', token=token, email=user.email)
+        
+        if password != confirm_password:
+            flash('Mật khẩu xác nhận không khớp', 'error')
+            return render_template('auth/activate.html', token=token, email=user.email)
+        
+        is_valid, message = validate_password(password)
+        if not is_valid:
+            flash(message, 'error')
+            return render_template('auth/activate.html', token=token, email=user.email)
+        
+        try:
+            user.set_password(password)
+        except passwords.HashingBusy:
+            return _hashing_busy('auth/activate.html', token=token, email=user.email)
+        # Link gửi tới email nên mở được link là đã xác thực email
+        if not user.is_verified:
+            user.is_verified = True
+            user.verified_at = datetime.utcnow()
+            rollup.record_verification(user.verified_at)
+            events.publish_after_commit(events.USER_VERIFIED, delta=1, email=user.email)
+            identity.invalidate_after_commit(user.id)
+        db.session.commit()
+        
+        current_app.logger.info(f"✅ [ACTIVATE] Imported account activated: {user.email}")
+        flash('Kích hoạt tài khoản thành công! Bạn có thể đăng nhập ngay bây giờ.', 'success')
+        return redirect(url_for('auth.login'))
+    
+    return render_template('auth/activate.html', token=token, email=user.email)
+
 @auth_bp.route('/resend-verification')
 @login_required
 def resend_verification():
@@ -309,10 +384,11 @@ def resend_verification():
     
     current_app.logger.info(f"🔵 [RESEND VERIFICATION] User {current_user.email} requested resend verification email")
     
-    email_sent = send_verification_email(current_user)
+    email_sent = queue_verification_email(current_user)
     
     if email_sent:
-        current_app.logger.info(f"✅ [RESEND VERIFICATION] Verification email process initiated for: {current_user.email}")
+        db.session.commit()
+        current_app.logger.info(f"✅ [RESEND VERIFICATION] Verification email queued for: {current_user.email}")
         flash('Email xác thực đang được gửi. Vui lòng kiểm tra hộp thư trong vài phút.', 'success')
     else:
         current_app.logger.error(f"❌ [RESEND VERIFICATION] Failed to initiate verification email for: {current_user.email}")
@@ -1,192 +1,135 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
 from flask_login import login_required, current_user
 from app import db
-from app.models import Payment
-import hashlib
-import hmac
-import uuid
-import json
-import requests
-from datetime import datetime
-import os
+from app.models import Payment, User
+from app.utils.payos import PayOSError, get_payos_client
+from app.utils.order_code import next_order_code
+from app.utils import payment_state, webhook_inbox
+from app.utils.pagination import keyset_paginate
+from app.utils.query_budget import query_budget
+from app.utils.deadline import DeadlineExceeded
+from sqlalchemy import func, select, update
+from datetime import datetime, timedelta
+import calendar
 
 payment_bp = Blueprint('payment', __name__, url_prefix='/payment')
 
-def create_payos_signature(data, checksum_key):
-    """
-    Create PayOS signature theo format chính thức của PayOS
-    Format chuẩn: amount={amount}&cancelUrl={cancelUrl}&description={description}&orderCode={orderCode}&returnUrl={returnUrl}
-    """
-    # PayOS yêu cầu sắp xếp theo alphabet và format chính xác
-    sorted_keys = sorted(data.keys())
-    
-    # Tạo string theo format key=value&key=value
-    parts = []
-    for key in sorted_keys:
-        # Convert value to string, đảm bảo format đúng
-        value = str(data[key])
-        parts.append(f"{key}={value}")
-    
-    data_string = "&".join(parts)
-    
-    current_app.logger.info(f"📝 [SIGNATURE] Data string: {data_string}")
-    
-    # Tạo HMAC SHA256 signature
-    signature = hmac.new(
-        checksum_key.encode('utf-8'),
-        data_string.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
-    
-    current_app.logger.info(f"🔐 [SIGNATURE] Generated: {signature}")
-    
-    return signature
-
 @payment_bp.route('/checkout')
+@query_budget(2)
 @login_required
 def checkout():
     """Display checkout page"""
-    if not current_user.is_verified:
+    # Đọc lại cờ từ DB: current_user có thể là bản cache
+    user = db.session.execute(
+        select(User.is_verified, User.has_paid).where(User.id == current_user.id)
+    ).one()
+    if not user.is_verified:
         flash('Bạn cần xác thực email trước khi thanh toán', 'warning')
         return redirect(url_for('main.dashboard'))
     
-    if current_user.has_paid:
+    if user.has_paid:
         flash('Bạn đã thanh toán rồi', 'info')
         return redirect(url_for('main.dashboard'))
     
     return render_template('payment/checkout.html')
 
 @payment_bp.route('/create-payment', methods=['POST'])
+@query_budget(5)
 @login_required
 def create_payment():
     """Create PayOS payment"""
     current_app.logger.info(f'=== CREATE PAYMENT START ===')
     current_app.logger.info(f'User: {current_user.email}')
-    current_app.logger.info(f'User verified: {current_user.is_verified}')
-    current_app.logger.info(f'User paid: {current_user.has_paid}')
     
-    if not current_user.is_verified:
+    # Đọc lại cờ từ DB (current_user có thể là bản cache) và khóa dòng user tới khi commit:
+    # hai lần bấm đồng thời không cùng tạo link mới
+    user = db.session.execute(
+        select(User.is_verified, User.has_paid).where(User.id == current_user.id).with_for_update()
+    ).one()
+    current_app.logger.info(f'User verified: {user.is_verified}')
+    current_app.logger.info(f'User paid: {user.has_paid}')
+    
+    if not user.is_verified:
         current_app.logger.error('User not verified')
         flash('Bạn cần xác thực email trước khi thanh toán', 'error')
         return redirect(url_for('main.dashboard'))
     
-    if current_user.has_paid:
+    if user.has_paid:
         current_app.logger.error('User already paid')
         flash('Bạn đã thanh toán rồi', 'info')
         return redirect(url_for('main.dashboard'))
     
     try:
         current_app.logger.info('Getting PayOS configuration...')
-        # PayOS configuration
-        client_id = current_app.config.get('PAYOS_CLIENT_ID')
-        api_key = current_app.config.get('PAYOS_API_KEY')
-        checksum_key = current_app.config.get('PAYOS_CHECKSUM_KEY')
+        client = get_payos_client()
         
-        current_app.logger.info(f'Client ID: {client_id}')
-        current_app.logger.info(f'API Key: {api_key[:10] if api_key else "None"}...')
-        current_app.logger.info(f'Checksum Key: {checksum_key[:10] if checksum_key else "None"}...')
-        
-        if not all([client_id, api_key, checksum_key]):
+        if not client.is_configured():
             current_app.logger.error('PayOS configuration incomplete')
             flash('Cấu hình PayOS không đầy đủ', 'error')
             return redirect(url_for('payment.checkout'))
         
-        current_app.logger.info('Creating payment data...')
         # Payment details
         amount = current_app.config.get('PAYMENT_AMOUNT', 5000)  # 5,000 VND default
-        order_code = int(f"{current_user.id}{int(datetime.now().timestamp())}")
-        description = current_app.config.get('PAYMENT_DESCRIPTION', 'Mahika App - Premium License')
         
-        # PayOS giới hạn 25 ký tự cho description
-        description_trimmed = description[:25]
+        # Double-click / back-and-retry: reuse the still-valid PENDING link
+        existing = Payment.find_reusable_checkout(current_user.id, amount)
+        if existing:
+            current_app.logger.info(f'Reusing checkout link of order {existing.payos_order_id}')
+            return redirect(existing.checkout_url)
+        
+        current_app.logger.info('Creating payment data...')
+        ttl = timedelta(minutes=current_app.config.get('PAYMENT_LINK_TTL_MINUTES', 15))
+        expires_at = datetime.utcnow().replace(microsecond=0) + ttl
+        order_code = next_order_code()
+        description = current_app.config.get('PAYMENT_DESCRIPTION', 'Mahika App - Premium License')
         
         current_app.logger.info(f'Amount: {amount}')
         current_app.logger.info(f'Order code: {order_code}')
         current_app.logger.info(f'Description: {description}')
-        current_app.logger.info(f'Description (trimmed): {description_trimmed}')
-          # PayOS payment data theo API documentation có signature
-        signature_data = {
-            "amount": amount,
-            "cancelUrl": current_app.config.get('PAYOS_CANCEL_URL'),
-            "description": description_trimmed,
-            "orderCode": order_code,
-            "returnUrl": current_app.config.get('PAYOS_RETURN_URL')
-        }
-        
-        current_app.logger.info(f'Signature data: {signature_data}')
-        
-        # Tạo signature
-        signature = create_payos_signature(signature_data, checksum_key)
-        current_app.logger.info(f'Generated signature: {signature}')
-        
-        # Payment data GỬI ĐI phải dùng CÙNG description với signature_data
-        payment_data = {
-            "orderCode": order_code,
-            "amount": amount,
-            "description": description_trimmed,  # PHẢI GIỐNG signature_data
-            "returnUrl": current_app.config.get('PAYOS_RETURN_URL'),
-            "cancelUrl": current_app.config.get('PAYOS_CANCEL_URL'),
-            "signature": signature
-        }
-        
-        # Debug: In ra thông tin trước khi gọi API
-        current_app.logger.info(f'PayOS payment data: {json.dumps(payment_data, indent=2)}')
-        
-        # Make request to PayOS API
-        headers = {
-            'x-client-id': client_id,
-            'x-api-key': api_key,
-            'Content-Type': 'application/json'
-        }
-        
-        current_app.logger.info(f'Headers: {headers}')
         current_app.logger.info(f'Making request to PayOS API endpoint...')
         
-        response = requests.post(
-            'https://api-merchant.payos.vn/v2/payment-requests',
-            headers=headers,
-            json=payment_data,
-            timeout=30
+        result = client.create_payment_link(
+            order_code=order_code,
+            amount=amount,
+            description=description,
+            return_url=current_app.config.get('PAYOS_RETURN_URL'),
+            cancel_url=current_app.config.get('PAYOS_CANCEL_URL'),
+            expired_at=calendar.timegm(expires_at.timetuple())
         )
         
-        current_app.logger.info(f'PayOS Response Status: {response.status_code}')
-        current_app.logger.info(f'PayOS Response: {response.text}')
+        checkout_url = result['checkoutUrl']
+        
+        current_app.logger.info('PayOS success, creating payment record...')
+        # Create payment record in database
+        payment = Payment(
+            user_id=current_user.id,
+            payos_order_id=str(order_code),
+            amount=amount,
+            currency='VND',
+            status='PENDING',
+            checkout_url=checkout_url,
+            checkout_expires_at=expires_at
+        )
+        db.session.add(payment)
+        db.session.commit()
+        current_app.logger.info('Payment record created successfully')
         
-        if response.status_code == 200:
-            result = response.json()
-            current_app.logger.info(f'PayOS Result: {result}')
+        current_app.logger.info(f'Redirecting to checkout URL: {checkout_url}')
+        # Redirect to PayOS payment page
+        return redirect(checkout_url)
             
-            if result.get('code') == '00' and result.get('data', {}).get('checkoutUrl'):
-                current_app.logger.info('PayOS success, creating payment record...')
-                # Create payment record in database
-                payment = Payment(
-                    user_id=current_user.id,
-                    payos_order_id=str(order_code),
-                    amount=amount,
-                    currency='VND',
-                    status='PENDING'
-                )
-                db.session.add(payment)
-                db.session.commit()
-                current_app.logger.info('Payment record created successfully')
-                
-                checkout_url = result['data']['checkoutUrl']
-                current_app.logger.info(f'Redirecting to checkout URL: {checkout_url}')
-                # Redirect to PayOS payment page
-                return redirect(checkout_url)
-            else:
-                error_msg = result.get('desc', 'Unknown error')
-                current_app.logger.error(f'PayOS API returned error: {error_msg}')
-                flash(f'PayOS Error: {error_msg}', 'error')
-        else:
-            current_app.logger.error(f'PayOS HTTP error: {response.status_code} - {response.text}')
-            flash(f'Lỗi kết nối PayOS (Status: {response.status_code})', 'error')
-        
+    except DeadlineExceeded as e:
+        current_app.logger.error(f'PayOS call skipped, request budget exhausted: {str(e)}')
+        flash('Hệ thống đang bận, vui lòng thử lại sau ít phút.', 'error')
         return redirect(url_for('payment.checkout'))
-            
-    except requests.RequestException as e:
-        current_app.logger.error(f'PayOS request error: {str(e)}', exc_info=True)
-        flash('Lỗi kết nối với PayOS. Vui lòng kiểm tra internet và thử lại.', 'error')
+    except PayOSError as e:
+        current_app.logger.error(f'PayOS error: {e.message}', exc_info=True)
+        if e.status_code is None:
+            flash('Lỗi kết nối với PayOS. Vui lòng kiểm tra internet và thử lại.', 'error')
+        elif e.status_code != 200:
+            flash(f'Lỗi kết nối PayOS (Status: {e.status_code})', 'error')
+        else:
+            flash(f'PayOS Error: {e.message}', 'error')
         return redirect(url_for('payment.checkout'))
     except Exception as e:
         current_app.logger.error(f'PayOS payment creation error: {str(e)}', exc_info=True)
@@ -194,6 +137,7 @@ def create_payment():
         return redirect(url_for('payment.checkout'))
 
 @payment_bp.route('/return')
+@query_budget(5)
 def payment_return():
     """Handle PayOS payment return"""
     try:
@@ -219,45 +163,27 @@ def payment_return():
             flash('Thiếu thông tin mã đơn hàng', 'error')
             return redirect(url_for('main.dashboard'))
         
-        # Find payment record
-        payment = Payment.query.filter_by(payos_order_id=str(orderCode)).first()
-        current_app.logger.info(f'Payment found: {payment is not None}')
-        
-        if not payment:
-            current_app.logger.error(f'Payment not found for orderCode: {orderCode}')
-            flash('Không tìm thấy thông tin thanh toán', 'error')
-            return redirect(url_for('main.dashboard'))
-        
-        current_app.logger.info(f'Current payment status: {payment.status}')
-        current_app.logger.info(f'Payment user ID: {payment.user_id}')
-        
+        # Apply the transition atomically; the webhook may be racing us
         if code == '00' and status == 'PAID':
             current_app.logger.info('Processing successful payment...')
-            # Payment successful
-            payment.status = 'PAID'
-            payment.payos_transaction_id = id
-            payment.completed_at = datetime.utcnow()
-            
-            # Update user payment status
-            user = payment.user
-            user.has_paid = True
-            current_app.logger.info(f'Updated user {user.email} payment status to True')
-            
-            db.session.commit()
-            current_app.logger.info('Payment and user status updated successfully')
-            
-            flash('Thanh toán thành công! Bạn có thể tải ứng dụng ngay bây giờ.', 'success')
+            result = payment_state.mark_paid(orderCode, transaction_id=id)
         elif cancel == 'true':
             current_app.logger.info('Processing cancelled payment...')
-            # Payment cancelled
-            payment.status = 'CANCELLED'
-            db.session.commit()
-            flash('Thanh toán đã bị hủy', 'warning')
+            result = payment_state.mark_cancelled(orderCode)
         else:
             current_app.logger.info('Processing failed payment...')
-            # Payment failed
-            payment.status = 'FAILED'
-            db.session.commit()
+            result = payment_state.mark_failed(orderCode)
+        
+        current_app.logger.info(f'Transition applied: {result.applied}, current status: {result.status}')
+        
+        if result.status is None:
+            current_app.logger.error(f'Payment not found for orderCode: {orderCode}')
+            flash('Không tìm thấy thông tin thanh toán', 'error')
+        elif result.status == payment_state.PAID:
+            flash('Thanh toán thành công! Bạn có thể tải ứng dụng ngay bây giờ.', 'success')
+        elif result.status == payment_state.CANCELLED:
+            flash('Thanh toán đã bị hủy', 'warning')
+        else:
             flash('Thanh toán thất bại. Vui lòng thử lại.', 'error')
     
     except Exception as e:
@@ -268,6 +194,7 @@ def payment_return():
     return redirect(url_for('main.dashboard'))
 
 @payment_bp.route('/webhook', methods=['POST'])
+@query_budget(2)
 def payment_webhook():
     """Handle PayOS webhook notification"""
     try:
@@ -276,34 +203,10 @@ def payment_webhook():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Extract webhook data
-        webhook_data = data.get('data', {})
-        order_code = webhook_data.get('orderCode')
-        amount = webhook_data.get('amount')
-        description = webhook_data.get('description')
-        account_number = webhook_data.get('accountNumber')
-        reference = webhook_data.get('reference')
-        transaction_date_time = webhook_data.get('transactionDateTime')
-        
-        # Find payment record
-        payment = Payment.query.filter_by(payos_order_id=str(order_code)).first()
-        if not payment:
-            current_app.logger.error(f'Payment not found for order {order_code}')
-            return jsonify({'error': 'Payment not found'}), 404
-        
-        # Update payment status
-        if amount == payment.amount and payment.status == 'PENDING':
-            payment.status = 'PAID'
-            payment.payos_transaction_id = reference
-            payment.completed_at = datetime.utcnow()
-            
-            # Update user payment status
-            user = payment.user
-            user.has_paid = True
-            
-            db.session.commit()
-            
-            current_app.logger.info(f'Payment completed via webhook for order {order_code}')
+        # Store the body and acknowledge right away; the inbox consumer
+        # applies the payment update in the background
+        row = webhook_inbox.enqueue(data)
+        current_app.logger.info(f'Webhook for order {row.order_code} stored in inbox (#{row.id})')
         
         return jsonify({'code': '00', 'desc': 'Success'}), 200
         
@@ -311,20 +214,100 @@ def payment_webhook():
         current_app.logger.error(f'PayOS webhook error: {str(e)}')
         return jsonify({'error': 'Internal error'}), 500
 
+HISTORY_PER_PAGE = 20
+
+def _history_page(cursor):
+    """One keyset page of the current user's payments, only the columns the page shows"""
+    query = db.session.query(
+        Payment.id,
+        Payment.payos_order_id,
+        Payment.payos_transaction_id,
+        Payment.amount,
+        Payment.currency,
+        Payment.status,
+        Payment.created_at,
+        Payment.completed_at
+    ).filter(Payment.user_id == current_user.id)
+    
+    return keyset_paginate(query, Payment.created_at, Payment.id,
+                           cursor=cursor, per_page=HISTORY_PER_PAGE)
+
 @payment_bp.route('/history')
+@query_budget(3)
 @login_required
 def payment_history():
     """Display user's payment history"""
-    payments = Payment.query.filter_by(user_id=current_user.id).order_by(Payment.created_at.desc()).all()
-    return render_template('payment/history.html', payments=payments)
+    page = _history_page(request.args.get('cursor'))
+    
+    # Tổng kết tính bằng một truy vấn, không phụ thuộc vào trang hiện tại
+    paid_count, paid_total = db.session.query(
+        func.count(Payment.id), func.sum(Payment.amount)
+    ).filter(Payment.user_id == current_user.id, Payment.status == 'PAID').one()
+    summary = {'count': paid_count, 'total': paid_total or 0}
+    
+    return render_template('payment/history.html', payments=page.items,
+                           next_cursor=page.next_cursor, prev_cursor=page.prev_cursor,
+                           summary=summary)
+
+@payment_bp.route('/history.json')
+@query_budget(2)
+@login_required
+def payment_history_json():
+    """Payment history as JSON pages for infinite scroll"""
+    page = _history_page(request.args.get('cursor'))
+    
+    def iso(value):
+        return value.isoformat() if value else None
+    
+    return jsonify({
+        'items': [{
+            'payos_order_id': p.payos_order_id,
+            'payos_transaction_id': p.payos_transaction_id,
+            'amount': p.amount,
+            'currency': p.currency,
+            'status': p.status,
+            'created_at': iso(p.created_at),
+            'completed_at': iso(p.completed_at)
+        } for p in page.items],
+        'next_cursor': page.next_cursor
+    })
 
 @payment_bp.route('/cancel')
+@query_budget(3)
+@login_required
 def cancel_payment():
     """Cancel payment"""
+    orderCode = request.args.get('orderCode')
+    if orderCode:
+        try:
+            # Chỉ hủy khi PayOS xác nhận link đã bị hủy; URL này ai cũng gọi được
+            try:
+                payos_status = get_payos_client().get_payment_info(orderCode).get('status')
+            except (PayOSError, DeadlineExceeded) as e:
+                current_app.logger.warning(f'Cancel return for {orderCode}: PayOS status unavailable: {str(e)}')
+                payos_status = None
+            
+            if payos_status == payment_state.CANCELLED:
+                result = payment_state.mark_cancelled(orderCode, user_id=current_user.id)
+                current_app.logger.info(f'Cancel return for {orderCode}: applied {result.applied}, status {result.status}')
+            else:
+                # Chưa xác nhận được: giữ PENDING (webhook vẫn áp dụng được) nhưng không dùng lại link này
+                db.session.execute(
+                    update(Payment)
+                    .where(Payment.payos_order_id == str(orderCode),
+                           Payment.user_id == current_user.id,
+                           Payment.status == payment_state.PENDING)
+                    .values(checkout_url=None)
+                )
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'PayOS cancel error: {str(e)}', exc_info=True)
     flash('Thanh toán đã bị hủy', 'info')
     return redirect(url_for('main.dashboard'))
 
 @payment_bp.route('/test-payment', methods=['POST'])
+@query_budget(2)
 @login_required  
 def test_payment():
     """Test payment function đơn giản để debug"""
@@ -335,81 +318,45 @@ def test_payment():
     current_app.logger.info(f'Has paid: {current_user.has_paid}')
     
     try:
-        # Copy exact code từ test endpoint thành công
-        client_id = current_app.config.get('PAYOS_CLIENT_ID')
-        api_key = current_app.config.get('PAYOS_API_KEY')
-        checksum_key = current_app.config.get('PAYOS_CHECKSUM_KEY')
+        client = get_payos_client()
         
-        current_app.logger.info(f'Config check - Client ID: {bool(client_id)}')
-        current_app.logger.info(f'Config check - API Key: {bool(api_key)}')
-        current_app.logger.info(f'Config check - Checksum Key: {bool(checksum_key)}')
+        current_app.logger.info(f'Config check - Client ID: {bool(client.client_id)}')
+        current_app.logger.info(f'Config check - API Key: {bool(client.api_key)}')
+        current_app.logger.info(f'Config check - Checksum Key: {bool(client.checksum_key)}')
         
-        if not all([client_id, api_key, checksum_key]):
+        if not client.is_configured():
             flash('PayOS configuration incomplete', 'error')
             return redirect(url_for('payment.checkout'))
         
         # Payment details
         amount = 50000
-        order_code = int(datetime.now().timestamp())
+        order_code = next_order_code()
         
         current_app.logger.info(f'Payment details - Amount: {amount}, Order: {order_code}')
-          # PayOS payment data (copy từ test thành công)
-        signature_data = {
-            "amount": amount,
-            "cancelUrl": current_app.config.get('PAYOS_CANCEL_URL'),
-            "description": "Test payment",  # Giới hạn 25 ký tự
-            "orderCode": order_code,
-            "returnUrl": current_app.config.get('PAYOS_RETURN_URL')
-        }
-        
-        # Tạo signature
-        signature = create_payos_signature(signature_data, checksum_key)
-        current_app.logger.info(f'Generated signature: {signature}')
-        
-        payment_data = {
-            "orderCode": order_code,
-            "amount": amount,
-            "description": "Test payment",  # Giới hạn 25 ký tự
-            "returnUrl": current_app.config.get('PAYOS_RETURN_URL'),
-            "cancelUrl": current_app.config.get('PAYOS_CANCEL_URL'),
-            "signature": signature
-        }
-        
-        current_app.logger.info(f'Payment data: {json.dumps(payment_data, indent=2)}')
-        
-        # Make request to PayOS API
-        headers = {
-            'x-client-id': client_id,
-            'x-api-key': api_key,
-            'Content-Type': 'application/json'
-        }
-        
         current_app.logger.info('Making PayOS request...')
-        response = requests.post(
-            'https://api-merchant.payos.vn/v2/payment-requests',
-            headers=headers,
-            json=payment_data,
-            timeout=30
+        
+        result = client.create_payment_link(
+            order_code=order_code,
+            amount=amount,
+            description="Test payment",  # Giới hạn 25 ký tự
+            return_url=current_app.config.get('PAYOS_RETURN_URL'),
+            cancel_url=current_app.config.get('PAYOS_CANCEL_URL')
         )
         
-        current_app.logger.info(f'PayOS response status: {response.status_code}')
-        current_app.logger.info(f'PayOS response: {response.text}')
+        current_app.logger.info(f'SUCCESS! Redirecting to: {result["checkoutUrl"]}')
+        return redirect(result['checkoutUrl'])
         
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('code') == '00' and result.get('data', {}).get('checkoutUrl'):
-                current_app.logger.info(f'SUCCESS! Redirecting to: {result["data"]["checkoutUrl"]}')
-                return redirect(result['data']['checkoutUrl'])
-            else:
-                error_msg = result.get('desc', 'Unknown error')
-                current_app.logger.error(f'PayOS API error: {error_msg}')
-                flash(f'PayOS Error: {error_msg}', 'error')
+    except DeadlineExceeded as e:
+        current_app.logger.error(f'PayOS call skipped, request budget exhausted: {str(e)}')
+        flash('Hệ thống đang bận, vui lòng thử lại sau ít phút.', 'error')
+        return redirect(url_for('payment.checkout'))
+    except PayOSError as e:
+        current_app.logger.error(f'PayOS API error: {e.message}')
+        if e.status_code is not None and e.status_code != 200:
+            flash(f'HTTP Error: {e.status_code}', 'error')
         else:
-            current_app.logger.error(f'HTTP error: {response.status_code}')
-            flash(f'HTTP Error: {response.status_code}', 'error')
-        
+            flash(f'PayOS Error: {e.message}', 'error')
         return redirect(url_for('payment.checkout'))
-        
     except Exception as e:
         current_app.logger.error(f'Exception in test payment: {str(e)}', exc_info=True)
         flash(f'Exception: {str(e)}', 'error')
@@ -123,3 +123,53 @@ def health_check():
         'email_configured': bool(current_app.config.get('MAIL_USERNAME'))
     }), 200
 
+
+@test_bp.route('/payos-pool')
+def payos_pool_stats():
+    """
+    PayOS connection pool hit/miss counters of the worker serving this request.
+    Usage: GET /test/payos-pool
+    """
+    from app.utils.payos import get_payos_client
+    
+    return jsonify(get_payos_client().pool_stats()), 200
+
+@test_bp.route('/webhook-inbox')
+def webhook_inbox_stats():
+    """
+    Webhook inbox lag (pending rows, oldest age) and this worker's consumer counters.
+    Usage: GET /test/webhook-inbox
+    """
+    from app.utils.webhook_inbox import inbox_stats
+    
+    return jsonify(inbox_stats()), 200
+
+@test_bp.route('/identity-cache')
+def identity_cache_stats():
+    """
+    current_user identity cache hit rate and invalidations of the worker serving this request.
+    Usage: GET /test/identity-cache
+    """
+    from app.utils.identity import identity_cache
+    
+    return jsonify(identity_cache.stats()), 200
+
+@test_bp.route('/rate-limit')
+def rate_limit_stats():
+    """
+    Login / password reset requests admitted and rejected by the rate limiter in the worker serving this request.
+    Usage: GET /test/rate-limit
+    """
+    from app.utils.rate_limit import rate_limit_stats
+    
+    return jsonify(rate_limit_stats()), 200
+
+@test_bp.route('/email-outbox')
+def email_outbox_stats():
+    """
+    Email outbox backlog (pending, lag, dead letters) and this worker's delivery counters.
+    Usage: GET /test/email-outbox
+    """
+    from app.utils.outbox import outbox_stats
+    
+    return jsonify(outbox_stats()), 200
@@ -0,0 +1,295 @@
+"""
+Admin audit log
+Admin routes call record_after_commit() before committing their change (or
+record() for read-only actions); the entry goes on a bounded in-process queue and a background writer (one per worker process)
+inserts queued entries as multi-row INSERTs, so an admin request never waits
+on an audit INSERT. The queue is drained when the worker exits
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_request_context
+from flask_login import current_user
+from sqlalchemy import event as sa_event, insert
+
+from app import db
+from app.models import AdminAuditLog
+from app.utils.rate_limit import client_ip
+
+
+WRITE_ATTEMPTS = 3
+
+# Actions shown in the audit view filter
+ACTIONS = {
+    'user.toggle_verified': 'Đổi trạng thái xác thực',
+    'user.toggle_paid': 'Đổi trạng thái thanh toán',
+    'users.bulk_verify': 'Xác thực hàng loạt',
+    'users.bulk_unverify': 'Bỏ xác thực hàng loạt',
+    'users.bulk_grant': 'Cấp quyền tải hàng loạt',
+    'users.bulk_revoke': 'Thu hồi quyền tải hàng loạt',
+    'users.import': 'Nhập người dùng từ CSV',
+    'export.users': 'Xuất người dùng',
+    'export.payments': 'Xuất giao dịch',
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'queued': 0,
+    'written': 0,
+    'batches': 0,
+    'sync_writes': 0,   # queue full: written inline by the request instead
+    'failed': 0,        # given up after WRITE_ATTEMPTS (logged in full)
+    'last_batch_size': 0,
+    'last_batch_ms': 0.0,
+}
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for name, value in deltas.items():
+            _stats[name] += value
+
+
+def _insert(entries):
+    """One multi-row INSERT of `entries` in its own transaction (needs an app context)"""
+    with db.engine.begin() as connection:
+        connection.execute(insert(AdminAuditLog.__table__).values(entries))
+
+
+class AuditWriter:
+    """Background thread that drains the audit queue in batches"""
+
+    def __init__(self, app, maxsize=10000, batch_size=200, interval=1.0):
+        self.app = app
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='admin-audit-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, entry):
+        """Queue an entry without blocking; False if the queue is full"""
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            return False
+
+    def _next_batch(self):
+        """Wait up to `interval` for a first entry, then take whatever else is queued"""
+        try:
+            batch = [self.queue.get(timeout=0 if self._stopping.is_set() else self.interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        with self.app.app_context():
+            for attempt in range(1, WRITE_ATTEMPTS + 1):
+                try:
+                    _insert(batch)
+                    break
+                except Exception as e:
+                    if attempt == WRITE_ATTEMPTS:
+                        # Không mất dấu vết: ghi nguyên entry ra log để còn đối soát
+                        self.app.logger.error(
+                            f'❌ [AUDIT] Dropping {len(batch)} entries after {attempt} attempts ({str(e)}): '
+                            + json.dumps(batch, default=str, ensure_ascii=False)
+                        )
+                        _count(failed=len(batch))
+                        return
+                    time.sleep(0.5 * attempt)
+        with _stats_lock:
+            _stats['written'] += len(batch)
+            _stats['batches'] += 1
+            _stats['last_batch_size'] = len(batch)
+            _stats['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    self._write(batch)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+            elif self._stopping.is_set():
+                return
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued entry is written; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Write what is still queued, then end the thread"""
+        self._stopping.set()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_last_full_warning = float('-inf')
+
+
+def get_writer(app):
+    """
+    The audit writer of this worker process, started on first use
+
+    Started lazily (once per pid) so every gunicorn worker gets its own thread,
+    including after a --preload fork; an atexit hook drains it on shutdown.
+    """
+    global _writer, _writer_pid
+
+    pid = os.getpid()
+    if _writer_pid == pid:
+        return _writer
+
+    with _writer_lock:
+        if _writer_pid != pid:
+            _writer = AuditWriter(
+                app,
+                maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000),
+                batch_size=app.config.get('AUDIT_BATCH_SIZE', 200),
+                interval=app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+            )
+            _writer.start()
+            _writer_pid = pid
+            atexit.register(_shutdown, _writer)
+            app.logger.info(f'📝 [AUDIT] Writer started in worker {pid}')
+    return _writer
+
+
+def _shutdown(writer):
+    if not writer.stop(timeout=writer.app.config.get('AUDIT_SHUTDOWN_TIMEOUT', 5.0)):
+        writer.app.logger.error(f'❌ [AUDIT] {writer.queue.qsize()} entries still queued at shutdown')
+
+
+def _json(value):
+    return json.dumps(value, default=str, ensure_ascii=False) if value is not None else None
+
+
+def _client_ip():
+    if not has_request_context():
+        return None
+    # Cùng địa chỉ tin cậy với rate limit (phần tử cuối do proxy của Railway thêm vào)
+    return (client_ip() or '')[:45] or None
+
+
+def _entry(action, target_type, target_id, target_label, before, after):
+    actor = current_user if has_request_context() and current_user.is_authenticated else None
+    return {
+        'created_at': datetime.utcnow(),
+        'actor_id': actor.id if actor else None,
+        'actor_email': actor.email if actor else None,
+        'action': action,
+        'target_type': target_type,
+        'target_id': target_id,
+        'target_label': (target_label or '')[:255] or None,
+        'before_state': _json(before),
+        'after_state': _json(after),
+        'ip_address': _client_ip(),
+    }
+
+
+def _enqueue(app, entry):
+    if not app.config.get('AUDIT_LOG_ASYNC', True):
+        with app.app_context():
+            _insert([entry])
+        _count(sync_writes=1, written=1)
+        return
+
+    if get_writer(app).put(entry):
+        _count(queued=1)
+        return
+
+    # Hàng đợi đầy: ghi trực tiếp (chậm hơn nhưng không bỏ mất entry)
+    global _last_full_warning
+    if time.monotonic() - _last_full_warning > 10:
+        _last_full_warning = time.monotonic()
+        app.logger.warning('⚠️ [AUDIT] Queue full, writing entries synchronously')
+    with app.app_context():
+        _insert([entry])
+    _count(sync_writes=1, written=1)
+
+
+def record(action, target_type=None, target_id=None, target_label=None, before=None, after=None):
+    """
+    Log an admin action now (for actions that do not commit anything, e.g. exports)
+
+    The acting admin and client address are taken from the current request.
+
+    Args:
+        action: Action name (see ACTIONS)
+        target_type: 'user', 'users' (bulk) or 'export'
+        target_id: Id of the affected row, if there is one
+        target_label: Human-readable target (email, filter summary)
+        before: JSON-serializable state before the change
+        after: JSON-serializable state after the change
+    """
+    _enqueue(current_app._get_current_object(),
+             _entry(action, target_type, target_id, target_label, before, after))
+
+
+def record_after_commit(action, target_type=None, target_id=None, target_label=None, before=None, after=None):
+    """
+    Like record(), but the entry is only queued once the current session commits
+
+    Call it before db.session.commit(): the actor and target are read while
+    they are still loaded, and a rolled-back change leaves no entry.
+    """
+    entry = _entry(action, target_type, target_id, target_label, before, after)
+    db.session.info.setdefault('pending_audit', []).append((current_app._get_current_object(), entry))
+
+
+@sa_event.listens_for(db.session, 'after_commit')
+def _queue_pending(session):
+    for app, entry in session.info.pop('pending_audit', []):
+        _enqueue(app, entry)
+
+
+@sa_event.listens_for(db.session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('pending_audit', None)
+
+
+def flush(timeout=5.0):
+    """Wait for this worker's queued entries to be written (scripts and checks)"""
+    if _writer is None or _writer_pid != os.getpid():
+        return True
+    return _writer.flush(timeout)
+
+
+def audit_stats():
+    """This worker's writer counters plus its current queue depth"""
+    with _stats_lock:
+        stats = dict(_stats)
+    writer = _writer if _writer_pid == os.getpid() else None
+    stats.update({
+        'pid': os.getpid(),
+        'queue_depth': writer.queue.qsize() if writer else 0,
+        'queue_capacity': writer.queue.maxsize if writer else 0,
+    })
+    return stats
@@ -0,0 +1,105 @@
+"""
+Bulk admin actions on users
+Each action is a set-based UPDATE ... WHERE id IN (...) applied in chunks. The
+rows to change (not admin, not already in the target state) are selected and
+locked first, so the returned ids are exactly the rows that changed
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from app import db
+from app.models import User
+from app.utils import events, identity, rollup
+
+
+CHUNK_SIZE = 500
+
+# action -> (column, new value)
+ACTIONS = {
+    'verify': ('is_verified', True),
+    'unverify': ('is_verified', False),
+    'grant': ('has_paid', True),
+    'revoke': ('has_paid', False),
+}
+
+
+def _record_unverified(ids):
+    """Take the verifications being undone off their verified_at days in daily_stats"""
+    day = func.date(User.verified_at)
+    rows = db.session.execute(
+        select(day, func.count(User.id))
+        .where(User.id.in_(ids), User.is_admin == False,
+               User.is_verified == True, User.verified_at.isnot(None))
+        .group_by(day)
+    ).all()
+    for verified_day, count in rows:
+        rollup.record_verification(rollup.as_date(verified_day), delta=-count)
+
+
+def apply_bulk_action(action, user_ids, chunk_size=CHUNK_SIZE):
+    """
+    Apply one action to many users
+
+    Args:
+        action: 'verify', 'unverify', 'grant' or 'revoke'
+        user_ids: Iterable of user ids (duplicates and non-integers are ignored)
+        chunk_size: Ids per UPDATE statement / transaction
+
+    Returns:
+        dict: action, requested (distinct ids), affected (rows changed),
+            user_ids (ids of the rows changed)
+
+    Raises:
+        ValueError: If the action is unknown
+    """
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown bulk action: {action}')
+    column_name, value = ACTIONS[action]
+    column = getattr(User, column_name)
+
+    ids = sorted({int(user_id) for user_id in user_ids if str(user_id).isdigit()})
+    changed_ids = []
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        values = {column_name: value}
+        try:
+            # Khóa đúng các dòng sẽ đổi để danh sách id khớp với UPDATE (audit log)
+            changed = db.session.scalars(
+                select(User.id)
+                .where(User.id.in_(chunk), User.is_admin == False, column != value)
+                .with_for_update()
+            ).all()
+            if not changed:
+                db.session.commit()
+                continue
+
+            if action == 'unverify':
+                _record_unverified(changed)
+            elif action == 'verify':
+                values['verified_at'] = datetime.utcnow()
+
+            db.session.execute(
+                update(User)
+                .where(User.id.in_(changed))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if action == 'verify':
+                rollup.record_verification(values['verified_at'], delta=len(changed))
+            identity.invalidate_after_commit(*changed)
+            events.publish_after_commit(
+                events.USER_VERIFIED if column_name == 'is_verified' else events.USER_PAID,
+                delta=len(changed) if value else -len(changed)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        changed_ids.extend(changed)
+
+    current_app.logger.info(f'👥 [BULK ACTION] {action}: {len(changed_ids)}/{len(ids)} users updated')
+    return {'action': action, 'requested': len(ids), 'affected': len(changed_ids), 'user_ids': changed_ids}
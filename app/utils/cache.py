@@ -0,0 +1,136 @@
+"""
+In-process TTL cache with single-flight computation
+When an entry expires, only one thread recomputes it; concurrent callers wait
+for that result instead of running the same expensive queries in parallel
+"""
+
+import threading
+import time
+
+
+class _Flight:
+    """A computation in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe per-process cache of computed values with a time-to-live"""
+
+    def __init__(self, default_ttl=30):
+        self.default_ttl = default_ttl
+        self._entries = {}  # key -> (expires_at, value)
+        self._flights = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """
+        Return the cached value for `key`, computing it at most once per expiry
+
+        Args:
+            key: Cache key
+            compute: Zero-argument callable producing the value
+            ttl: Seconds the value stays fresh (defaults to default_ttl)
+
+        Returns:
+            The cached or freshly computed value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            with self._lock:
+                self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.default_ttl),
+                                      flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def get_or_refresh(self, key, compute, ttl=None):
+        """
+        Like get_or_compute, but an expired value is returned immediately while
+        a background thread recomputes it (stale-while-revalidate)
+
+        Only a cold key blocks the caller. `compute` runs on another thread for
+        refreshes, so it must not depend on request-local state.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                stale = False
+            else:
+                stale = entry[0] <= time.monotonic()
+                self.hits += 1
+                if not stale:
+                    return entry[1]
+
+        if not stale:
+            return self.get_or_compute(key, compute, ttl=ttl)
+
+        with self._lock:
+            refreshing = key in self._flights
+        if not refreshing:
+            threading.Thread(target=self._refresh, args=(key, compute, ttl), daemon=True).start()
+        return entry[1]
+
+    def _refresh(self, key, compute, ttl):
+        try:
+            self.get_or_compute(key, compute, ttl=ttl)
+        except Exception:
+            pass  # giữ giá trị cũ; lần đọc sau sẽ thử lại
+
+    def invalidate(self, key=None):
+        """Drop one entry (or every entry when key is None)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def expire(self, key):
+        """Mark an entry stale but keep its value, so get_or_refresh serves it while recomputing"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries[key] = (0, entry[1])
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
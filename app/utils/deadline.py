@@ -0,0 +1,64 @@
+"""
+Per-request time budget
+A before_request hook stamps every request with a deadline; outbound calls
+(PayOS, Brevo, SMTP) derive their connect/read timeouts from what is left, so
+one slow upstream cannot hold a gunicorn worker past the budget
+"""
+
+import time
+
+from flask import current_app, g, has_request_context, jsonify, render_template, request
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request has no time budget left for an outbound call"""
+
+
+def init_app(app):
+    """Register the deadline middleware and the budget-exhausted error handler"""
+
+    @app.before_request
+    def set_request_deadline():
+        g.deadline = time.monotonic() + app.config.get('REQUEST_TIME_BUDGET', 25.0)
+
+    @app.errorhandler(DeadlineExceeded)
+    def handle_deadline_exceeded(e):
+        app.logger.warning(f'⏱️ [DEADLINE] {request.path}: {str(e)}')
+        if request.is_json or request.path.endswith('.json'):
+            return jsonify({'error': 'Request time budget exhausted'}), 503, {'Retry-After': '30'}
+        return render_template('errors/503.html'), 503, {'Retry-After': '30'}
+
+
+def remaining():
+    """Seconds left in the current request's budget, or None outside a request"""
+    if not has_request_context() or 'deadline' not in g:
+        return None
+    return g.deadline - time.monotonic()
+
+
+def outbound_timeout(read, connect=None):
+    """
+    Connect/read timeouts for an outbound call, capped by the remaining budget
+
+    Args:
+        read: Read timeout the call would use without a deadline
+        connect: Connect timeout (defaults to OUTBOUND_CONNECT_TIMEOUT)
+
+    Returns:
+        tuple: (connect, read) in seconds, usable as requests/urllib3 timeout
+
+    Raises:
+        DeadlineExceeded: If less than MIN_OUTBOUND_BUDGET seconds are left
+    """
+    config = current_app.config
+    if connect is None:
+        connect = config.get('OUTBOUND_CONNECT_TIMEOUT', 3.05)
+
+    left = remaining()
+    if left is None:
+        return connect, read
+
+    if left < config.get('MIN_OUTBOUND_BUDGET', 0.2):
+        raise DeadlineExceeded(f'{max(left, 0):.3f}s left in request budget')
+
+    return min(connect, left), min(read, left)
@@ -3,12 +3,39 @@ Email utility using Brevo API with detailed logging
 Fallback to SMTP if Brevo API fails
 """
 
+import smtplib
+
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 from flask import current_app
-from flask_mail import Message
+from flask_mail import Connection, Message
 from threading import Thread
 
+from app.utils.deadline import DeadlineExceeded, outbound_timeout
+
+
+class TimeoutSMTPConnection(Connection):
+    """Flask-Mail connection whose SMTP socket has a timeout (Flask-Mail sets none)"""
+    
+    def __init__(self, mail, timeout):
+        super().__init__(mail)
+        self.timeout = timeout
+    
+    def configure_host(self):
+        if self.mail.use_ssl:
+            host = smtplib.SMTP_SSL(self.mail.server, self.mail.port, timeout=self.timeout)
+        else:
+            host = smtplib.SMTP(self.mail.server, self.mail.port, timeout=self.timeout)
+        
+        host.set_debuglevel(int(self.mail.debug))
+        
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        
+        return host
+
 
 def send_email_via_brevo_api(to_email, subject, html_content, sender_name="Mahika"):
     """
@@ -38,9 +65,14 @@ def send_email_via_brevo_api(to_email, subject, html_content, sender_name="Mahik
         current_app.logger.info(f"📧 [BREVO API] Subject: {subject}")
         current_app.logger.info(f"📧 [BREVO API] Sender: {sender_name} <{current_app.config.get('MAIL_DEFAULT_SENDER')}>")
         
+        # Time left in the request budget, checked before any network I/O
+        timeout = outbound_timeout(read=current_app.config.get('BREVO_TIMEOUT', 10))
+        
         # Configure Brevo API
         configuration = sib_api_v3_sdk.Configuration()
         configuration.api_key['api-key'] = api_key
+        if current_app.config.get('BREVO_API_URL'):
+            configuration.host = current_app.config['BREVO_API_URL']
         
         api_instance = sib_api_v3_sdk.TransactionalEmailsApi(
             sib_api_v3_sdk.ApiClient(configuration)
@@ -60,7 +92,7 @@ def send_email_via_brevo_api(to_email, subject, html_content, sender_name="Mahik
         current_app.logger.info(f"📧 [BREVO API] Sending email via Brevo API...")
         
         # Send email
-        api_response = api_instance.send_transac_email(send_smtp_email)
+        api_response = api_instance.send_transac_email(send_smtp_email, _request_timeout=timeout)
         
         current_app.logger.info(f"✅ [BREVO API] Email sent successfully to {to_email}")
         current_app.logger.info(f"✅ [BREVO API] Message ID: {api_response.message_id}")
@@ -71,6 +103,15 @@ def send_email_via_brevo_api(to_email, subject, html_content, sender_name="Mahik
             'message_id': api_response.message_id
         }
         
+    except DeadlineExceeded as e:
+        current_app.logger.error(f"⏱️ [BREVO API] Skipped sending to {to_email}: {str(e)}")
+        
+        return {
+            'success': False,
+            'message': f'Request time budget exhausted: {str(e)}',
+            'message_id': None
+        }
+        
     except ApiException as e:
         error_body = e.body if hasattr(e, 'body') else str(e)
         current_app.logger.error(f"❌ [BREVO API] API Exception when sending email to {to_email}")
@@ -95,16 +136,21 @@ def send_email_via_brevo_api(to_email, subject, html_content, sender_name="Mahik
         }
 
 
-def send_async_email_smtp(app, msg):
+def _send_smtp(app, msg, timeout=None):
+    """Send a message over SMTP in this thread; raises if the server does not accept it"""
+    timeout = timeout or app.config.get('MAIL_TIMEOUT', 10)
+    with TimeoutSMTPConnection(app.extensions['mail'], timeout) as connection:
+        msg.send(connection)
+
+
+def send_async_email_smtp(app, msg, timeout=None):
     """Send email via SMTP in background thread (fallback method)"""
     with app.app_context():
         try:
-            from app import mail
-            
             app.logger.info(f"📧 [SMTP FALLBACK] Attempting to send email to {msg.recipients}")
             app.logger.info(f"📧 [SMTP FALLBACK] MAIL_SERVER={app.config.get('MAIL_SERVER')}:{app.config.get('MAIL_PORT')}")
             
-            mail.send(msg)
+            _send_smtp(app, msg, timeout)
             
             app.logger.info(f"✅ [SMTP FALLBACK] Email sent successfully to {msg.recipients}")
             
@@ -127,10 +173,11 @@ def send_email_via_smtp(to_email, subject, html_content, text_content=None):
         dict: {'success': bool, 'message': str, 'message_id': str or None}
     """
     try:
-        from app import mail
-        
         current_app.logger.info(f"📧 [SMTP] Preparing email to {to_email}")
         
+        # Socket timeout for the SMTP session, capped by the request budget
+        _, timeout = outbound_timeout(read=current_app.config.get('MAIL_TIMEOUT', 10))
+        
         msg = Message(
             subject=subject,
             recipients=[to_email],
@@ -141,7 +188,7 @@ def send_email_via_smtp(to_email, subject, html_content, text_content=None):
         # Send asynchronously to prevent blocking
         Thread(
             target=send_async_email_smtp,
-            args=(current_app._get_current_object(), msg)
+            args=(current_app._get_current_object(), msg, timeout)
         ).start()
         
         current_app.logger.info(f"✅ [SMTP] Background thread started for {to_email}")
@@ -202,3 +249,48 @@ def send_email(to_email, subject, html_content, text_content=None, sender_name="
         current_app.logger.error(f"❌ [EMAIL SENDER] All email methods failed")
     
     return result
+
+
+def send_email_now(to_email, subject, html_content, text_content=None, sender_name="Mahika"):
+    """
+    Send an email and wait for the provider - Brevo API first, then SMTP in this thread
+    
+    Unlike send_email, the SMTP fallback is not handed to a background thread,
+    so success means Brevo or the SMTP server accepted the email. Used by the
+    email outbox, whose retries depend on knowing that.
+    
+    Args:
+        to_email: Recipient email address
+        subject: Email subject
+        html_content: HTML content of the email
+        text_content: Plain text content (optional)
+        sender_name: Name to display as sender
+    
+    Returns:
+        dict: {'success': True, 'message': str, 'message_id': str or None}
+    
+    Raises:
+        Exception: Whatever the SMTP fallback raised (connection, timeout, refusal)
+    """
+    if current_app.config.get('BREVO_API_KEY'):
+        result = send_email_via_brevo_api(to_email, subject, html_content, sender_name)
+        if result['success']:
+            return result
+        current_app.logger.warning(f"⚠️ [EMAIL SENDER] Brevo API failed for {to_email}, trying SMTP: {result['message']}")
+    
+    # Connect/send timeout, capped by the request budget when there is one
+    _, timeout = outbound_timeout(read=current_app.config.get('MAIL_TIMEOUT', 10))
+    msg = Message(
+        subject=subject,
+        recipients=[to_email],
+        html=html_content,
+        body=text_content or html_content
+    )
+    _send_smtp(current_app._get_current_object(), msg, timeout)
+    current_app.logger.info(f"✅ [SMTP] Email sent successfully to {to_email}")
+    
+    return {
+        'success': True,
+        'message': 'Email sent successfully via SMTP',
+        'message_id': None
+    }
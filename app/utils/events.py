@@ -0,0 +1,133 @@
+"""
+In-process admin event bus
+Registration, verification and payment changes are queued on the SQLAlchemy
+session and published only after the transaction commits. Published events go
+into one shared ring buffer; each SSE subscriber just remembers the last id it
+sent, so fan-out costs one append per event no matter how many admins listen.
+The bus is per worker process: an admin sees the events raised by the worker
+serving their stream (the dashboard reload still shows the full numbers)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import event as sa_event
+
+from app import db
+
+
+USER_REGISTERED = 'user.registered'
+USER_VERIFIED = 'user.verified'      # data: delta (+1 / -1 per user, or a bulk count)
+USER_PAID = 'user.paid'              # data: delta (users.has_paid flips)
+PAYMENT_CHANGED = 'payment.changed'  # data: order_code, status, amount, email
+
+
+class EventBus:
+    """Bounded buffer of recent events with blocking, timeout-limited reads"""
+
+    def __init__(self, maxlen=500):
+        self._events = deque(maxlen=maxlen)  # (id, type, data, at)
+        self._last_id = 0
+        # SSE ids are "<token>-<n>": an id from another worker or an earlier
+        # process never matches, so a reconnecting client is not sent a replay
+        self.token = os.urandom(4).hex()
+        self._condition = threading.Condition()
+        self._listeners = []
+        self.subscribers = 0
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, event_type, data=None):
+        with self._condition:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data or {}, datetime.utcnow().isoformat()))
+            self._condition.notify_all()
+            event_id = self._last_id
+        for listener in self._listeners:
+            listener(event_type, data or {})
+        return event_id
+
+    def add_listener(self, callback):
+        """Call callback(event_type, data) on the publishing thread after every event"""
+        self._listeners.append(callback)
+
+    def event_id(self, n):
+        return f'{self.token}-{n}'
+
+    def resume_point(self, event_id):
+        """Sequence number to resume after for a client's Last-Event-ID"""
+        token, _, n = (event_id or '').partition('-')
+        if token != self.token or not n.isdigit():
+            return self._last_id
+        return min(int(n), self._last_id)
+
+    def since(self, last_id):
+        """Buffered events newer than last_id (older ones may have been dropped)"""
+        with self._condition:
+            return [e for e in self._events if e[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Block until an event newer than last_id exists or `timeout` seconds pass"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id > last_id, timeout=timeout)
+        return self.since(last_id)
+
+    def try_subscribe(self, limit):
+        with self._condition:
+            if self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+
+bus = EventBus()
+
+
+def publish_after_commit(event_type, **data):
+    """Queue an event on the current session; it is published when the session commits"""
+    db.session.info.setdefault('pending_events', []).append((event_type, data))
+
+
+@sa_event.listens_for(db.session, 'after_commit')
+def _publish_pending(session):
+    for event_type, data in session.info.pop('pending_events', []):
+        bus.publish(event_type, data)
+
+
+@sa_event.listens_for(db.session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('pending_events', None)
+
+
+def sse_stream(last_id, max_seconds, heartbeat=15.0):
+    """
+    Server-Sent Events stream of bus events after last_id
+
+    Ends after max_seconds (the browser's EventSource reconnects with
+    Last-Event-ID), so a stream never holds a worker past its request timeout.
+    Comment lines are sent as heartbeats while idle.
+    """
+    deadline = time.monotonic() + max_seconds
+    yield 'retry: 2000\n\n'
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return
+        events = bus.wait(last_id, timeout=min(heartbeat, left))
+        if not events:
+            yield ': keep-alive\n\n'
+            continue
+        for event_id, event_type, data, at in events:
+            payload = json.dumps(dict(data, at=at), ensure_ascii=False)
+            yield f'id: {bus.event_id(event_id)}\nevent: {event_type}\ndata: {payload}\n\n'
+            last_id = event_id
@@ -0,0 +1,143 @@
+"""
+Streaming exports of users and payments
+Rows are read through a server-side cursor (yield_per) and encoded as CSV or
+NDJSON in fixed-size batches, optionally gzip-compressed on the fly, so memory
+stays constant however many rows the export contains
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import db
+from app.models import User, Payment
+
+
+BATCH_SIZE = 1000
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+USER_COLUMNS = [
+    ('id', User.id),
+    ('email', User.email),
+    ('is_verified', User.is_verified),
+    ('has_paid', User.has_paid),
+    ('is_admin', User.is_admin),
+    ('created_at', User.created_at),
+    ('verified_at', User.verified_at),
+]
+
+PAYMENT_COLUMNS = [
+    ('id', Payment.id),
+    ('payos_order_id', Payment.payos_order_id),
+    ('payos_transaction_id', Payment.payos_transaction_id),
+    ('user_id', Payment.user_id),
+    ('user_email', User.email),
+    ('amount', Payment.amount),
+    ('currency', Payment.currency),
+    ('status', Payment.status),
+    ('created_at', Payment.created_at),
+    ('completed_at', Payment.completed_at),
+]
+
+
+def parse_date_range(date_from, date_to):
+    """
+    Half-open datetime range [from 00:00, day after `to` 00:00) from YYYY-MM-DD strings
+
+    Returns:
+        tuple: (start, end), either may be None
+
+    Raises:
+        ValueError: If a date is not in YYYY-MM-DD format
+    """
+    start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+    end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    return start, end
+
+
+def _rows(columns, filters, join_users=False):
+    """Yield result rows in primary key order through a server-side cursor"""
+    statement = select(*[column for _, column in columns])
+    if join_users:
+        statement = statement.join(User, Payment.user_id == User.id)
+    statement = statement.where(*filters).order_by(columns[0][1])
+    result = db.session.execute(statement.execution_options(yield_per=BATCH_SIZE))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    count = 0
+    for row in rows:
+        writer.writerow([_value(value) for value in row])
+        count += 1
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _encode_ndjson(names, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({name: _value(value) for name, value in zip(names, row)},
+                                ensure_ascii=False))
+        if len(lines) == BATCH_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    """Compress a byte stream into a gzip stream chunk by chunk"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip header + trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(kind, filters, fmt='csv', compress=False):
+    """
+    Byte chunks of a users or payments export
+
+    Args:
+        kind: 'users' or 'payments'
+        filters: SQLAlchemy conditions (payments may filter on User columns)
+        fmt: 'csv' or 'ndjson'
+        compress: gzip the stream
+
+    Returns:
+        generator of bytes
+    """
+    columns = USER_COLUMNS if kind == 'users' else PAYMENT_COLUMNS
+    names = [name for name, _ in columns]
+    rows = _rows(columns, filters, join_users=kind == 'payments')
+    chunks = _encode_csv(names, rows) if fmt == 'csv' else _encode_ndjson(names, rows)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(kind, fmt, compress):
+    return f'{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}' + ('.gz' if compress else '')
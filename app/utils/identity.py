@@ -0,0 +1,340 @@
+"""
+Identity cache for Flask-Login's user_loader
+Authenticated requests resolve current_user from an in-process LRU of the few
+user columns the app reads (never password_hash) instead of loading the full
+users row every time. Each user has a version number that is bumped after a
+commit changes their verification, payment or admin-toggled flags; a cached
+entry is only served while its version is current, so changed entitlements
+are never read from the cache. The versions live in a store shared by every
+gunicorn worker, like the rate limiter's counters: a local SQLite file
+(default, one host) or a Redis-compatible server (IDENTITY_VERSION_BACKEND=redis,
+needs the `redis` package), so a change committed in one worker invalidates the
+entry in all of them
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event as sa_event, select
+
+from app import db
+from app.models import User
+
+
+# Columns copied into the cache, in CachedUser constructor order
+COLUMNS = (User.id, User.email, User.is_verified, User.has_paid, User.is_admin,
+           User.created_at, User.verified_at)
+
+
+class CachedUser(UserMixin):
+    """Read-only stand-in for User as current_user (no password hash, no relationships)"""
+
+    def __init__(self, id, email, is_verified, has_paid, is_admin, created_at, verified_at):
+        self.id = id
+        self.email = email
+        self.is_verified = is_verified
+        self.has_paid = has_paid
+        self.is_admin = is_admin
+        self.created_at = created_at
+        self.verified_at = verified_at
+
+    # Same behaviour as the model; these only read the columns above
+    can_download = User.can_download
+    generate_verification_token = User.generate_verification_token
+    generate_reset_token = User.generate_reset_token
+
+    def __repr__(self):
+        return f'<User {self.email} (cached)>'
+
+
+CLEANUP_PROBABILITY = 0.002
+
+
+def new_version():
+    """
+    Version number for a bump: the bump time in microseconds
+
+    Versions are never reused, so forgetting old ones (they read as 0 again)
+    cannot make an entry cached under an earlier version current again.
+    """
+    return time.time_ns() // 1000
+
+
+class MemoryVersions:
+    """Versions in this process only (single worker, local runs)"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._versions = {}  # user_id -> (version, bumped_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, (0, 0))[0]
+
+    def bump(self, user_ids):
+        now = time.time()
+        with self._lock:
+            for user_id in user_ids:
+                self._versions[user_id] = (new_version(), now)
+            if random.random() < CLEANUP_PROBABILITY:
+                # Mọi dòng nạp trước các lần bump này đã hết hạn, có thể quên version
+                cutoff = now - 2 * self.ttl
+                self._versions = {user_id: value for user_id, value in self._versions.items()
+                                  if value[1] > cutoff}
+
+
+class SQLiteVersions:
+    """
+    Versions in a SQLite file shared by the workers of one host
+
+    A lookup is one primary-key read of a memory-mapped file; a bump is one
+    short IMMEDIATE transaction. Rows bumped more than twice the TTL ago are
+    pruned now and then, since every entry loaded before them has expired.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('PRAGMA mmap_size=16777216')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS identity_versions ('
+                ' user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL, bumped_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_identity_versions_bumped'
+                               ' ON identity_versions (bumped_at)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, user_id):
+        row = self._connection().execute(
+            'SELECT version FROM identity_versions WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, user_ids):
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT INTO identity_versions (user_id, version, bumped_at) VALUES (?, ?, ?)'
+                ' ON CONFLICT (user_id) DO UPDATE SET version = excluded.version,'
+                ' bumped_at = excluded.bumped_at',
+                [(user_id, new_version(), now) for user_id in user_ids]
+            )
+            if random.random() < CLEANUP_PROBABILITY:
+                connection.execute('DELETE FROM identity_versions WHERE bumped_at < ?', (now - 2 * self.ttl,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+
+class RedisVersions:
+    """Versions in a Redis-compatible server (Redis, Valkey, KeyDB), shared across hosts"""
+
+    def __init__(self, url, ttl):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('IDENTITY_VERSION_BACKEND=redis needs the redis package (pip install redis)')
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, user_id):
+        version = self._client.get(f'idv:{user_id}')
+        return int(version) if version else 0
+
+    def bump(self, user_ids):
+        pipeline = self._client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipeline.set(f'idv:{user_id}', new_version(), ex=2 * self.ttl)
+        pipeline.execute()
+
+
+class IdentityCache:
+    """Thread-safe LRU of user rows with a TTL, each tagged with the user's version when loaded"""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, version, row)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0          # misses caused by a version bump
+        self.invalidations = 0
+        self.evictions = 0
+        self.version_errors = 0  # version store failures (served from the database)
+
+    def get(self, user_id, version):
+        """The cached row of a user if it is fresh and was loaded under `version`, else None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, entry_version, row = entry
+                if expires_at > now and entry_version == version:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return row
+                if expires_at > now:
+                    self.stale += 1
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, row, version, loaded_at):
+        """
+        Cache a row read at `loaded_at` (monotonic) while the user's version was `version`
+
+        A row loaded before a concurrent bump carries the old version and is
+        never served; expiry counts from the load, not from this call.
+        """
+        with self._lock:
+            self._entries[user_id] = (loaded_at + self.ttl, version, row)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, user_ids):
+        """Drop this worker's entries of users whose versions were just bumped"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'versions': type(_versions).__name__ if _versions else None,
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'version_errors': self.version_errors,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# Shared by every request in this worker (resized from config by init_app)
+identity_cache = IdentityCache()
+
+_versions = None
+_versions_lock = threading.Lock()
+_last_warning = float('-inf')
+
+
+def init_app(app):
+    identity_cache.maxsize = app.config.get('IDENTITY_CACHE_SIZE', 10000)
+    identity_cache.ttl = app.config.get('IDENTITY_CACHE_TTL', 60)
+
+
+def make_versions(config):
+    ttl = config.get('IDENTITY_CACHE_TTL', 60)
+    name = config.get('IDENTITY_VERSION_BACKEND', 'sqlite')
+    if name == 'redis':
+        return RedisVersions(config['IDENTITY_REDIS_URL'], ttl)
+    if name == 'memory':
+        return MemoryVersions(ttl)
+    return SQLiteVersions(config.get('IDENTITY_VERSION_SQLITE_PATH')
+                          or os.path.join(tempfile.gettempdir(), 'mahika-identity-versions.db'), ttl)
+
+
+def get_versions():
+    global _versions
+    if _versions is None:
+        with _versions_lock:
+            if _versions is None:
+                _versions = make_versions(current_app.config)
+    return _versions
+
+
+def _version_error(e):
+    global _last_warning
+
+    with identity_cache._lock:
+        identity_cache.version_errors += 1
+        warn = time.monotonic() - _last_warning > 10
+        if warn:
+            _last_warning = time.monotonic()
+    if warn:
+        current_app.logger.error(f'❌ [IDENTITY] Version store error, bypassing the cache: {str(e)}')
+
+
+def load_identity(user_id):
+    """
+    current_user for a session's user id: cached row or one narrow SELECT
+
+    Returns:
+        CachedUser, or None if the user does not exist
+    """
+    try:
+        version = get_versions().get(user_id)
+    except Exception as e:
+        # Không đọc được version thì không dám tin cache: đọc thẳng từ DB
+        _version_error(e)
+        version = None
+
+    row = identity_cache.get(user_id, version) if version is not None else None
+    if row is None:
+        loaded_at = time.monotonic()
+        row = db.session.execute(select(*COLUMNS).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        row = tuple(row)
+        if version is not None:
+            identity_cache.put(user_id, row, version, loaded_at)
+    return CachedUser(*row)
+
+
+def invalidate_after_commit(*user_ids):
+    """Bump the users' versions once the current session commits"""
+    db.session.info.setdefault('identity_changes', set()).update(user_ids)
+
+
+@sa_event.listens_for(db.session, 'after_commit')
+def _bump_changed(session):
+    user_ids = session.info.pop('identity_changes', None)
+    if user_ids:
+        identity_cache.discard(user_ids)
+        try:
+            get_versions().bump(user_ids)
+        except Exception as e:
+            # Worker khác có thể phục vụ bản cũ tới tối đa IDENTITY_CACHE_TTL
+            _version_error(e)
+
+
+@sa_event.listens_for(db.session, 'after_rollback')
+def _drop_changed(session):
+    session.info.pop('identity_changes', None)
@@ -0,0 +1,182 @@
+"""
+Snowflake-style PayOS order code generator
+Codes are unique across gunicorn workers and hosts without touching the database
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows (local development only)
+    fcntl = None
+
+
+# PayOS orderCode phải là số nguyên <= 9007199254740991 (2^53 - 1)
+MAX_ORDER_CODE = 2 ** 53 - 1
+
+# 41 bits milliseconds | 6 bits worker | 6 bits sequence = 53 bits
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+TIMESTAMP_BITS = 41
+WORKER_BITS = 6
+SEQUENCE_BITS = 6
+
+NODE_BITS = 2  # Upper worker bits: one value per host / Railway replica
+SLOT_BITS = WORKER_BITS - NODE_BITS  # Lower worker bits: one value per process on a host
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class OrderCodeError(Exception):
+    """Raised when a worker id cannot be allocated"""
+
+
+class OrderCodeGenerator:
+    """
+    Monotonic order code generator for one process
+
+    Each code is (milliseconds since EPOCH_MS, worker id, sequence). Up to 64
+    codes are issued per millisecond per worker; after that the generator waits
+    for the next millisecond. If the clock steps backwards, the last issued
+    millisecond keeps being used so codes never repeat or decrease.
+    """
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise OrderCodeError(f'worker_id must be between 0 and {MAX_WORKER_ID}')
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    @staticmethod
+    def _now_ms():
+        return int(time.time() * 1000) - EPOCH_MS
+
+    def next_code(self):
+        """Return the next order code"""
+        with self._lock:
+            now = max(self._now_ms(), self._last_ms)
+
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Hết sequence trong millisecond này, chờ millisecond tiếp theo
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+
+            self._last_ms = now
+
+            code = (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+            if code > MAX_ORDER_CODE:
+                raise OrderCodeError('Order code timestamp space exhausted')
+            return code
+
+
+def decode_order_code(code):
+    """Split an order code into (unix timestamp ms, worker id, sequence)"""
+    sequence = code & MAX_SEQUENCE
+    worker_id = (code >> SEQUENCE_BITS) & MAX_WORKER_ID
+    timestamp_ms = (code >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS
+    return timestamp_ms, worker_id, sequence
+
+
+_slot_file = None
+
+
+def _claim_local_slot(lock_dir=None):
+    """
+    Claim a process slot on this host by holding an exclusive file lock
+
+    The lock is released by the OS when the process exits, so a restarted
+    gunicorn worker simply picks up a free slot again.
+    """
+    global _slot_file
+
+    slots = 1 << SLOT_BITS
+    if fcntl is None:
+        return os.getpid() % slots
+
+    lock_dir = lock_dir or tempfile.gettempdir()
+    for slot in range(slots):
+        path = os.path.join(lock_dir, f'mahika-order-code-{slot}.lock')
+        f = open(path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            continue
+        _slot_file = f
+        return slot
+
+    raise OrderCodeError(f'All {slots} order code slots on this host are in use')
+
+
+def configured_node_id():
+    """
+    Node id from the environment, or None if none is configured
+
+    ORDER_CODE_NODE_ID is the setting; ORDER_CODE_WORKER_ID is still read as
+    the node id so older deployments keep working. Either way the value only
+    fills the upper NODE_BITS, the per-process slot is always claimed locally.
+    """
+    value = os.environ.get('ORDER_CODE_NODE_ID', os.environ.get('ORDER_CODE_WORKER_ID'))
+    if value is None or not value.strip():
+        return None
+    return int(value)
+
+
+def allocate_worker_id(node_id=None, lock_dir=None):
+    """
+    Allocate this process's worker id
+
+    The id is the node id (distinct per host / replica) in the upper bits and
+    a local slot claimed with a file lock in the lower bits, so gunicorn
+    workers on the same host never share an id.
+    """
+    if node_id is None:
+        node_id = configured_node_id() or 0
+    if not 0 <= node_id < (1 << NODE_BITS):
+        raise OrderCodeError(f'ORDER_CODE_NODE_ID must be between 0 and {(1 << NODE_BITS) - 1}')
+
+    return (node_id << SLOT_BITS) | _claim_local_slot(lock_dir)
+
+
+def init_app(app):
+    """Check the node id at startup; a missing one is only safe on a single host"""
+    try:
+        node_id = configured_node_id()
+    except ValueError:
+        raise OrderCodeError('ORDER_CODE_NODE_ID must be an integer')
+
+    if node_id is None:
+        app.logger.warning(f'⚠️ [ORDER CODE] ORDER_CODE_NODE_ID is not set, using node 0. '
+                           f'Set a distinct value (0-{(1 << NODE_BITS) - 1}) on every host / replica '
+                           f'or order codes can collide across them')
+    elif not 0 <= node_id < (1 << NODE_BITS):
+        raise OrderCodeError(f'ORDER_CODE_NODE_ID must be between 0 and {(1 << NODE_BITS) - 1}')
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def next_order_code():
+    """Return a new PayOS order code for the current worker process"""
+    global _generator, _generator_pid
+
+    pid = os.getpid()
+    if _generator is None or _generator_pid != pid:
+        with _generator_lock:
+            if _generator is None or _generator_pid != pid:
+                _generator = OrderCodeGenerator(allocate_worker_id())
+                _generator_pid = pid
+
+    return _generator.next_code()
@@ -0,0 +1,285 @@
+"""
+Transactional email outbox
+Routes queue an email by adding an email_outbox row to the transaction that
+needs it (the one inserting the user, for registration), so the response
+never waits on Brevo or SMTP and a rolled-back change sends nothing.
+Delivery workers (EMAIL_OUTBOX_WORKERS threads per worker process) claim due
+rows with SELECT ... FOR UPDATE SKIP LOCKED, lease them, send them through
+send_email_now (Brevo, then SMTP in the worker thread) outside any
+transaction and retry failures with exponential backoff
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event as sa_event, func, insert, select, update
+
+from app import db
+from app.models import EmailOutbox
+from app.utils.email import send_email_now
+
+
+PENDING = 'PENDING'
+SENT = 'SENT'
+FAILED = 'FAILED'
+
+_wake = threading.Event()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'sent': 0,
+    'retried': 0,
+    'failed': 0,        # given up after EMAIL_OUTBOX_MAX_ATTEMPTS
+    'last_send_ms': 0.0,
+    'last_sent_at': None,
+}
+
+
+def enqueue(to_email, subject, html_content, text_content=None, kind='generic'):
+    """
+    Queue an email in the current transaction (sent once it commits)
+
+    Args:
+        to_email: Recipient email address
+        subject: Email subject
+        html_content: Rendered HTML body
+        text_content: Plain text body (optional)
+        kind: What the email is for ('verification', 'reset')
+
+    Returns:
+        EmailOutbox: The pending row
+    """
+    row = EmailOutbox(kind=kind, to_email=to_email, subject=subject,
+                      html_content=html_content, text_content=text_content,
+                      status=PENDING, attempts=0, next_attempt_at=datetime.utcnow())
+    db.session.add(row)
+    db.session.info['outbox_wake'] = True
+    return row
+
+
+def enqueue_many(messages):
+    """
+    Queue many emails in the current transaction with one batched INSERT
+
+    Args:
+        messages: Dicts with to_email, subject, html_content, text_content and kind
+
+    Returns:
+        int: Number of emails queued
+    """
+    if not messages:
+        return 0
+    now = datetime.utcnow()
+    db.session.execute(insert(EmailOutbox.__table__), [
+        dict(message, status=PENDING, attempts=0, next_attempt_at=now, created_at=now)
+        for message in messages
+    ])
+    db.session.info['outbox_wake'] = True
+    return len(messages)
+
+
+@sa_event.listens_for(db.session, 'after_commit')
+def _wake_workers(session):
+    # Worker của tiến trình này gửi ngay; các tiến trình khác thấy ở lần poll kế tiếp
+    if session.info.pop('outbox_wake', None):
+        _wake.set()
+
+
+@sa_event.listens_for(db.session, 'after_rollback')
+def _drop_wake(session):
+    session.info.pop('outbox_wake', None)
+
+
+def backoff(attempts, base, maximum):
+    """Delay before retry number `attempts` (exponential, capped, +/-20% jitter)"""
+    return min(maximum, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def claim(batch_size, lease_seconds):
+    """
+    Lease up to `batch_size` due rows to this caller
+
+    The ids are locked with SKIP LOCKED so concurrent workers take different
+    rows; the lease (next_attempt_at pushed forward, lease_token set) is
+    committed before any email is sent, so no lock is held during delivery and
+    a worker that dies mid-batch only delays its rows by the lease.
+
+    Returns:
+        (lease_token, rows): rows carry id, to_email, subject, html_content,
+        text_content and attempts (this attempt included)
+    """
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    due = (EmailOutbox.status == PENDING, EmailOutbox.next_attempt_at <= now)
+
+    ids = db.session.execute(
+        select(EmailOutbox.id)
+        .where(*due)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.session.commit()
+        return token, []
+
+    # Conditional: without row locks (SQLite) a row another worker leased first is left alone
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ids), *due)
+        .values(lease_token=token, attempts=EmailOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=lease_seconds))
+    )
+    db.session.commit()
+
+    rows = db.session.execute(
+        select(EmailOutbox.id, EmailOutbox.to_email, EmailOutbox.subject,
+               EmailOutbox.html_content, EmailOutbox.text_content, EmailOutbox.attempts)
+        .where(EmailOutbox.id.in_(ids), EmailOutbox.lease_token == token)
+        .order_by(EmailOutbox.id)
+    ).all()
+    db.session.commit()
+    return token, rows
+
+
+def _finish(row_id, token, **values):
+    """Record the outcome of a leased row (ignored if the lease was lost meanwhile)"""
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id == row_id, EmailOutbox.lease_token == token)
+        .values(lease_token=None, **values)
+    )
+    db.session.commit()
+
+
+def _deliver(row, token):
+    """Send one leased row and record the result"""
+    config = current_app.config
+    started = time.perf_counter()
+    try:
+        # Gửi đồng bộ: chỉ coi là đã gửi khi Brevo hoặc máy chủ SMTP đã nhận email
+        send_email_now(to_email=row.to_email, subject=row.subject,
+                       html_content=row.html_content, text_content=row.text_content)
+        error = None
+    except Exception as e:
+        error = str(e) or type(e).__name__
+
+    if error is None:
+        _finish(row.id, token, status=SENT, sent_at=datetime.utcnow(), error=None)
+        with _stats_lock:
+            _stats['sent'] += 1
+            _stats['last_send_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            _stats['last_sent_at'] = datetime.utcnow().isoformat()
+        return
+
+    if row.attempts >= config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8):
+        # Dead letter: giữ lại để kiểm tra, không thử nữa
+        _finish(row.id, token, status=FAILED, error=error[:255])
+        current_app.logger.error(
+            f'❌ [EMAIL OUTBOX] Giving up on email {row.id} to {row.to_email} after {row.attempts} attempts: {error}'
+        )
+        with _stats_lock:
+            _stats['failed'] += 1
+        return
+
+    delay = backoff(row.attempts, config.get('EMAIL_OUTBOX_RETRY_BASE', 30), config.get('EMAIL_OUTBOX_RETRY_MAX', 3600))
+    _finish(row.id, token, error=error[:255], next_attempt_at=datetime.utcnow() + timedelta(seconds=delay))
+    current_app.logger.warning(
+        f'⚠️ [EMAIL OUTBOX] Email {row.id} to {row.to_email} failed (attempt {row.attempts}), retrying in {delay:.0f}s: {error}'
+    )
+    with _stats_lock:
+        _stats['retried'] += 1
+
+
+def deliver_batch(batch_size=2, lease_seconds=300):
+    """
+    Claim and send up to `batch_size` due emails
+
+    Returns:
+        int: Number of rows claimed
+    """
+    token, rows = claim(batch_size, lease_seconds)
+    for row in rows:
+        _deliver(row, token)
+    return len(rows)
+
+
+def outbox_stats():
+    """Outbox backlog (pending, due lag, dead letters) plus this worker's delivery counters"""
+    now = datetime.utcnow()
+    pending, oldest_due = db.session.execute(
+        select(func.count(EmailOutbox.id), func.min(EmailOutbox.next_attempt_at))
+        .where(EmailOutbox.status == PENDING)
+    ).one()
+    failed = db.session.execute(
+        select(func.count(EmailOutbox.id)).where(EmailOutbox.status == FAILED)
+    ).scalar()
+
+    with _stats_lock:
+        stats = dict(_stats)
+
+    stats.update({
+        'pid': os.getpid(),
+        'pending': pending,
+        'dead_letters': failed,
+        'lag_seconds': round(max(0.0, (now - oldest_due).total_seconds()), 3) if oldest_due else 0.0,
+    })
+    return stats
+
+
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+
+def _deliver_forever(app):
+    batch_size = app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 2)
+    lease_seconds = app.config.get('EMAIL_OUTBOX_LEASE', 300)
+    interval = app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 2.0)
+
+    while True:
+        # Xóa cờ trước khi lấy việc: email được commit trong lúc đang gửi sẽ đánh thức vòng kế tiếp
+        _wake.clear()
+        with app.app_context():
+            try:
+                taken = deliver_batch(batch_size, lease_seconds)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f'❌ [EMAIL OUTBOX] Delivery worker error: {str(e)}', exc_info=True)
+                taken = 0
+            finally:
+                db.session.remove()
+        if not taken:
+            _wake.wait(interval)
+
+
+def start_workers(app):
+    """
+    Start this worker process's delivery threads (once per pid)
+
+    Called lazily from a before_request hook, like the webhook inbox consumer,
+    so every gunicorn worker runs its own threads, including after a --preload fork.
+    """
+    global _workers_pid
+
+    pid = os.getpid()
+    if _workers_pid == pid:
+        return
+
+    with _workers_lock:
+        if _workers_pid == pid:
+            return
+        count = app.config.get('EMAIL_OUTBOX_WORKERS', 4)
+        for n in range(count):
+            threading.Thread(
+                target=_deliver_forever,
+                args=(app,),
+                name=f'email-outbox-{n}',
+                daemon=True
+            ).start()
+        _workers_pid = pid
+        app.logger.info(f'📤 [EMAIL OUTBOX] {count} delivery worker(s) started in worker {pid}')
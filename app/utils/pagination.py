@@ -0,0 +1,99 @@
+"""
+Keyset (cursor) pagination helpers
+Pages are addressed by the (created_at, id) of a boundary row instead of an
+OFFSET, so every page is an index range scan regardless of depth
+"""
+
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+# items: rows of this page (newest first)
+# next_cursor: cursor of the following (older) page, None on the last page
+# prev_cursor: cursor of the preceding (newer) page, None on the first page
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(created_at, row_id, direction='next'):
+    """Build an opaque URL-safe cursor for the row (created_at, id)"""
+    raw = f'{direction}|{created_at.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor built by encode_cursor
+
+    Returns:
+        tuple: (direction, created_at, id), or None if the cursor is missing or invalid
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(query, created_col, id_col, cursor=None, per_page=20):
+    """
+    Return one page of `query` ordered by (created_at DESC, id DESC)
+
+    Args:
+        query: SQLAlchemy query or select with filters already applied
+        created_col: created_at column of the paginated entity
+        id_col: primary key column of the paginated entity
+        cursor: Cursor from a previous page (None for the newest page)
+        per_page: Rows per page
+
+    Returns:
+        KeysetPage
+    """
+    decoded = decode_cursor(cursor)
+    direction = decoded[0] if decoded else 'next'
+
+    if decoded:
+        _, created_at, row_id = decoded
+        if direction == 'next':
+            # Hàng cũ hơn cursor
+            query = query.filter(or_(created_col < created_at,
+                                     and_(created_col == created_at, id_col < row_id)))
+        else:
+            # Hàng mới hơn cursor
+            query = query.filter(or_(created_col > created_at,
+                                     and_(created_col == created_at, id_col > row_id)))
+
+    if direction == 'next':
+        query = query.order_by(created_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(created_col.asc(), id_col.asc())
+
+    # One extra row tells whether another page exists in this direction
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'prev':
+        rows.reverse()
+
+    created_key, id_key = created_col.key, id_col.key
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+
+    if direction == 'next':
+        has_next, has_prev = has_more, decoded is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    next_cursor = encode_cursor(getattr(last, created_key), getattr(last, id_key), 'next') \
+        if rows and has_next else None
+    prev_cursor = encode_cursor(getattr(first, created_key), getattr(first, id_key), 'prev') \
+        if rows and has_prev else None
+
+    return KeysetPage(rows, next_cursor, prev_cursor)
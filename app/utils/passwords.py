@@ -0,0 +1,167 @@
+"""
+Password hashing off the request threads
+During requests, hashing and verification run in a small per-worker process
+pool, so a login burns CPU in a pool process instead of competing with the
+worker's other request threads for the whole key derivation; the pool also
+caps how many derivations a worker runs at once. The scheme and its cost come from config
+(PASSWORD_HASH_METHOD, e.g. 'pbkdf2:sha256:600000' or 'scrypt:32768:8:1');
+hashes stored under an older policy are upgraded on the next successful login
+"""
+
+import atexit
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, has_request_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+# password_hash of accounts that have no password yet (imported, waiting for activation)
+UNUSABLE_PREFIX = '!'
+
+_method_prefixes = {}  # PASSWORD_HASH_METHOD -> prefix of the hashes it produces
+
+_pools = {}  # name -> (pid, ProcessPoolExecutor): 'requests' for logins, 'import' for bulk imports
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Raised when a password hash did not come back from the pool within PASSWORD_HASH_TIMEOUT"""
+
+
+def _get_pool(workers, name='requests'):
+    """This worker process's hashing pool `name`, created on first use (once per pid)"""
+    pid = os.getpid()
+    entry = _pools.get(name)
+    if entry and entry[0] == pid:
+        return entry[1]
+
+    with _pool_lock:
+        entry = _pools.get(name)
+        if not entry or entry[0] != pid:
+            # 'spawn': forking a process that already runs request threads can
+            # copy locks held by those threads into the child
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+            entry = _pools[name] = (pid, pool)
+    return entry[1]
+
+
+def discard_pool(name):
+    """Forget a broken pool so the next use starts a new one"""
+    with _pool_lock:
+        _pools.pop(name, None)
+
+
+def _run(function, *args):
+    """
+    Run `function` in the pool when serving a request, else inline
+
+    Scripts and app-context jobs hash inline: the pool's spawned processes
+    re-import the __main__ module, which only entry points guarded by
+    `if __name__ == '__main__'` (gunicorn, app.py, scripts/) tolerate.
+    """
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if not workers or not has_request_context():
+        return function(*args)
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT', 30)
+    try:
+        future = _get_pool(workers).submit(function, *args)
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        # Hàng đợi của pool quá dài: bỏ lượt này (nếu chưa chạy) và báo bận thay vì lỗi 500
+        future.cancel()
+        current_app.logger.warning(f'⚠️ [PASSWORD] Hash not done within {timeout}s, pool busy')
+        raise HashingBusy(f'password hashing took longer than {timeout}s')
+    except BrokenProcessPool:
+        # Tiến trình con chết (OOM, bị kill): dựng lại pool ở lần sau, lần này tính tại chỗ
+        discard_pool('requests')
+        current_app.logger.error('❌ [PASSWORD] Hashing pool broken, hashing inline and restarting it')
+        return function(*args)
+
+
+def current_method():
+    return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+
+
+def hash_password(password, method=None):
+    """Hash a password with the configured scheme (Werkzeug 'method$salt$hash' format)"""
+    return _run(generate_password_hash, password, method or current_method())
+
+
+def verify_password(password_hash, password):
+    """Check a password against any stored Werkzeug hash (pbkdf2 or scrypt, any cost)"""
+    return _run(check_password_hash, password_hash, password)
+
+
+def method_prefix(method=None):
+    """
+    The method part Werkzeug writes into hashes made with `method`
+
+    Werkzeug fills in default costs ('scrypt' -> 'scrypt:32768:8:1', a bare
+    'pbkdf2:sha256' gets its iteration count), so the prefix is taken from a
+    dummy hash, computed once per method and process.
+    """
+    method = method or current_method()
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = _method_prefixes[method] = _run(generate_password_hash, '', method).split('$', 1)[0]
+    return prefix
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with a scheme or cost other than the configured one"""
+    return password_hash.split('$', 1)[0] != method_prefix()
+
+
+def hash_many(passwords, method=None, pool=None):
+    """
+    Hash many passwords, spread over the processes of `pool` (inline without one)
+
+    With a pool, every hash is submitted at once and the call returns right
+    away: iterate the result to collect the hashes, in input order, so the
+    caller can do other work while they are computed.
+    """
+    method = method or current_method()
+    if pool is None:
+        return [generate_password_hash(password, method) for password in passwords]
+    return pool.map(generate_password_hash, passwords, [method] * len(passwords))
+
+
+def import_pool():
+    """
+    The hashing pool for bulk imports (IMPORT_HASH_WORKERS processes, None if 0)
+
+    Separate from the pool logins use: an import submits a whole chunk of
+    hashes at once, which would otherwise queue in front of every login.
+    """
+    workers = current_app.config.get('IMPORT_HASH_WORKERS', 1)
+    if not workers:
+        return None
+    return _get_pool(workers, 'import')
+
+
+def unusable_hash():
+    """A unique password_hash that no password matches"""
+    return UNUSABLE_PREFIX + secrets.token_hex(16)
+
+
+def has_usable_password(password_hash):
+    return not password_hash.startswith(UNUSABLE_PREFIX)
+
+
+def warm_up():
+    """Start the pool processes and resolve the method prefix now instead of on the first login"""
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if workers:
+        pool = _get_pool(workers)
+        for future in [pool.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+    method_prefix()
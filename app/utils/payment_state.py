@@ -0,0 +1,175 @@
+"""
+Payment state machine
+Every transition is a single conditional UPDATE, so concurrent PayOS return
+redirects and webhooks for the same order produce exactly one winner
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app import db
+from app.models import User, Payment
+from app.utils import events, identity, rollup
+
+
+PENDING = 'PENDING'
+PAID = 'PAID'
+CANCELLED = 'CANCELLED'
+FAILED = 'FAILED'
+EXPIRED = 'EXPIRED'
+
+# Allowed transitions: target status -> statuses it may be applied from
+TRANSITIONS = {
+    PAID: (PENDING,),
+    CANCELLED: (PENDING,),
+    FAILED: (PENDING,),
+    EXPIRED: (PENDING,),
+}
+
+# applied: this call performed the transition
+# status: status of the payment after the call (None if the order does not exist)
+TransitionResult = namedtuple('TransitionResult', ['applied', 'status'])
+
+
+def _transition(order_code, target, values=None, amount=None, user_id=None, commit=True):
+    """
+    Compare-and-set the status of one payment
+
+    Runs UPDATE payments SET status=<target> ... WHERE payos_order_id=? AND
+    status IN (<allowed sources>). When the target is PAID, the owner's
+    users.has_paid flag and the daily_stats rollup are updated in the same
+    transaction. With commit=False the
+    caller owns the transaction (used to batch many orders per commit).
+    """
+    order_code = str(order_code)
+
+    conditions = [
+        Payment.payos_order_id == order_code,
+        Payment.status.in_(TRANSITIONS[target]),
+    ]
+    if amount is not None:
+        conditions.append(Payment.amount == amount)
+    if user_id is not None:
+        conditions.append(Payment.user_id == user_id)
+
+    try:
+        result = db.session.execute(
+            update(Payment)
+            .where(*conditions)
+            .values(status=target, **(values or {}))
+            .execution_options(synchronize_session=False)
+        )
+        applied = result.rowcount == 1
+
+        if applied and target == PAID:
+            newly_paid = db.session.execute(
+                update(User)
+                .where(User.id == select(Payment.user_id)
+                       .where(Payment.payos_order_id == order_code)
+                       .scalar_subquery(),
+                       User.has_paid == False)
+                .values(has_paid=True)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            paid_amount, email, user_id = db.session.execute(
+                select(Payment.amount, User.email, User.id)
+                .join(User, Payment.user_id == User.id)
+                .where(Payment.payos_order_id == order_code)
+            ).one()
+            rollup.record_payment(values['completed_at'], paid_amount)
+            if newly_paid:
+                identity.invalidate_after_commit(user_id)
+                events.publish_after_commit(events.USER_PAID, delta=1)
+            events.publish_after_commit(events.PAYMENT_CHANGED, order_code=order_code, status=target,
+                                        amount=paid_amount, email=email)
+        elif applied:
+            events.publish_after_commit(events.PAYMENT_CHANGED, order_code=order_code, status=target)
+
+        if commit:
+            db.session.commit()
+    except Exception:
+        if commit:
+            db.session.rollback()
+        raise
+
+    if applied:
+        current_app.logger.info(f'💳 [PAYMENT STATE] Order {order_code} -> {target}')
+        return TransitionResult(True, target)
+
+    # Thua cuộc đua (hoặc không tồn tại): đọc trạng thái hiện tại để báo lại cho caller
+    status = db.session.execute(
+        select(Payment.status).where(Payment.payos_order_id == order_code)
+    ).scalar()
+    current_app.logger.info(f'💳 [PAYMENT STATE] Order {order_code} -> {target} not applied (status: {status})')
+    return TransitionResult(False, status)
+
+
+def mark_paid(order_code, transaction_id=None, amount=None, completed_at=None, commit=True):
+    """
+    Mark a PENDING payment as PAID and grant the user access
+
+    Args:
+        order_code: PayOS orderCode
+        transaction_id: PayOS transaction / payment link id
+        amount: If given, the payment amount must match
+        completed_at: Completion time (defaults to now, UTC)
+        commit: Commit immediately (False to join the caller's transaction)
+
+    Returns:
+        TransitionResult
+    """
+    values = {'completed_at': completed_at or datetime.utcnow()}
+    if transaction_id:
+        values['payos_transaction_id'] = str(transaction_id)
+    return _transition(order_code, PAID, values, amount=amount, commit=commit)
+
+
+def mark_cancelled(order_code, user_id=None, commit=True):
+    """Mark a PENDING payment as CANCELLED (only if it belongs to `user_id`, when given)"""
+    return _transition(order_code, CANCELLED, user_id=user_id, commit=commit)
+
+
+def mark_failed(order_code, commit=True):
+    """Mark a PENDING payment as FAILED"""
+    return _transition(order_code, FAILED, commit=commit)
+
+
+def mark_expired(order_code, commit=True):
+    """Mark a PENDING payment whose PayOS link expired as EXPIRED"""
+    return _transition(order_code, EXPIRED, commit=commit)
+
+
+def bulk_transition(order_codes, target, commit=True):
+    """
+    Move many PENDING payments to a non-PAID status with one UPDATE
+
+    Returns:
+        int: Number of payments actually transitioned
+    """
+    if target == PAID:
+        raise ValueError('Use mark_paid for PAID transitions (amount and user flag are per order)')
+    if not order_codes:
+        return 0
+
+    try:
+        result = db.session.execute(
+            update(Payment)
+            .where(
+                Payment.payos_order_id.in_([str(code) for code in order_codes]),
+                Payment.status.in_(TRANSITIONS[target])
+            )
+            .values(status=target)
+            .execution_options(synchronize_session=False)
+        )
+        if commit:
+            db.session.commit()
+    except Exception:
+        if commit:
+            db.session.rollback()
+        raise
+
+    current_app.logger.info(f'💳 [PAYMENT STATE] {result.rowcount}/{len(order_codes)} orders -> {target}')
+    return result.rowcount
@@ -0,0 +1,276 @@
+"""
+PayOS API client with a pooled, keep-alive HTTP session
+One client (and one connection pool) is shared by every request in a worker process
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from app.utils.deadline import outbound_timeout
+
+
+PAYOS_API_URL = 'https://api-merchant.payos.vn'
+
+
+class PayOSError(Exception):
+    """Raised when PayOS cannot be reached or answers with an error"""
+
+    def __init__(self, message, status_code=None, code=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.code = code
+
+
+def create_payos_signature(data, checksum_key):
+    """
+    Create PayOS signature theo format chính thức của PayOS
+    Format chuẩn: amount={amount}&cancelUrl={cancelUrl}&description={description}&orderCode={orderCode}&returnUrl={returnUrl}
+    """
+    # PayOS yêu cầu sắp xếp theo alphabet và format chính xác
+    sorted_keys = sorted(data.keys())
+
+    # Tạo string theo format key=value&key=value
+    parts = []
+    for key in sorted_keys:
+        # Convert value to string, đảm bảo format đúng
+        value = str(data[key])
+        parts.append(f"{key}={value}")
+
+    data_string = "&".join(parts)
+
+    current_app.logger.info(f"📝 [SIGNATURE] Data string: {data_string}")
+
+    # Tạo HMAC SHA256 signature
+    signature = hmac.new(
+        checksum_key.encode('utf-8'),
+        data_string.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+    current_app.logger.info(f"🔐 [SIGNATURE] Generated: {signature}")
+
+    return signature
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report every socket they open"""
+
+    def __init__(self, on_new_connection, **kwargs):
+        # Set before HTTPAdapter.__init__, which builds the pool manager
+        self.on_new_connection = on_new_connection
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        notify = self.on_new_connection
+
+        def counting(base):
+            class CountingPool(base):
+                def _new_conn(self):
+                    notify()
+                    return super()._new_conn()
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting(cls) for scheme, cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class PayOSClient:
+    """
+    Thin PayOS API client
+
+    Owns a requests.Session whose adapter keeps at most `pool_size` connections
+    alive per host, so consecutive checkouts reuse the same TCP+TLS connection.
+    """
+
+    def __init__(self, client_id, api_key, checksum_key, base_url=PAYOS_API_URL,
+                 pool_size=10, timeout=30):
+        self.client_id = client_id
+        self.api_key = api_key
+        self.checksum_key = checksum_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(self._headers())
+        # Non-blocking pool: a burst above pool_size opens extra short-lived
+        # connections instead of waiting (unbounded) for a pooled one
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._new_connections = 0
+
+        self.adapter = CountingAdapter(self._count_new_connection, pool_connections=1,
+                                       pool_maxsize=pool_size, pool_block=False)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def _count_new_connection(self):
+        with self._lock:
+            self._new_connections += 1
+
+    def _headers(self):
+        """Build authentication headers from PAYOS_CLIENT_ID / PAYOS_API_KEY"""
+        return {
+            'x-client-id': self.client_id,
+            'x-api-key': self.api_key,
+            'Content-Type': 'application/json'
+        }
+
+    def is_configured(self):
+        """Check that all PayOS credentials are present"""
+        return all([self.client_id, self.api_key, self.checksum_key])
+
+    def _request(self, method, path, **kwargs):
+        """Send a request through the pooled session and record pool reuse"""
+        url = f'{self.base_url}{path}'
+        # Raises DeadlineExceeded before any I/O if the request budget is spent
+        kwargs.setdefault('timeout', outbound_timeout(read=self.timeout))
+
+        # New sockets are counted by the adapter's pools as they are opened;
+        # every request that did not open one reused a keep-alive connection
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            raise PayOSError(f'PayOS request error: {str(e)}') from e
+        finally:
+            with self._lock:
+                self._requests += 1
+
+        return self._decode(response)
+
+    def _decode(self, response):
+        """Decode a PayOS response and return its `data` payload"""
+        current_app.logger.info(f'PayOS Response Status: {response.status_code}')
+        current_app.logger.info(f'PayOS Response: {response.text}')
+
+        if response.status_code != 200:
+            raise PayOSError(
+                f'PayOS HTTP error: {response.status_code} - {response.text}',
+                status_code=response.status_code
+            )
+
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise PayOSError('PayOS returned invalid JSON', status_code=response.status_code) from e
+
+        if result.get('code') != '00':
+            raise PayOSError(
+                result.get('desc', 'Unknown error'),
+                status_code=response.status_code,
+                code=result.get('code')
+            )
+
+        return result.get('data') or {}
+
+    def create_payment_link(self, order_code, amount, description, return_url, cancel_url,
+                            expired_at=None):
+        """
+        Create a PayOS payment request
+
+        Args:
+            order_code: Integer order code (unique per payment)
+            amount: Amount in VND
+            description: Payment description (max 25 chars)
+            return_url: URL PayOS redirects to after payment
+            cancel_url: URL PayOS redirects to when the user cancels
+            expired_at: Optional Unix timestamp after which the link expires
+
+        Returns:
+            dict: PayOS `data` payload (contains checkoutUrl)
+        """
+        # PayOS giới hạn 25 ký tự cho description
+        description = description[:25]
+
+        signature_data = {
+            "amount": amount,
+            "cancelUrl": cancel_url,
+            "description": description,
+            "orderCode": order_code,
+            "returnUrl": return_url
+        }
+
+        # Payment data GỬI ĐI phải dùng CÙNG description với signature_data
+        payment_data = dict(signature_data)
+        payment_data['signature'] = create_payos_signature(signature_data, self.checksum_key)
+        if expired_at is not None:
+            # expiredAt không nằm trong chuỗi ký signature
+            payment_data['expiredAt'] = int(expired_at)
+
+        data = self._request('POST', '/v2/payment-requests', json=payment_data)
+
+        if not data.get('checkoutUrl'):
+            raise PayOSError('PayOS response has no checkoutUrl')
+
+        return data
+
+    def get_payment_info(self, order_code):
+        """
+        Get the current state of a payment request
+
+        Args:
+            order_code: PayOS orderCode
+
+        Returns:
+            dict: PayOS `data` payload (status, amount, amountPaid, transactions, ...)
+        """
+        return self._request('GET', f'/v2/payment-requests/{order_code}')
+
+    def pool_stats(self):
+        """Return connection pool hit/miss counters for this worker"""
+        with self._lock:
+            total, misses = self._requests, self._new_connections
+
+        hits = max(0, total - misses)
+        return {
+            'pid': os.getpid(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0
+        }
+
+    def close(self):
+        """Close all pooled connections"""
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_payos_client():
+    """
+    Return the PayOS client of the current worker process
+
+    The client is created lazily from app config and recreated after a fork,
+    so gunicorn workers never share sockets with their parent.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            config = current_app.config
+            _client = PayOSClient(
+                client_id=config.get('PAYOS_CLIENT_ID'),
+                api_key=config.get('PAYOS_API_KEY'),
+                checksum_key=config.get('PAYOS_CHECKSUM_KEY'),
+                base_url=config.get('PAYOS_API_URL') or PAYOS_API_URL,
+                pool_size=config.get('PAYOS_POOL_SIZE', 10),
+                timeout=config.get('PAYOS_TIMEOUT', 30)
+            )
+            _client_pid = pid
+
+    return _client
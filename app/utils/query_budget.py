@@ -0,0 +1,104 @@
+"""
+Per-request SQL statement budgets
+Views declare how many statements a request may run with @query_budget(n);
+every statement executed inside a request is counted, and a request that goes
+over its budget is logged (QUERY_BUDGET_MODE='warn') or fails with
+QueryBudgetExceeded ('raise', used by scripts/check_query_budgets.py), so an
+N+1 regression shows up as soon as the page is exercised
+"""
+
+import threading
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a request runs more SQL statements than its view declared"""
+
+
+def query_budget(limit):
+    """
+    Declare the maximum number of SQL statements one request to this view may run
+
+    Place it directly under @bp.route(...) so it marks the registered view.
+    The count includes Flask-Login's user lookup.
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+
+_local = threading.local()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counters = getattr(_local, 'counters', None)
+    if counters:
+        for counter in counters:
+            counter.append(statement)
+    for capture in getattr(_local, 'captures', ()):
+        capture.append((statement, parameters))
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SQL statements executed on this thread inside the block
+
+    Usage:
+        with count_queries() as statements:
+            ...
+        assert len(statements) <= 3
+    """
+    statements = []
+    _local.counters = getattr(_local, 'counters', []) + [statements]
+    try:
+        yield statements
+    finally:
+        _local.counters.remove(statements)
+
+
+@contextmanager
+def capture_queries():
+    """
+    Like count_queries(), but collect (statement, parameters) pairs so the
+    statements can be re-run, e.g. under EXPLAIN
+    """
+    captured = []
+    _local.captures = getattr(_local, 'captures', []) + [captured]
+    try:
+        yield captured
+    finally:
+        _local.captures.remove(captured)
+
+
+def init_app(app):
+    """Count statements per request and enforce the budgets declared by views"""
+    mode = app.config.get('QUERY_BUDGET_MODE', 'warn')
+    if mode == 'off':
+        return
+
+    @app.before_request
+    def start_counting_statements():
+        g.sql_statements = []
+
+    @app.after_request
+    def check_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_budget', None)
+        statements = g.pop('sql_statements', [])
+        if limit is None or len(statements) <= limit:
+            return response
+
+        message = f'{request.endpoint} ran {len(statements)} SQL statements (budget {limit})'
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message + ':\n' + '\n'.join(statements))
+        current_app.logger.warning(f'🐢 [QUERY BUDGET] {message}')
+        return response
@@ -0,0 +1,294 @@
+"""
+Rate limiting for login and password reset
+Each POST is admitted or rejected, per client IP and per email, before any
+user lookup, password hashing or email sending. Limits use a sliding-window
+counter (this window's count plus the previous window's count, weighted by
+how much of it still overlaps the sliding window), so only two counters per
+key are kept. Counters live in a backend shared by every gunicorn worker:
+a local SQLite file (default, one host) or a Redis-compatible server
+(RATE_LIMIT_BACKEND=redis, needs the `redis` package)
+"""
+
+import hashlib
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask import current_app, request
+
+
+# Rule -> config key holding its "<limit>/<seconds>" setting
+RULES = {
+    'login.ip': 'RATE_LIMIT_LOGIN_IP',
+    'login.email': 'RATE_LIMIT_LOGIN_EMAIL',
+    'reset.ip': 'RATE_LIMIT_RESET_IP',
+    'reset.email': 'RATE_LIMIT_RESET_EMAIL',
+}
+
+CLEANUP_PROBABILITY = 0.002
+
+
+def parse_limit(value):
+    """'10/300' -> (10, 300): at most 10 requests per 300 seconds"""
+    limit, _, seconds = str(value).partition('/')
+    return int(limit), int(seconds or 60)
+
+
+def sliding_count(current, previous, elapsed, period):
+    """Requests in the sliding window ending now, estimated from the two fixed windows"""
+    return previous * (1 - elapsed / period) + current
+
+
+def retry_after(current, previous, elapsed, period, limit):
+    """Seconds until one more request fits under `limit`"""
+    if current + 1 > limit:
+        # Phải sang cửa sổ mới, nơi `current` trở thành cửa sổ trước và giảm dần:
+        # current * (1 - t / period) + 1 <= limit
+        wait = (period - elapsed) + period * max(0.0, 1 - (limit - 1) / current)
+    else:
+        # previous * (1 - (elapsed + wait) / period) + current + 1 <= limit
+        wait = period * (1 - (limit - current - 1) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+class MemoryBackend:
+    """Counters in this process only (single worker, local runs)"""
+
+    def __init__(self):
+        self._counts = {}  # (bucket, window) -> count
+        self._lock = threading.Lock()
+
+    def hit(self, bucket, limit, period, now):
+        """
+        Count one request for `bucket` if it fits under `limit`
+
+        Returns:
+            (admitted, retry_after_seconds)
+        """
+        window, elapsed = divmod(now, period)
+        window = int(window)
+        with self._lock:
+            current = self._counts.get((bucket, window), 0)
+            previous = self._counts.get((bucket, window - 1), 0)
+            if sliding_count(current, previous, elapsed, period) + 1 > limit:
+                return False, retry_after(current, previous, elapsed, period, limit)
+            self._counts[(bucket, window)] = current + 1
+            if random.random() < CLEANUP_PROBABILITY:
+                self._counts = {key: count for key, count in self._counts.items()
+                                if (key[1] + 2) * period > now}
+        return True, 0
+
+
+class SQLiteBackend:
+    """
+    Counters in a SQLite file shared by the workers of one host
+
+    Each hit is one short IMMEDIATE transaction, which SQLite serializes across
+    processes; the file is memory-mapped and not fsynced (losing counters on a
+    crash only resets the limits).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('PRAGMA mmap_size=16777216')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_counters ('
+                ' bucket TEXT NOT NULL, window INTEGER NOT NULL, count INTEGER NOT NULL,'
+                ' expires_at REAL NOT NULL, PRIMARY KEY (bucket, window))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_expires'
+                               ' ON rate_limit_counters (expires_at)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def hit(self, bucket, limit, period, now):
+        window, elapsed = divmod(now, period)
+        window = int(window)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(connection.execute(
+                'SELECT window, count FROM rate_limit_counters WHERE bucket = ? AND window IN (?, ?)',
+                (bucket, window, window - 1)
+            ).fetchall())
+            current, previous = counts.get(window, 0), counts.get(window - 1, 0)
+            if sliding_count(current, previous, elapsed, period) + 1 > limit:
+                connection.execute('COMMIT')
+                return False, retry_after(current, previous, elapsed, period, limit)
+            connection.execute(
+                'INSERT INTO rate_limit_counters (bucket, window, count, expires_at) VALUES (?, ?, 1, ?)'
+                ' ON CONFLICT (bucket, window) DO UPDATE SET count = count + 1',
+                (bucket, window, (window + 2) * period)
+            )
+            if random.random() < CLEANUP_PROBABILITY:
+                connection.execute('DELETE FROM rate_limit_counters WHERE expires_at < ?', (now,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return True, 0
+
+
+# Atomic check-and-increment: KEYS = current, previous window; ARGV = limit, previous weight, ttl
+_REDIS_HIT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[2]) + current + 1 > tonumber(ARGV[1]) then
+    return {0, current, previous}
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, current + 1, previous}
+"""
+
+
+class RedisBackend:
+    """Counters in a Redis-compatible server (Redis, Valkey, KeyDB), shared across hosts"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis)')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(_REDIS_HIT)
+
+    def hit(self, bucket, limit, period, now):
+        window, elapsed = divmod(now, period)
+        window = int(window)
+        admitted, current, previous = self._script(
+            keys=[f'rl:{bucket}:{window}', f'rl:{bucket}:{window - 1}'],
+            args=[limit, repr(1 - elapsed / period), 2 * period]
+        )
+        if admitted:
+            return True, 0
+        return False, retry_after(int(current), int(previous), elapsed, period, limit)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {}             # action -> {'admitted': n, 'rejected': n}
+_rejected_by = {}       # rule -> rejected requests
+_errors = 0             # backend failures (requests admitted anyway)
+_last_warning = float('-inf')
+
+
+def make_backend(config):
+    name = config.get('RATE_LIMIT_BACKEND', 'sqlite')
+    if name == 'redis':
+        return RedisBackend(config['RATE_LIMIT_REDIS_URL'])
+    if name == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(config.get('RATE_LIMIT_SQLITE_PATH')
+                         or os.path.join(tempfile.gettempdir(), 'mahika-rate-limit.db'))
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend(current_app.config)
+    return _backend
+
+
+def _count(action, rule=None):
+    with _stats_lock:
+        counters = _stats.setdefault(action, {'admitted': 0, 'rejected': 0})
+        if rule is None:
+            counters['admitted'] += 1
+        else:
+            counters['rejected'] += 1
+            _rejected_by[rule] = _rejected_by.get(rule, 0) + 1
+
+
+def client_ip():
+    """
+    The client address as seen by Railway's proxy
+
+    The proxy appends the address it received the connection from, so the last
+    X-Forwarded-For entry is the one a client cannot forge.
+    """
+    forwarded = request.headers.get('X-Forwarded-For', '')
+    return forwarded.split(',')[-1].strip() or request.remote_addr
+
+
+def _bucket(rule, value):
+    # Băm giá trị để khóa có độ dài cố định và không lưu email dạng rõ
+    return f'{rule}:' + hashlib.sha256(value.encode('utf-8')).hexdigest()[:32]
+
+
+def check(action, email):
+    """
+    Admit or reject a login / reset attempt by client IP, then by email
+
+    Call it before touching the database. A request rejected by the IP rule
+    does not count against the email.
+
+    Args:
+        action: 'login' or 'reset'
+        email: Normalized email from the form
+
+    Returns:
+        0 if admitted, else the seconds the client should wait
+    """
+    global _errors, _last_warning
+
+    config = current_app.config
+    if not config.get('RATE_LIMIT_ENABLED', True):
+        return 0
+
+    now = time.time()
+    for rule, value in ((f'{action}.ip', client_ip() or 'unknown'), (f'{action}.email', email)):
+        limit, period = parse_limit(config[RULES[rule]])
+        try:
+            admitted, wait = get_backend().hit(_bucket(rule, value), limit, period, now)
+        except Exception as e:
+            # Backend lỗi thì cho qua (fail open) thay vì khóa mọi người dùng
+            with _stats_lock:
+                _errors += 1
+                warn = time.monotonic() - _last_warning > 10
+                if warn:
+                    _last_warning = time.monotonic()
+            if warn:
+                current_app.logger.error(f'❌ [RATE LIMIT] Backend error, admitting requests: {str(e)}')
+            continue
+        if not admitted:
+            _count(action, rule)
+            current_app.logger.warning(f'🚫 [RATE LIMIT] {rule} rejected {value} (retry in {wait}s)')
+            return wait
+    _count(action)
+    return 0
+
+
+def rate_limit_stats():
+    """Admitted / rejected requests per action, and rejections per rule, for this worker"""
+    with _stats_lock:
+        actions = {action: dict(counters) for action, counters in _stats.items()}
+        rejected_by = dict(_rejected_by)
+        errors = _errors
+    return {
+        'pid': os.getpid(),
+        'backend': type(_backend).__name__ if _backend else None,
+        'actions': actions,
+        'rejected_by_rule': rejected_by,
+        'admitted': sum(c['admitted'] for c in actions.values()),
+        'rejected': sum(c['rejected'] for c in actions.values()),
+        'backend_errors': errors,
+    }
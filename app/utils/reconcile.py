@@ -0,0 +1,159 @@
+"""
+Reconciliation of stale PENDING payments against PayOS
+Catches payments whose webhook was lost and the user never came back through /payment/return
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models import Payment
+from app.utils import payment_state
+from app.utils.payos import PayOSError, get_payos_client
+
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `rate` calls per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def iter_stale_pending(older_than, page_size=200):
+    """
+    Yield pages of (payos_order_id, amount) for PENDING payments created before `older_than`
+
+    Uses keyset pagination on payments.id, so every page is an index range scan
+    no matter how deep into the table it is.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Payment.id, Payment.payos_order_id, Payment.amount)
+            .where(
+                Payment.id > last_id,
+                Payment.status == payment_state.PENDING,
+                Payment.created_at < older_than
+            )
+            .order_by(Payment.id)
+            .limit(page_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+        if len(rows) < page_size:
+            return
+
+
+def _transaction_id(info):
+    """Pick the bank reference of the first transaction, else the payment link id"""
+    transactions = info.get('transactions') or []
+    if transactions and transactions[0].get('reference'):
+        return transactions[0]['reference']
+    return info.get('id')
+
+
+def _apply_page(rows, infos, report):
+    """Apply one page of PayOS results in a single transaction"""
+    by_order = {row.payos_order_id: row for row in rows}
+    cancelled, expired = [], []
+
+    for order_code, info in infos.items():
+        status = info.get('status')
+        if status == payment_state.PAID:
+            row = by_order[order_code]
+            if info.get('amount') != row.amount:
+                current_app.logger.warning(f'⚠️ [RECONCILE] Order {order_code}: amount mismatch '
+                                           f'({info.get("amount")} != {row.amount}), skipped')
+                report['skipped'] += 1
+                continue
+            result = payment_state.mark_paid(order_code, transaction_id=_transaction_id(info),
+                                             amount=row.amount, commit=False)
+            report['paid'] += int(result.applied)
+        elif status == payment_state.CANCELLED:
+            cancelled.append(order_code)
+        elif status == payment_state.EXPIRED:
+            expired.append(order_code)
+        else:
+            report['still_pending'] += 1
+
+    report['cancelled'] += payment_state.bulk_transition(cancelled, payment_state.CANCELLED, commit=False)
+    report['expired'] += payment_state.bulk_transition(expired, payment_state.EXPIRED, commit=False)
+    db.session.commit()
+
+
+def reconcile_pending(min_age_minutes=30, page_size=200, concurrency=8, rate=10.0, client=None):
+    """
+    Query PayOS for every stale PENDING payment and apply the results
+
+    Args:
+        min_age_minutes: Only payments older than this are checked
+        page_size: Payments loaded (and committed) per page
+        concurrency: Parallel PayOS requests
+        rate: Maximum PayOS requests per second
+        client: PayOSClient to use (defaults to the worker's shared client)
+
+    Returns:
+        dict: Counters plus elapsed seconds and orders/second
+    """
+    app = current_app._get_current_object()
+    client = client or get_payos_client()
+    limiter = RateLimiter(rate)
+    older_than = datetime.utcnow() - timedelta(minutes=min_age_minutes)
+
+    report = {'checked': 0, 'paid': 0, 'cancelled': 0, 'expired': 0,
+              'still_pending': 0, 'skipped': 0, 'errors': 0}
+
+    def fetch(order_code):
+        limiter.acquire()
+        with app.app_context():
+            try:
+                return order_code, client.get_payment_info(order_code)
+            except PayOSError as e:
+                app.logger.error(f'❌ [RECONCILE] Order {order_code}: {e.message}')
+                return order_code, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for rows in iter_stale_pending(older_than, page_size):
+            infos = {}
+            for order_code, info in pool.map(fetch, [row.payos_order_id for row in rows]):
+                if info is None:
+                    report['errors'] += 1
+                else:
+                    infos[order_code] = info
+            report['checked'] += len(rows)
+            try:
+                _apply_page(rows, infos, report)
+            except Exception:
+                db.session.rollback()
+                raise
+            current_app.logger.info(f'🔄 [RECONCILE] Page done, {report["checked"]} checked so far')
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['orders_per_second'] = round(report['checked'] / elapsed, 2) if elapsed else 0.0
+    return report
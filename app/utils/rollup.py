@@ -0,0 +1,225 @@
+"""
+Daily statistics rollup
+daily_stats holds one pre-aggregated row per UTC day. State changes bump the
+row for their day with an atomic upsert-increment in the caller's transaction;
+rebuild() recomputes any day range from the raw tables (nightly catch-up and
+backfill), so a missed increment only lives until the next run
+"""
+
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.models import User, Payment, DailyStat
+from app.utils.time_ranges import add_months, between, days_range, paid_between
+
+
+COUNTERS = ('new_users', 'verified_users', 'paid_payments', 'revenue')
+
+
+def _day(value):
+    """UTC day of a datetime/date (defaults to today)"""
+    if value is None:
+        return datetime.utcnow().date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _upsert_increment(day, **deltas):
+    """
+    INSERT the day's row or add the deltas to it, as one statement
+
+    MySQL uses ON DUPLICATE KEY UPDATE, SQLite/PostgreSQL use ON CONFLICT; the
+    increment happens in the database so concurrent writers never lose updates.
+    Runs in the current session transaction (the caller commits).
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+
+    table = DailyStat.__table__
+    now = datetime.utcnow()
+    values = {name: 0 for name in COUNTERS}
+    values.update(deltas, day=day, updated_at=now)
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            updated_at=now,
+            **{name: table.c[name] + stmt.inserted[name] for name in deltas}
+        )
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day],
+            set_=dict(updated_at=now, **{name: table.c[name] + stmt.excluded[name] for name in deltas})
+        )
+    else:
+        raise NotImplementedError(f'daily_stats upsert not supported on {dialect}')
+
+    db.session.execute(stmt)
+
+
+def record_registration(when=None, count=1):
+    """Count new users (one, or a bulk import's `count`) on the day they were created"""
+    _upsert_increment(_day(when), new_users=count)
+
+
+def record_verification(when=None, delta=1):
+    """Count (delta=1) or uncount (delta=-1) a verification on the verified_at day"""
+    _upsert_increment(_day(when), verified_users=delta)
+
+
+def record_payment(when, amount):
+    """Count a PAID payment and its amount on the completed_at day"""
+    _upsert_increment(_day(when), paid_payments=1, revenue=int(amount or 0))
+
+
+def as_date(value):
+    # func.date() trả về DATE trên MySQL nhưng là chuỗi 'YYYY-MM-DD' trên SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _grouped(column, *aggregates, filters=()):
+    """Rows of (day, *aggregates) grouped by the UTC day of `column`"""
+    day = func.date(column)
+    return db.session.execute(
+        select(day, *aggregates).where(*filters).group_by(day)
+    ).all()
+
+
+def _aggregate_days(start, end):
+    """Recompute every counter for days in [start, end) from the raw tables"""
+    start_at, end_at = days_range(start, end)
+    rows = {}
+
+    def row(day):
+        return rows.setdefault(as_date(day), {name: 0 for name in COUNTERS})
+
+    for day, count in _grouped(User.created_at, func.count(User.id),
+                               filters=between(User.created_at, start_at, end_at)):
+        row(day)['new_users'] = int(count)
+
+    for day, count in _grouped(User.verified_at, func.count(User.id),
+                               filters=between(User.verified_at, start_at, end_at) + [User.is_verified == True]):
+        row(day)['verified_users'] = int(count)
+
+    for day, count, revenue in _grouped(Payment.completed_at, func.count(Payment.id),
+                                        func.coalesce(func.sum(Payment.amount), 0),
+                                        filters=paid_between(start_at, end_at)):
+        row(day)['paid_payments'] = int(count)
+        row(day)['revenue'] = int(revenue)
+
+    return rows
+
+
+def rebuild(start, end, chunk_days=31):
+    """
+    Recompute daily_stats for [start, end) from users and payments
+
+    Works one chunk of days per transaction (DELETE the chunk's rows, then
+    INSERT the regrouped counters), so a multi-year backfill never holds a long
+    transaction or loads more than chunk_days rows at once.
+
+    Args:
+        start: First day (date) to rebuild
+        end: Day (date) after the last one to rebuild
+        chunk_days: Days recomputed per transaction
+
+    Returns:
+        int: Number of daily_stats rows written
+    """
+    written = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        try:
+            rows = _aggregate_days(chunk_start, chunk_end)
+            db.session.execute(
+                delete(DailyStat).where(DailyStat.day >= chunk_start, DailyStat.day < chunk_end)
+            )
+            if rows:
+                now = datetime.utcnow()
+                db.session.execute(
+                    insert(DailyStat),
+                    [dict(counters, day=day, updated_at=now) for day, counters in sorted(rows.items())]
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        written += len(rows)
+        chunk_start = chunk_end
+
+    current_app.logger.info(f'📊 [ROLLUP] Rebuilt daily_stats {start} -> {end}: {written} rows')
+    return written
+
+
+def catch_up(days=2):
+    """Rebuild the last `days` days up to and including today (nightly job)"""
+    today = datetime.utcnow().date()
+    return rebuild(today - timedelta(days=days - 1), today + timedelta(days=1))
+
+
+def backfill(chunk_days=31):
+    """Rebuild daily_stats from the earliest user or payment up to today"""
+    first = db.session.execute(
+        select(func.min(User.created_at))
+    ).scalar()
+    first_payment = db.session.execute(
+        select(func.min(Payment.completed_at)).where(Payment.status == 'PAID')
+    ).scalar()
+    candidates = [value for value in (first, first_payment) if value is not None]
+    if not candidates:
+        return 0
+    today = datetime.utcnow().date()
+    return rebuild(min(candidates).date(), today + timedelta(days=1), chunk_days=chunk_days)
+
+
+def monthly_totals(months=12, today=None):
+    """
+    Per-calendar-month counters for the last `months` months, oldest first
+
+    Reads at most ~31 * months daily_stats rows.
+
+    Returns:
+        list[dict]: month ('%m/%Y'), new_users, verified_users, payments_count, revenue
+    """
+    today = today or datetime.utcnow().date()
+    # Lùi đúng `months - 1` tháng theo lịch, không dùng timedelta(days=30)
+    first_month = add_months(today, -(months - 1))
+
+    buckets = {}
+    for offset in range(months):
+        month = add_months(first_month, offset)
+        buckets[(month.year, month.month)] = {
+            'month': month.strftime('%m/%Y'),
+            'new_users': 0,
+            'verified_users': 0,
+            'payments_count': 0,
+            'revenue': 0
+        }
+
+    rows = db.session.execute(
+        select(DailyStat.day, DailyStat.new_users, DailyStat.verified_users,
+               DailyStat.paid_payments, DailyStat.revenue)
+        .where(*between(DailyStat.day, first_month, today + timedelta(days=1)))
+    ).all()
+    for day, new_users, verified_users, paid_payments, revenue in rows:
+        bucket = buckets[(day.year, day.month)]
+        bucket['new_users'] += new_users
+        bucket['verified_users'] += verified_users
+        bucket['payments_count'] += paid_payments
+        bucket['revenue'] += revenue
+
+    return [buckets[key] for key in sorted(buckets)]
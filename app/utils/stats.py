@@ -0,0 +1,270 @@
+"""
+Admin statistics queries
+Each query uses conditional aggregation over half-open time ranges, so the
+whole dashboard is two table passes instead of one query per counter, and the
+weekly cohort funnel is a single grouped query
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import DateTime, Integer, and_, case, cast, extract, func, literal, literal_column, select, text
+
+from app import db
+from app.models import User, Payment
+from app.utils import events
+from app.utils.cache import TTLCache
+from app.utils.time_ranges import between, days_range, last_days_range, paid_between, today_range, week_start
+
+
+# Shared by every admin request in this worker
+stats_cache = TTLCache(default_ttl=30)
+count_cache = TTLCache(default_ttl=60)
+
+# value: number shown as the list total
+# approximate: value is an estimate or may be up to a TTL old ("~")
+# at_least: counting stopped at value; there are more rows ("+")
+ListTotal = namedtuple('ListTotal', ['value', 'approximate', 'at_least'])
+
+SEARCH_COUNT_CAP = 1000
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def dashboard_stats(now=None):
+    """
+    Compute the admin dashboard counters
+
+    Args:
+        now: Reference time (UTC); defaults to datetime.utcnow()
+
+    Returns:
+        dict: Same keys the admin/dashboard.html template reads
+    """
+    now = now or datetime.utcnow()
+    today = today_range(now)
+    last_30_days = last_days_range(30, now)
+
+    is_today = lambda column: and_(*between(column, *today))
+    is_recent = lambda column: and_(*between(column, *last_30_days))
+
+    users = db.session.query(
+        func.count(User.id),
+        _count_if(User.is_verified == True),
+        _count_if(User.has_paid == True),
+        _count_if(is_today(User.created_at)),
+        _count_if(is_recent(User.created_at))
+    ).one()
+
+    payments = db.session.query(
+        func.count(Payment.id),
+        func.coalesce(func.sum(Payment.amount), 0),
+        _count_if(is_today(Payment.completed_at)),
+        _sum_if(is_today(Payment.completed_at), Payment.amount),
+        _count_if(is_recent(Payment.completed_at)),
+        _sum_if(is_recent(Payment.completed_at), Payment.amount)
+    ).filter(*paid_between()).one()
+
+    return {
+        'total_users': int(users[0]),
+        'verified_users': int(users[1]),
+        'paid_users': int(users[2]),
+        'total_payments': int(payments[0]),
+        'total_revenue': int(payments[1]),
+        'today_users': int(users[3]),
+        'today_payments': int(payments[2]),
+        'today_revenue': int(payments[3]),
+        'recent_users': int(users[4]),
+        'recent_payments': int(payments[4]),
+        'recent_revenue': int(payments[5])
+    }
+
+
+def cached_dashboard_stats(ttl=30):
+    """
+    Dashboard counters from the worker cache; one admin recomputes, the rest wait
+
+    Returns:
+        tuple: (stats dict, SSE event id the counters are current up to), so
+        the live feed can replay the events published since they were computed
+    """
+    def compute():
+        last_id = events.bus.last_id
+        return dashboard_stats(), events.bus.event_id(last_id)
+
+    return stats_cache.get_or_compute('dashboard', compute, ttl=ttl)
+
+
+WEEK_SECONDS = 7 * 86400
+
+# Events that can change a cohort's counters
+COHORT_EVENTS = (events.USER_REGISTERED, events.USER_VERIFIED, events.USER_PAID)
+
+
+def _seconds_between(start, end):
+    """Whole seconds from start to end, in the current database's dialect (NULL if either is NULL)"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        return func.timestampdiff(literal_column('SECOND'), start, end, type_=Integer)
+    if dialect == 'sqlite':
+        return cast((func.julianday(end) - func.julianday(start)) * 86400, Integer)
+    return cast(extract('epoch', end - start), Integer)
+
+
+def cohort_report(weeks=12, now=None):
+    """
+    Weekly registration -> verification -> payment funnel
+
+    Users are grouped by the ISO week (Monday, UTC) they registered in; each
+    cohort counts how many verified and how many have a PAID payment, with the
+    average hours from registration to each step. Everything comes from one
+    grouped query over the window's users (ix_users_created) left-joined with
+    their first PAID payment (ix_payments_status_completed); admins are excluded.
+
+    Args:
+        weeks: Number of weekly cohorts, including the current week
+        now: Reference time (UTC); defaults to datetime.utcnow()
+
+    Returns:
+        list[dict]: week (date), registered, verified, paid, verified_rate,
+        paid_rate (percent), hours_to_verify, hours_to_pay (None if no user
+        reached the step); oldest week first
+    """
+    now = now or datetime.utcnow()
+    first_week = week_start(now) - timedelta(weeks=weeks - 1)
+    start, end = days_range(first_week, week_start(now) + timedelta(weeks=1))
+
+    first_paid = select(
+        Payment.user_id,
+        func.min(Payment.completed_at).label('paid_at')
+    ).where(*paid_between(start)).group_by(Payment.user_id).subquery()
+
+    week = _seconds_between(literal(start, DateTime), User.created_at) // WEEK_SECONDS
+    to_verify = case((User.is_verified == True, _seconds_between(User.created_at, User.verified_at)))
+    to_pay = _seconds_between(User.created_at, first_paid.c.paid_at)
+
+    rows = db.session.execute(
+        select(
+            week.label('cohort_week'),
+            func.count(User.id),
+            _count_if(User.is_verified == True),
+            func.count(first_paid.c.paid_at),
+            func.avg(to_verify),
+            func.avg(to_pay)
+        )
+        .outerjoin(first_paid, first_paid.c.user_id == User.id)
+        .where(*between(User.created_at, start, end), User.is_admin == False)
+        # GROUP BY the alias: the bound window start would otherwise be a second,
+        # distinct parameter, which MySQL's ONLY_FULL_GROUP_BY rejects
+        .group_by(literal_column('cohort_week'))
+    ).all()
+    by_week = {int(row[0]): row[1:] for row in rows}
+
+    report = []
+    for index in range(weeks):
+        registered, verified, paid, verify_seconds, pay_seconds = by_week.get(index, (0, 0, 0, None, None))
+        registered, verified, paid = int(registered), int(verified), int(paid)
+        report.append({
+            'week': first_week + timedelta(weeks=index),
+            'registered': registered,
+            'verified': verified,
+            'paid': paid,
+            'verified_rate': round(100 * verified / registered, 1) if registered else 0.0,
+            'paid_rate': round(100 * paid / registered, 1) if registered else 0.0,
+            'hours_to_verify': round(float(verify_seconds) / 3600, 1) if verify_seconds is not None else None,
+            'hours_to_pay': round(float(pay_seconds) / 3600, 1) if pay_seconds is not None else None,
+        })
+    return report
+
+
+def cached_cohort_report(weeks=12, ttl=600):
+    """
+    Cohort report from the worker cache
+
+    A registration, verification or payment event marks the cached report
+    stale: the next reader still gets it immediately while one background
+    thread recomputes it. `ttl` bounds staleness for changes made by other
+    workers, whose events this process never sees.
+
+    Returns:
+        tuple: (report list, datetime it was computed at)
+    """
+    app = current_app._get_current_object()
+
+    def compute():
+        with app.app_context():
+            return cohort_report(weeks), datetime.utcnow()
+
+    return stats_cache.get_or_refresh(('cohorts', weeks), compute, ttl=ttl)
+
+
+def _expire_cohorts(event_type, data):
+    if event_type in COHORT_EVENTS:
+        for key in stats_cache.keys():
+            if isinstance(key, tuple) and key[0] == 'cohorts':
+                stats_cache.expire(key)
+
+
+events.bus.add_listener(_expire_cohorts)
+
+
+def _table_row_estimate(table_name):
+    """InnoDB's row estimate from table statistics (MySQL only), or None"""
+    if db.session.get_bind().dialect.name != 'mysql':
+        return None
+    return db.session.execute(
+        text('SELECT TABLE_ROWS FROM information_schema.TABLES '
+             'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name'),
+        {'name': table_name}
+    ).scalar()
+
+
+def list_total(key, query, table_name=None, search=False, ttl=60):
+    """
+    Total for an admin list without an exact COUNT(*) on every page view
+
+    - search results: counted up to SEARCH_COUNT_CAP rows ("1000+")
+    - unfiltered MySQL tables: information_schema row estimate
+    - otherwise: exact count cached per filter combination; once it is older
+      than `ttl` the stale value is shown while a background thread recounts
+
+    Args:
+        key: Cache key identifying the list and its filters
+        query: Filtered query of the list (ordering is ignored)
+        table_name: Set when the query is unfiltered, to allow a table estimate
+        search: The query has a free-text filter (unbounded key space)
+        ttl: Seconds a cached count is considered fresh
+
+    Returns:
+        ListTotal
+    """
+    if search:
+        limited = query.order_by(None).with_entities(text('1')).limit(SEARCH_COUNT_CAP + 1).subquery()
+        value = db.session.execute(select(func.count()).select_from(limited)).scalar()
+        if value > SEARCH_COUNT_CAP:
+            return ListTotal(SEARCH_COUNT_CAP, False, True)
+        return ListTotal(value, False, False)
+
+    if table_name:
+        estimate = _table_row_estimate(table_name)
+        if estimate is not None:
+            return ListTotal(int(estimate), True, False)
+
+    app = current_app._get_current_object()
+    statement = query.order_by(None).statement
+
+    def compute():
+        # Có thể chạy trong thread nền (làm mới giá trị cũ), nên tự mở app context
+        with app.app_context():
+            return db.session.execute(
+                select(func.count()).select_from(statement.subquery())
+            ).scalar()
+
+    return ListTotal(count_cache.get_or_refresh(key, compute, ttl=ttl), True, False)
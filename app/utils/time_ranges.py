@@ -0,0 +1,68 @@
+"""
+Sargable time-range helpers
+Every helper produces half-open [start, end) datetime bounds compared directly
+against the column, never func.date(column) or extract(...), so MySQL and
+SQLite can answer them with a range scan on the column's index
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from app.models import Payment
+
+
+def day_range(day):
+    """[day 00:00, next day 00:00) for a date or datetime"""
+    if isinstance(day, datetime):
+        day = day.date()
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def today_range(now=None):
+    """Today's bounds (UTC)"""
+    return day_range(now or datetime.utcnow())
+
+
+def days_range(start_day, end_day):
+    """[start_day 00:00, end_day 00:00) for two dates"""
+    return datetime.combine(start_day, time.min), datetime.combine(end_day, time.min)
+
+
+def last_days_range(days, now=None):
+    """The rolling window of the last `days` days: (now - days, None), open-ended"""
+    now = now or datetime.utcnow()
+    return now - timedelta(days=days), None
+
+
+def week_start(day):
+    """Monday of the ISO week containing day (a date or datetime)"""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day - timedelta(days=day.weekday())
+
+
+def add_months(day, months):
+    """First day of the month `months` calendar months after day's month (negative goes back)"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(year, month):
+    """[first of the month 00:00, first of the next month 00:00)"""
+    first = date(year, month, 1)
+    return days_range(first, add_months(first, 1))
+
+
+def between(column, start=None, end=None):
+    """Half-open predicates start <= column < end (either bound may be None)"""
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column < end)
+    return conditions
+
+
+def paid_between(start=None, end=None):
+    """Predicates for PAID payments completed in [start, end) - served by ix_payments_status_completed"""
+    return [Payment.status == 'PAID'] + between(Payment.completed_at, start, end)
@@ -0,0 +1,304 @@
+"""
+Bulk user import from CSV
+Rows are read from the stream one chunk at a time, so a 100k-row file never
+sits in memory. Per chunk: passwords given in the file are hashed across the
+processes of a hashing pool (the next chunk is hashed while this one is
+written); rows without a password get an unusable hash and an activation link
+instead. The users go in as one batched INSERT that skips emails already
+registered, and their emails are queued in the outbox with one more, in the
+same transaction
+"""
+
+import csv
+import itertools
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from flask import current_app, render_template, request, url_for
+from markupsafe import escape
+from sqlalchemy import select
+
+from app import db
+from app.models import User
+from app.routes.auth import get_vietnam_time, validate_email
+from app.utils import events, outbox, passwords, rollup, user_search
+
+
+MAX_ERRORS = 20  # invalid rows listed in a result (the rest are only counted)
+MAX_JOBS = 20    # finished admin upload jobs kept for the import page
+
+# Stand-ins rendered into each email template once per import, then replaced per row
+_EMAIL = 'import-email-placeholder'
+_TOKEN = 'import-token-placeholder'
+
+
+def read_rows(stream):
+    """
+    Yield (line number, email, password) for each CSV record
+
+    The first column is the email, the optional second one a password; a
+    first line whose first cell is "email" is treated as a header.
+    """
+    for number, record in enumerate(csv.reader(stream), 1):
+        if not record or not record[0].strip():
+            continue
+        email = record[0].strip().lower()
+        if number == 1 and email == 'email':
+            continue
+        password = record[1].strip() if len(record) > 1 else ''
+        yield number, email, password
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _EmailBuilder:
+    """Verification / activation emails for imported users, templates rendered once"""
+
+    def __init__(self):
+        current_time_vn = get_vietnam_time()
+        stand_in = User(email=_EMAIL)
+        self.verify_url = url_for('auth.verify_email', token=_TOKEN, _external=True)
+        self.activate_url = url_for('auth.activate_account', token=_TOKEN, _external=True)
+        self.verify_html = render_template('emails/verification.html', user=stand_in,
+                                           verification_url=self.verify_url,
+                                           current_time_vn=current_time_vn)
+        self.activate_html = render_template('emails/activation.html', user=stand_in,
+                                             activation_url=self.activate_url,
+                                             current_time_vn=current_time_vn,
+                                             valid_days=current_app.config.get('IMPORT_ACTIVATION_MAX_AGE', 604800) // 86400)
+
+    def build(self, email, has_password):
+        """Outbox message for one new user: verification if the file set a password, else activation"""
+        user = User(email=email)
+        if has_password:
+            token = user.generate_verification_token()
+            url = self.verify_url.replace(_TOKEN, token)
+            html, subject, kind = self.verify_html, 'Xác thực tài khoản Mahika của bạn', 'verification'
+            text = f'Vui lòng truy cập liên kết sau để xác thực tài khoản: {url}'
+        else:
+            token = user.generate_activation_token()
+            url = self.activate_url.replace(_TOKEN, token)
+            html, subject, kind = self.activate_html, 'Kích hoạt tài khoản Mahika của bạn', 'activation'
+            text = f'Vui lòng truy cập liên kết sau để đặt mật khẩu và kích hoạt tài khoản: {url}'
+        html = html.replace(_TOKEN, token).replace(_EMAIL, str(escape(email)))
+        return {'to_email': email, 'subject': subject, 'html_content': html,
+                'text_content': text, 'kind': kind}
+
+
+def _insert_ignore(rows):
+    """
+    Insert users, skipping emails already registered
+
+    Executed as one executemany of a cached statement: PyMySQL sends it as
+    multi-row INSERT IGNORE ... VALUES batches, SQLite reuses one prepared
+    statement (a literal multi-row VALUES would be recompiled every chunk).
+    """
+    table = User.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table).prefix_with('IGNORE')
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing(index_elements=[table.c.email])
+    else:
+        raise NotImplementedError(f'users bulk insert not supported on {dialect}')
+    db.session.execute(stmt, rows)
+
+
+def _write_chunk(valid, hashes, emails, result):
+    """Insert one chunk of validated rows and queue their emails, in one transaction"""
+    hashes = iter(hashes)
+    now = datetime.utcnow()
+    rows = [{
+        'email': email,
+        'password_hash': next(hashes) if password else passwords.unusable_hash(),
+        'is_verified': False,
+        'has_paid': False,
+        'is_admin': False,
+        'created_at': now,
+    } for _, email, password in valid]
+    has_password = {email: bool(password) for _, email, password in valid}
+
+    try:
+        _insert_ignore(rows)
+        # Hash ngẫu nhiên theo từng dòng nên khớp hash = đúng các dòng vừa được chèn
+        ours = {row['email']: row['password_hash'] for row in rows}
+        inserted = [
+            (user_id, email) for user_id, email, password_hash in db.session.execute(
+                select(User.id, User.email, User.password_hash).where(User.email.in_(list(ours)))
+            )
+            if ours.get(email) == password_hash
+        ]
+        user_search.index_users(db.session.connection(), inserted)
+        if inserted:
+            rollup.record_registration(now, count=len(inserted))
+            events.publish_after_commit(events.USER_REGISTERED, count=len(inserted))
+        if emails is not None:
+            result['emails_queued'] += outbox.enqueue_many(
+                [emails.build(email, has_password[email]) for _, email in inserted]
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    result['inserted'] += len(inserted)
+    result['duplicates'] += len(rows) - len(inserted)
+
+
+def _validate(chunk, result):
+    """Rows of a chunk with a valid, not yet seen (in this chunk) email"""
+    valid, seen = [], set()
+    for number, email, password in chunk:
+        if len(email) > 120 or not validate_email(email):
+            result['invalid'] += 1
+            if len(result['errors']) < MAX_ERRORS:
+                result['errors'].append(f'line {number}: invalid email ({email[:60]})')
+        elif email in seen:
+            result['duplicates'] += 1
+        else:
+            seen.add(email)
+            valid.append((number, email, password))
+    return valid
+
+
+def _drop_registered(valid, result):
+    """Skip rows whose email is already registered, so their passwords are not hashed for nothing"""
+    registered = set(db.session.execute(
+        select(User.email).where(User.email.in_([email for _, email, _ in valid]))
+    ).scalars())
+    db.session.commit()
+    result['duplicates'] += len(registered)
+    return [row for row in valid if row[1] not in registered]
+
+
+def new_result():
+    return {'rows': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'emails_queued': 0,
+            'elapsed': 0.0, 'rows_per_second': 0.0, 'errors': []}
+
+
+def import_users(stream, pool=None, chunk_size=None, send_emails=True, progress=None):
+    """
+    Create users from a CSV text stream
+
+    Needs a request context (a real or test one) to build the email links.
+
+    Args:
+        stream: CSV text stream (email[,password] per line)
+        pool: ProcessPoolExecutor for password hashing (inline if None)
+        chunk_size: Rows per INSERT / transaction (default IMPORT_CHUNK_SIZE)
+        send_emails: Queue verification / activation emails for the new users
+        progress: Called with the result dict after every chunk
+
+    Returns:
+        dict: rows, inserted, duplicates (registered or repeated in the file),
+        invalid, emails_queued, elapsed, rows_per_second and the first errors
+    """
+    chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    method = passwords.current_method()
+    emails = _EmailBuilder() if send_emails else None
+    result = new_result()
+    started = time.perf_counter()
+
+    pending = None  # (rows, hashes) of the chunk whose hashes are being computed
+    for chunk in itertools.chain(_chunks(read_rows(stream), chunk_size), [None]):
+        ready = None
+        if chunk is not None:
+            result['rows'] += len(chunk)
+            valid = _validate(chunk, result)
+            if valid:
+                # Còn lại vài email bị đăng ký giữa chừng thì INSERT IGNORE bỏ qua
+                valid = _drop_registered(valid, result)
+            ready = (valid, passwords.hash_many([password for _, _, password in valid if password],
+                                                method, pool))
+        if pending and pending[0]:
+            _write_chunk(*pending, emails, result)
+        pending = ready
+
+        result['elapsed'] = round(time.perf_counter() - started, 3)
+        result['rows_per_second'] = round(result['rows'] / result['elapsed'], 1) if result['elapsed'] else 0.0
+        if progress:
+            progress(result)
+
+    return result
+
+
+_jobs = OrderedDict()   # job id -> status dict, newest last
+_jobs_lock = threading.Lock()
+
+
+def _run_job(app, job, path, base_url, send_emails, pool):
+    try:
+        with app.test_request_context(base_url=base_url):
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as stream:
+                    result = import_users(stream, pool=pool, send_emails=send_emails,
+                                          progress=lambda result: job.update(result=dict(result)))
+                job.update(status='done', result=result)
+                app.logger.info(
+                    f'📥 [IMPORT] {job["filename"]}: {result["inserted"]} users created from {result["rows"]} rows '
+                    f'in {result["elapsed"]}s ({result["rows_per_second"]} rows/s)'
+                )
+            finally:
+                db.session.remove()
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            passwords.discard_pool('import')
+        job.update(status='failed', error=str(e)[:255])
+        app.logger.error(f'❌ [IMPORT] {job["filename"]} failed: {str(e)}', exc_info=True)
+    finally:
+        os.remove(path)
+
+
+def start_job(upload, send_emails=True):
+    """
+    Import an uploaded CSV in a background thread of this worker
+
+    The upload is copied to a temporary file first (Werkzeug streams it, so
+    nothing is held in memory) and the request returns at once.
+
+    Returns:
+        dict: The job's status (id, filename, status, result, error)
+    """
+    app = current_app._get_current_object()
+    fd, path = tempfile.mkstemp(prefix='mahika-import-', suffix='.csv')
+    os.close(fd)
+    upload.save(path)
+
+    job = {'id': uuid.uuid4().hex[:12], 'filename': upload.filename, 'status': 'running',
+           'started_at': datetime.utcnow(), 'result': new_result(), 'error': None}
+    with _jobs_lock:
+        _jobs[job['id']] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+
+    threading.Thread(
+        target=_run_job,
+        args=(app, job, path, request.host_url, send_emails, passwords.import_pool()),
+        name=f'user-import-{job["id"]}',
+        daemon=True
+    ).start()
+    return job
+
+
+def recent_jobs():
+    """This worker's import jobs, newest first"""
+    with _jobs_lock:
+        return list(reversed(_jobs.values()))
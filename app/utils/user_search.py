@@ -0,0 +1,164 @@
+"""
+Indexed email search for the admin user list
+Short terms are prefix matches served by the users.email index; longer terms
+are substring matches whose candidates come from the user_email_trigrams
+posting table and are then confirmed with LIKE. The trigram table is kept in
+sync by ORM events, so results are identical on MySQL and SQLite
+"""
+
+from sqlalchemy import delete, event, func, insert, literal, select, union_all
+
+from app import db
+from app.models import User, UserEmailTrigram
+
+
+MIN_SUBSTRING_LENGTH = 3
+REBUILD_CHUNK = 5000
+
+# Candidates come from the rarest trigrams only; a trigram's posting list is
+# counted up to PROBE_LIMIT entries, so probing stays cheap for "com", "gma"...
+SELECTIVE_TRIGRAMS = 2
+PROBE_LIMIT = 1000
+
+
+def trigrams(email):
+    """Distinct 3-character substrings of a (lowercased) email"""
+    email = (email or '').lower()
+    return {email[i:i + 3] for i in range(len(email) - 2)}
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _prefix_condition(term):
+    """email starts with term, expressed so both MySQL and SQLite can range-scan ix_users_email"""
+    conditions = [User.email.like(f'{_escape_like(term)}%', escape='\\')]
+    if db.session.get_bind().dialect.name != 'mysql':
+        # SQLite chỉ dùng index cho LIKE khi cột có COLLATE NOCASE, nên thêm điều kiện khoảng
+        # (MySQL tự đổi LIKE 'abc%' thành range scan, và collation _ci không khớp thứ tự nhị phân)
+        conditions += [User.email >= term, User.email < term[:-1] + chr(ord(term[-1]) + 1)]
+    return db.and_(*conditions)
+
+
+def email_condition(search):
+    """
+    WHERE clause for users whose email matches an admin search term
+
+    Terms shorter than MIN_SUBSTRING_LENGTH match as prefixes; longer terms
+    match anywhere in the email.
+
+    Args:
+        search: Raw search box input
+
+    Returns:
+        SQLAlchemy boolean clause, or None when the term is empty
+    """
+    term = (search or '').strip().lower()
+    if not term:
+        return None
+
+    if len(term) < MIN_SUBSTRING_LENGTH:
+        return _prefix_condition(term)
+
+    grams = _selective_trigrams(trigrams(term))
+    candidates = (
+        select(UserEmailTrigram.user_id)
+        .where(UserEmailTrigram.trigram.in_(grams))
+        .group_by(UserEmailTrigram.user_id)
+        .having(func.count() == len(grams))
+    )
+    # Có đủ mọi trigram chưa chắc là chuỗi con (thứ tự có thể khác), nên kiểm tra lại bằng LIKE
+    return db.and_(
+        User.id.in_(candidates),
+        User.email.like(f'%{_escape_like(term)}%', escape='\\')
+    )
+
+
+def _selective_trigrams(grams):
+    """The SELECTIVE_TRIGRAMS trigrams with the shortest posting lists"""
+    if len(grams) <= SELECTIVE_TRIGRAMS:
+        return grams
+
+    # Một câu lệnh cho mọi trigram: UNION ALL các COUNT trên danh sách posting đã LIMIT
+    probes = []
+    for gram in sorted(grams):
+        limited = (
+            select(UserEmailTrigram.user_id)
+            .where(UserEmailTrigram.trigram == gram)
+            .limit(PROBE_LIMIT)
+            .subquery()
+        )
+        probes.append(select(literal(gram).label('trigram'), func.count().label('size')).select_from(limited))
+    sizes = db.session.execute(union_all(*probes)).all()
+
+    return {gram for gram, _ in sorted(sizes, key=lambda row: (row.size, row.trigram))[:SELECTIVE_TRIGRAMS]}
+
+
+def _postings(user_id, email):
+    return [{'trigram': gram, 'user_id': user_id} for gram in sorted(trigrams(email))]
+
+
+def index_users(connection, users):
+    """
+    (Re)write trigram postings for (user_id, email) pairs
+
+    Call this after bulk Core inserts that bypass the ORM events.
+    """
+    users = list(users)
+    if not users:
+        return
+    connection.execute(
+        delete(UserEmailTrigram).where(UserEmailTrigram.user_id.in_([user_id for user_id, _ in users]))
+    )
+    rows = [row for user_id, email in users for row in _postings(user_id, email)]
+    if rows:
+        connection.execute(insert(UserEmailTrigram), rows)
+
+
+@event.listens_for(User, 'after_insert')
+def _index_new_user(mapper, connection, user):
+    index_users(connection, [(user.id, user.email)])
+
+
+@event.listens_for(User, 'after_update')
+def _reindex_changed_email(mapper, connection, user):
+    if db.inspect(user).attrs.email.history.has_changes():
+        index_users(connection, [(user.id, user.email)])
+
+
+@event.listens_for(User, 'after_delete')
+def _unindex_deleted_user(mapper, connection, user):
+    # SQLite không bật foreign_keys mặc định nên ON DELETE CASCADE không tự chạy
+    connection.execute(delete(UserEmailTrigram).where(UserEmailTrigram.user_id == user.id))
+
+
+def rebuild_index(chunk_size=REBUILD_CHUNK):
+    """
+    Rebuild user_email_trigrams from users, one chunk of users per transaction
+
+    Returns:
+        int: Number of users indexed
+    """
+    indexed = 0
+    last_id = 0
+    db.session.execute(delete(UserEmailTrigram))
+    db.session.commit()
+    while True:
+        rows = db.session.execute(
+            select(User.id, User.email)
+            .where(User.id > last_id)
+            .order_by(User.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        try:
+            index_users(db.session.connection(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        indexed += len(rows)
+        last_id = rows[-1][0]
+    return indexed
@@ -0,0 +1,227 @@
+"""
+Durable inbox for PayOS webhooks
+The webhook route only stores the body and acknowledges; a background consumer
+drains the inbox in batches and applies many order updates per transaction
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import db
+from app.models import WebhookInbox
+from app.utils import payment_state
+
+
+MAX_ATTEMPTS = 5
+
+_stats_lock = threading.Lock()
+_stats = {
+    'batches': 0,
+    'processed': 0,
+    'failed': 0,
+    'last_batch_size': 0,
+    'last_batch_ms': 0.0,
+    'last_drained_at': None,
+}
+
+
+def enqueue(payload):
+    """
+    Store a webhook body in the inbox
+
+    Args:
+        payload: Decoded webhook JSON
+
+    Returns:
+        WebhookInbox: The stored row
+    """
+    order_code = (payload.get('data') or {}).get('orderCode')
+    row = WebhookInbox(
+        order_code=str(order_code) if order_code is not None else None,
+        payload=json.dumps(payload)
+    )
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+def _apply(row):
+    """Apply one inbox row inside the caller's transaction"""
+    data = json.loads(row.payload).get('data') or {}
+    order_code = data.get('orderCode')
+    amount = data.get('amount')
+
+    if order_code is None or amount is None:
+        row.error = 'Missing orderCode or amount'
+        return
+
+    result = payment_state.mark_paid(
+        order_code,
+        transaction_id=data.get('reference'),
+        amount=amount,
+        commit=False
+    )
+    if result.status is None:
+        row.error = 'Payment not found'
+    elif result.applied:
+        current_app.logger.info(f'Payment completed via webhook for order {order_code}')
+
+
+def _claim(batch_size):
+    """Lock the oldest unprocessed rows; other workers skip them"""
+    return db.session.execute(
+        select(WebhookInbox)
+        .where(WebhookInbox.processed_at.is_(None))
+        .order_by(WebhookInbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+
+def _apply_one(row_id):
+    """Retry a single row in its own transaction after a batch failure"""
+    row = db.session.execute(
+        select(WebhookInbox).where(WebhookInbox.id == row_id).with_for_update(skip_locked=True)
+    ).scalar()
+    if row is None or row.processed_at is not None:
+        db.session.commit()
+        return True
+
+    try:
+        row.attempts += 1
+        _apply(row)
+        row.processed_at = datetime.utcnow()
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'❌ [WEBHOOK INBOX] Row {row_id} failed: {str(e)}')
+
+        row = db.session.get(WebhookInbox, row_id)
+        row.attempts += 1
+        row.error = str(e)[:255]
+        if row.attempts >= MAX_ATTEMPTS:
+            # Dead letter: keep the row for inspection but stop retrying
+            row.processed_at = datetime.utcnow()
+        db.session.commit()
+        return False
+
+
+def drain_batch(batch_size=100):
+    """
+    Apply up to `batch_size` inbox rows in one transaction
+
+    Returns:
+        int: Number of rows taken from the inbox
+    """
+    started = time.perf_counter()
+    rows = _claim(batch_size)
+    if not rows:
+        db.session.commit()
+        return 0
+
+    row_ids = [row.id for row in rows]
+    failed = 0
+    try:
+        now = datetime.utcnow()
+        for row in rows:
+            row.attempts += 1
+            _apply(row)
+            row.processed_at = now
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f'⚠️ [WEBHOOK INBOX] Batch of {len(row_ids)} failed ({str(e)}), retrying row by row')
+        failed = sum(1 for row_id in row_ids if not _apply_one(row_id))
+
+    with _stats_lock:
+        _stats['batches'] += 1
+        _stats['processed'] += len(row_ids) - failed
+        _stats['failed'] += failed
+        _stats['last_batch_size'] = len(row_ids)
+        _stats['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        _stats['last_drained_at'] = datetime.utcnow().isoformat()
+
+    return len(row_ids)
+
+
+def drain(batch_size=100):
+    """Drain the inbox until it is empty; returns the number of rows taken"""
+    total = 0
+    while True:
+        taken = drain_batch(batch_size)
+        total += taken
+        if taken < batch_size:
+            return total
+
+
+def inbox_stats():
+    """Inbox lag metrics plus this worker's consumer counters"""
+    pending, oldest = db.session.execute(
+        select(func.count(WebhookInbox.id), func.min(WebhookInbox.received_at))
+        .where(WebhookInbox.processed_at.is_(None))
+    ).one()
+
+    with _stats_lock:
+        stats = dict(_stats)
+
+    stats.update({
+        'pid': os.getpid(),
+        'pending': pending,
+        'lag_seconds': round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+    })
+    return stats
+
+
+_consumer_pid = None
+_consumer_lock = threading.Lock()
+
+
+def _consume_forever(app):
+    batch_size = app.config.get('WEBHOOK_INBOX_BATCH_SIZE', 100)
+    interval = app.config.get('WEBHOOK_INBOX_POLL_INTERVAL', 1.0)
+
+    while True:
+        with app.app_context():
+            try:
+                taken = drain(batch_size)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f'❌ [WEBHOOK INBOX] Consumer error: {str(e)}', exc_info=True)
+                taken = 0
+            finally:
+                db.session.remove()
+        if not taken:
+            time.sleep(interval)
+
+
+def start_consumer(app):
+    """
+    Start the background inbox consumer of this worker process (once per pid)
+
+    Called lazily from a before_request hook so every gunicorn worker runs its
+    own consumer, including after a --preload fork.
+    """
+    global _consumer_pid
+
+    pid = os.getpid()
+    if _consumer_pid == pid:
+        return
+
+    with _consumer_lock:
+        if _consumer_pid == pid:
+            return
+        threading.Thread(
+            target=_consume_forever,
+            args=(app,),
+            name='webhook-inbox-consumer',
+            daemon=True
+        ).start()
+        _consumer_pid = pid
+        app.logger.info(f'📥 [WEBHOOK INBOX] Consumer started in worker {pid}')
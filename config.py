@@ -27,7 +27,8 @@ class Config:
         DB_USER = os.environ.get('DB_USER') or 'root'
         DB_PASSWORD = os.environ.get('DB_PASSWORD') or ''
     
-    SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    # SQLALCHEMY_DATABASE_URI overrides the MySQL URL (e.g. sqlite:///local.db for load tests)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI') or f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_timeout': 20,
@@ -35,12 +36,19 @@ class Config:
         'pool_pre_ping': True
     }
     
+    # Request time budget (seconds) - keep below gunicorn's worker timeout (30s)
+    REQUEST_TIME_BUDGET = float(os.environ.get('REQUEST_TIME_BUDGET', '25'))
+    OUTBOUND_CONNECT_TIMEOUT = float(os.environ.get('OUTBOUND_CONNECT_TIMEOUT', '3.05'))
+    MIN_OUTBOUND_BUDGET = float(os.environ.get('MIN_OUTBOUND_BUDGET', '0.2'))  # Fail fast below this
+    
     # Application information
     APP_NAME = os.environ.get('APP_NAME') or 'Mahika'
     APP_FULL_NAME = os.environ.get('APP_FULL_NAME') or 'Mahika English Learning'
     
     # Email configuration - Brevo API (Primary method)
     BREVO_API_KEY = os.environ.get('BREVO_API_KEY')
+    BREVO_API_URL = os.environ.get('BREVO_API_URL')  # Override for a local stand-in
+    BREVO_TIMEOUT = float(os.environ.get('BREVO_TIMEOUT', '10'))
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'phamhoangphuc1824@gmail.com'
     
     # Email configuration - SMTP (Fallback method)
@@ -61,12 +69,98 @@ class Config:
     PAYOS_CHECKSUM_KEY = os.environ.get('PAYOS_CHECKSUM_KEY')
     PAYOS_RETURN_URL = os.environ.get('PAYOS_RETURN_URL') or 'https://mahika-website.up.railway.app/payment/return'
     PAYOS_CANCEL_URL = os.environ.get('PAYOS_CANCEL_URL') or 'https://mahika-website.up.railway.app/payment/cancel'
+    PAYOS_API_URL = os.environ.get('PAYOS_API_URL') or 'https://api-merchant.payos.vn'
+    PAYOS_POOL_SIZE = int(os.environ.get('PAYOS_POOL_SIZE', '10'))  # Keep-alive connections per worker
+    PAYOS_TIMEOUT = int(os.environ.get('PAYOS_TIMEOUT', '30'))
+    
+    # PayOS webhook inbox consumer
+    WEBHOOK_INBOX_CONSUMER = os.environ.get('WEBHOOK_INBOX_CONSUMER', 'True').lower() in ['true', '1', 'yes']
+    WEBHOOK_INBOX_BATCH_SIZE = int(os.environ.get('WEBHOOK_INBOX_BATCH_SIZE', '100'))
+    WEBHOOK_INBOX_POLL_INTERVAL = float(os.environ.get('WEBHOOK_INBOX_POLL_INTERVAL', '1.0'))
     
     # Payment configuration
     PAYMENT_AMOUNT = int(os.environ.get('PAYMENT_AMOUNT', '50000'))  # 5,000 VND
     PAYMENT_CURRENCY = 'VND'
+    PAYMENT_LINK_TTL_MINUTES = int(os.environ.get('PAYMENT_LINK_TTL_MINUTES', '15'))  # Reuse window for PENDING checkout links
     PAYMENT_DESCRIPTION = os.environ.get('PAYMENT_DESCRIPTION') or 'Mahika App Premium'  # Max 25 chars for PayOS
     
+    # Admin statistics cache (seconds)
+    ADMIN_STATS_TTL = int(os.environ.get('ADMIN_STATS_TTL', '30'))
+    # Admin list totals: cached counts older than this are refreshed in the background
+    ADMIN_COUNT_TTL = int(os.environ.get('ADMIN_COUNT_TTL', '60'))
+    # Weekly cohort funnel: number of weeks shown; the cached report is also
+    # refreshed on user/payment events, this TTL covers other workers' changes
+    ADMIN_COHORT_WEEKS = int(os.environ.get('ADMIN_COHORT_WEEKS', '12'))
+    ADMIN_COHORT_TTL = int(os.environ.get('ADMIN_COHORT_TTL', '600'))
+    
+    # Admin live event stream (SSE): a stream ends after this many seconds and the
+    # browser reconnects; at most this many streams per worker (each holds a thread)
+    ADMIN_EVENTS_MAX_SECONDS = float(os.environ.get('ADMIN_EVENTS_MAX_SECONDS', '25'))
+    ADMIN_EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('ADMIN_EVENTS_MAX_SUBSCRIBERS', '4'))
+    
+    # Admin audit log: entries are queued per worker and written in batches by a
+    # background thread (AUDIT_LOG_ASYNC=False writes each entry inline)
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'True').lower() in ['true', '1', 'yes']
+    AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', '10000'))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '200'))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', '1.0'))
+    AUDIT_SHUTDOWN_TIMEOUT = float(os.environ.get('AUDIT_SHUTDOWN_TIMEOUT', '5.0'))
+    
+    # current_user identity cache (per worker): LRU size and seconds an entry may be
+    # served. Entries are checked against per-user versions shared by the workers through
+    # IDENTITY_VERSION_BACKEND: 'sqlite' (one host), 'redis' (IDENTITY_REDIS_URL, needs the
+    # redis package; several hosts) or 'memory' (one worker), so a committed change
+    # invalidates the entry in every worker at once
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', '10000'))
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', '60'))
+    IDENTITY_VERSION_BACKEND = os.environ.get('IDENTITY_VERSION_BACKEND', 'sqlite')
+    IDENTITY_REDIS_URL = os.environ.get('IDENTITY_REDIS_URL',
+                                        os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'))
+    IDENTITY_VERSION_SQLITE_PATH = os.environ.get('IDENTITY_VERSION_SQLITE_PATH')
+    
+    # Password hashing: Werkzeug method string with its cost, e.g. 'pbkdf2:sha256:600000'
+    # or 'scrypt:32768:8:1' (hashes made otherwise are upgraded at the next login);
+    # PASSWORD_HASH_WORKERS processes per worker compute them (0 = on the request thread)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '30'))
+    
+    # Transactional email outbox: EMAIL_OUTBOX_WORKERS delivery threads per worker process
+    # (0 = this process only queues), each leasing EMAIL_OUTBOX_BATCH_SIZE due emails at a
+    # time (sent one after another, so keep it small) for EMAIL_OUTBOX_LEASE seconds;
+    # failures retry after RETRY_BASE * 2^n seconds (capped at RETRY_MAX)
+    EMAIL_OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS', '4'))
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '2'))
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', '2.0'))
+    EMAIL_OUTBOX_LEASE = int(os.environ.get('EMAIL_OUTBOX_LEASE', '300'))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '8'))
+    EMAIL_OUTBOX_RETRY_BASE = float(os.environ.get('EMAIL_OUTBOX_RETRY_BASE', '30'))
+    EMAIL_OUTBOX_RETRY_MAX = float(os.environ.get('EMAIL_OUTBOX_RETRY_MAX', '3600'))
+    
+    # Bulk user import (scripts/import_users.py, /admin/users/import): rows per INSERT and
+    # per transaction, and how long activation links for rows without a password stay valid;
+    # APP_BASE_URL builds those links when no request is being served (CLI). Admin uploads
+    # hash passwords in their own pool of IMPORT_HASH_WORKERS processes, apart from logins
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+    IMPORT_HASH_WORKERS = int(os.environ.get('IMPORT_HASH_WORKERS', '1'))
+    IMPORT_ACTIVATION_MAX_AGE = int(os.environ.get('IMPORT_ACTIVATION_MAX_AGE', str(7 * 24 * 3600)))
+    APP_BASE_URL = os.environ.get('APP_BASE_URL') or 'https://mahika-website.up.railway.app'
+    
+    # Login / password reset rate limits, "<requests>/<seconds>" per client IP and per email;
+    # counters are shared by the workers through RATE_LIMIT_BACKEND: 'sqlite' (one host),
+    # 'redis' (RATE_LIMIT_REDIS_URL, needs the redis package) or 'memory' (one worker)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH')
+    RATE_LIMIT_LOGIN_IP = os.environ.get('RATE_LIMIT_LOGIN_IP', '30/300')
+    RATE_LIMIT_LOGIN_EMAIL = os.environ.get('RATE_LIMIT_LOGIN_EMAIL', '10/300')
+    RATE_LIMIT_RESET_IP = os.environ.get('RATE_LIMIT_RESET_IP', '10/3600')
+    RATE_LIMIT_RESET_EMAIL = os.environ.get('RATE_LIMIT_RESET_EMAIL', '3/3600')
+    
+    # SQL statement budgets declared with @query_budget: 'off', 'warn' (log) or 'raise'
+    QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'warn')
+    
     # File download configuration
     DOWNLOAD_FILE_PATH = os.environ.get('DOWNLOAD_FILE_PATH') or 'downloads/app.exe'
     DOWNLOAD_FILE_URL = os.environ.get('DOWNLOAD_FILE_URL')  # Google Drive direct download URL
@@ -15,7 +15,8 @@ CREATE TABLE IF NOT EXISTS `users` (
   `verified_at` DATETIME DEFAULT NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `uq_users_email` (`email`),
-  KEY `ix_users_email` (`email`)
+  KEY `ix_users_email` (`email`),
+  KEY `ix_users_created` (`created_at`, `id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Tạo bảng payments
@@ -29,13 +30,91 @@ CREATE TABLE IF NOT EXISTS `payments` (
   `status` VARCHAR(50) NOT NULL,
   `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `completed_at` DATETIME DEFAULT NULL,
+  `checkout_url` VARCHAR(512) DEFAULT NULL,
+  `checkout_expires_at` DATETIME DEFAULT NULL,
   PRIMARY KEY (`id`),
   UNIQUE KEY `uq_payments_payos_order_id` (`payos_order_id`),
   UNIQUE KEY `uq_payments_payos_tx` (`payos_transaction_id`),
   KEY `ix_payments_user_id` (`user_id`),
+  KEY `ix_payments_user_created` (`user_id`, `created_at`, `id`),
+  KEY `ix_payments_created` (`created_at`, `id`),
+  KEY `ix_payments_status_completed` (`status`, `completed_at`),
   CONSTRAINT `fk_payments_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Tạo bảng webhook_inbox (PayOS webhook chờ xử lý)
+CREATE TABLE IF NOT EXISTS `webhook_inbox` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `order_code` VARCHAR(255) DEFAULT NULL,
+  `payload` TEXT NOT NULL,
+  `received_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `processed_at` DATETIME DEFAULT NULL,
+  `attempts` INT NOT NULL DEFAULT 0,
+  `error` VARCHAR(255) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `ix_webhook_inbox_order_code` (`order_code`),
+  KEY `ix_webhook_inbox_processed_at` (`processed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tạo bảng daily_stats (số liệu tổng hợp theo ngày cho trang thống kê admin)
+CREATE TABLE IF NOT EXISTS `daily_stats` (
+  `day` DATE NOT NULL,
+  `new_users` INT NOT NULL DEFAULT 0,
+  `verified_users` INT NOT NULL DEFAULT 0,
+  `paid_payments` INT NOT NULL DEFAULT 0,
+  `revenue` BIGINT NOT NULL DEFAULT 0,
+  `updated_at` DATETIME DEFAULT NULL,
+  PRIMARY KEY (`day`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tạo bảng user_email_trigrams (chỉ mục trigram cho tìm kiếm email trong trang admin)
+CREATE TABLE IF NOT EXISTS `user_email_trigrams` (
+  `trigram` VARCHAR(3) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+  `user_id` INT NOT NULL,
+  PRIMARY KEY (`trigram`, `user_id`),
+  KEY `ix_user_email_trigrams_user_id` (`user_id`),
+  CONSTRAINT `fk_user_email_trigrams_user` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tạo bảng admin_audit_log (nhật ký thao tác của admin, ghi theo lô ở nền)
+CREATE TABLE IF NOT EXISTS `admin_audit_log` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `actor_id` INT DEFAULT NULL,
+  `actor_email` VARCHAR(120) DEFAULT NULL,
+  `action` VARCHAR(50) NOT NULL,
+  `target_type` VARCHAR(20) DEFAULT NULL,
+  `target_id` INT DEFAULT NULL,
+  `target_label` VARCHAR(255) DEFAULT NULL,
+  `before_state` TEXT DEFAULT NULL,
+  `after_state` TEXT DEFAULT NULL,
+  `ip_address` VARCHAR(45) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `ix_admin_audit_created` (`created_at`, `id`),
+  KEY `ix_admin_audit_actor` (`actor_email`, `created_at`, `id`),
+  KEY `ix_admin_audit_action` (`action`, `created_at`, `id`),
+  KEY `ix_admin_audit_target` (`target_type`, `target_id`, `created_at`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tạo bảng email_outbox (email giao dịch chờ gửi bởi worker nền)
+CREATE TABLE IF NOT EXISTS `email_outbox` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `kind` VARCHAR(32) NOT NULL,
+  `to_email` VARCHAR(120) NOT NULL,
+  `subject` VARCHAR(255) NOT NULL,
+  `html_content` TEXT NOT NULL,
+  `text_content` TEXT DEFAULT NULL,
+  `status` VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+  `attempts` INT NOT NULL DEFAULT 0,
+  `next_attempt_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `lease_token` VARCHAR(32) DEFAULT NULL,
+  `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `sent_at` DATETIME DEFAULT NULL,
+  `error` VARCHAR(255) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  KEY `ix_email_outbox_due` (`status`, `next_attempt_at`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Tạo tài khoản admin
 -- Email: admin@gmail.com
 -- Password: Admin@123
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Benchmark the admin dashboard statistics before/after aggregation.
+
+Seeds users and payments (1M / 2M by default), then times:
+  - before: the original 11 COUNT/SUM queries with func.date() filters
+  - after:  app.utils.stats.dashboard_stats (two conditional-aggregation queries)
+  - cached: 50 concurrent admins through the single-flight TTL cache
+
+Usage:
+  python scripts/bench_admin_dashboard.py [--users 1000000] [--payments 2000000]
+                                          [--database-url URL] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Add project root and scripts/ to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from seed_data import build_app, seed
+
+
+def legacy_dashboard_stats():
+    """The dashboard queries as they were before conditional aggregation"""
+    from sqlalchemy import func
+    from app import db
+    from app.models import User, Payment
+
+    today = datetime.utcnow().date()
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    return {
+        'total_users': User.query.count(),
+        'verified_users': User.query.filter_by(is_verified=True).count(),
+        'paid_users': User.query.filter_by(has_paid=True).count(),
+        'total_payments': Payment.query.filter_by(status='PAID').count(),
+        'total_revenue': db.session.query(func.sum(Payment.amount)).filter_by(status='PAID').scalar() or 0,
+        'today_users': User.query.filter(func.date(User.created_at) == today).count(),
+        'today_payments': Payment.query.filter(func.date(Payment.completed_at) == today,
+                                               Payment.status == 'PAID').count(),
+        'today_revenue': db.session.query(func.sum(Payment.amount)).filter(
+            func.date(Payment.completed_at) == today, Payment.status == 'PAID').scalar() or 0,
+        'recent_users': User.query.filter(User.created_at >= thirty_days_ago).count(),
+        'recent_payments': Payment.query.filter(Payment.completed_at >= thirty_days_ago,
+                                                Payment.status == 'PAID').count(),
+        'recent_revenue': db.session.query(func.sum(Payment.amount)).filter(
+            Payment.completed_at >= thirty_days_ago, Payment.status == 'PAID').scalar() or 0,
+    }
+
+
+def timed(fn, rounds):
+    durations = []
+    result = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        durations.append((time.perf_counter() - started) * 1000)
+    return result, sum(durations) / len(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--payments', type=int, default=2000000)
+    parser.add_argument('--database-url', help='use an existing (already seeded) database')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--admins', type=int, default=50, help='concurrent admins for the cache test')
+    args = parser.parse_args()
+
+    app = build_app(args.database_url)
+    if not args.database_url:
+        print(f'Seeding {args.users:,} users and {args.payments:,} payments...')
+        print(f'  done in {seed(app, args.users, args.payments):.1f}s')
+
+    from app.utils.stats import dashboard_stats, stats_cache
+
+    with app.app_context():
+        before, before_ms = timed(legacy_dashboard_stats, args.rounds)
+        after, after_ms = timed(dashboard_stats, args.rounds)
+
+    if before != after:
+        print('✗ Results differ:')
+        print(f'  before: {before}')
+        print(f'  after:  {after}')
+        sys.exit(1)
+
+    computations = []
+
+    def admin_view(_):
+        with app.app_context():
+            return stats_cache.get_or_compute('bench', lambda: computations.append(1) or dashboard_stats(), ttl=60)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.admins) as pool:
+        list(pool.map(admin_view, range(args.admins)))
+    cached_ms = (time.perf_counter() - started) * 1000
+
+    print(f'before (11 queries):      {before_ms:10.1f} ms/view')
+    print(f'after  (2 queries):       {after_ms:10.1f} ms/view  ({before_ms / after_ms:.1f}x faster)')
+    print(f'cached ({args.admins} concurrent admins): {cached_ms:7.1f} ms total, '
+          f'{len(computations)} computation(s)')
+
+
+if __name__ == '__main__':
+    main()
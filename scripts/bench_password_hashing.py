@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Benchmark login password verification per hashing scheme and cost.
+
+For each PASSWORD_HASH_METHOD setting, times one verification, then runs
+--threads concurrent "request threads" (gunicorn gthread) verifying passwords
+for --seconds, first inline on the request threads and then through the
+hashing pool of app.utils.passwords. Reports logins/second, logins/second per
+core, and how late a 5 ms sleep in another request thread wakes up meanwhile
+(how much the hashing starves the rest of the worker).
+
+Usage:
+  python scripts/bench_password_hashing.py [--methods pbkdf2:sha256:600000 scrypt:32768:8:1]
+                                           [--threads 8] [--workers N] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from app.utils import passwords
+
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:310000',
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+]
+PASSWORD = 'correct horse battery staple'
+
+
+def make_app(method, workers):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers,
+                      PASSWORD_HASH_TIMEOUT=60)
+    return app
+
+
+def run_load(app, stored_hash, threads, seconds):
+    """Verify from `threads` threads for `seconds`; returns (logins, p95 wake-up delay ms)"""
+    deadline = time.monotonic() + seconds
+    counts = [0] * threads
+    delays = []
+
+    def request_thread(index):
+        with app.test_request_context():
+            while time.monotonic() < deadline:
+                assert passwords.verify_password(stored_hash, PASSWORD)
+                counts[index] += 1
+
+    def probe():
+        # Một request nhẹ khác trong cùng worker: đo độ trễ khi bị hashing giành GIL
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            time.sleep(0.005)
+            delays.append((time.perf_counter() - started - 0.005) * 1000)
+
+    workers = [threading.Thread(target=request_thread, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=probe))
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    delays.sort()
+    p95 = delays[int(len(delays) * 0.95)] if delays else 0.0
+    return sum(counts), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--threads', type=int, default=8, help='request threads (gunicorn --threads)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing pool processes')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f'{cores} CPU core(s), {args.threads} request threads, pool of {args.workers} process(es)\n')
+    print(f'{"method":<24} {"mode":<7} {"ms/login":>9} {"logins/s":>9} {"per core":>9} {"p95 stall":>10}')
+
+    for method in args.methods:
+        stored_hash = generate_password_hash(PASSWORD, method)
+
+        started = time.perf_counter()
+        generate_password_hash(PASSWORD, method)
+        single_ms = (time.perf_counter() - started) * 1000
+
+        for mode, workers in (('inline', 0), ('pool', args.workers)):
+            app = make_app(method, workers)
+            with app.test_request_context():
+                passwords.warm_up()
+            logins, p95 = run_load(app, stored_hash, args.threads, args.seconds)
+            rate = logins / args.seconds
+            # Pool mode uses at most `workers` cores for hashing
+            used_cores = min(cores, workers) if workers else cores
+            print(f'{method:<24} {mode:<7} {single_ms:9.1f} {rate:9.1f} {rate / used_cores:9.1f} {p95:8.1f}ms')
+
+    print('\n✓ Done (pick the costliest method whose per-core rate still covers the peak login rate)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Exercise every admin and payment route against its SQL statement budget.
+
+Builds the app against a throwaway SQLite database with QUERY_BUDGET_MODE=raise,
+seeds users with several payments each (so N+1 patterns show up as extra
+statements), starts the local PayOS stand-in, then requests each route of
+admin_bp and payment_bp. Fails if a route has no @query_budget declaration or
+runs more statements than it declares.
+
+Usage:
+  python scripts/check_query_budgets.py [--users 30] [--payments-per-user 3]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+
+# Add project root and scripts/ to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+os.environ.setdefault('SKIP_DB_INIT', 'true')
+
+import fake_payos
+from config import Config
+
+
+CHECKED_BLUEPRINTS = ('admin', 'payment')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=30)
+    parser.add_argument('--payments-per-user', type=int, default=3)
+    args = parser.parse_args()
+
+    payos_server, _ = fake_payos.make_server(port=0)
+    threading.Thread(target=payos_server.serve_forever, daemon=True).start()
+
+    Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "budgets.db")}'
+    Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+    Config.WEBHOOK_INBOX_CONSUMER = False
+    Config.QUERY_BUDGET_MODE = 'raise'
+    Config.ADMIN_EVENTS_MAX_SECONDS = 0.5
+    Config.TESTING = True
+    Config.PAYOS_API_URL = f'http://127.0.0.1:{payos_server.server_port}'
+    Config.PAYOS_CLIENT_ID, Config.PAYOS_API_KEY, Config.PAYOS_CHECKSUM_KEY = \
+        'fake-client', 'fake-key', 'fake-checksum'
+
+    from app import create_app, db
+    from app.models import User, Payment
+    from app.utils.query_budget import QueryBudgetExceeded, count_queries
+
+    app = create_app()
+    app.logger.disabled = True
+
+    with app.app_context():
+        db.create_all()
+        admin = User(email='budget-admin@example.com', password_hash='-', is_verified=True, is_admin=True)
+        buyer = User(email='budget-buyer@example.com', password_hash='-', is_verified=True)
+        users = [User(email=f'budget{i}@example.com', password_hash='-', is_verified=True, has_paid=True)
+                 for i in range(args.users)]
+        db.session.add_all([admin, buyer] + users)
+        db.session.flush()
+        for i, user in enumerate(users + [buyer]):
+            for j in range(args.payments_per_user):
+                db.session.add(Payment(user_id=user.id, payos_order_id=f'{i}{j:03d}', amount=5000,
+                                       status='PAID' if user is not buyer else 'PENDING'))
+        db.session.commit()
+        admin_id, buyer_id, target_id = admin.id, buyer.id, users[0].id
+        bulk_ids = [user.id for user in users] + [admin.id]
+        pending_order = f'{len(users)}000'
+        cancelled_order = f'{len(users)}001'
+
+    # (method, path, user id to log in as)
+    requests_to_check = [
+        ('GET', '/admin/dashboard', admin_id),
+        ('GET', '/admin/events', admin_id),
+        ('GET', '/admin/users', admin_id),
+        ('GET', '/admin/users?verified=true&search=budget1', admin_id),
+        ('GET', '/admin/statistics', admin_id),
+        ('GET', '/admin/payments', admin_id),
+        ('GET', '/admin/payments?status=PAID&search=budget', admin_id),
+        ('GET', '/admin/export/users?verified=true&from=2020-01-01', admin_id),
+        ('GET', '/admin/export/payments?status=PAID&format=ndjson&gzip=1', admin_id),
+        ('POST', '/admin/users/bulk', admin_id),
+        ('GET', '/admin/users/import', admin_id),
+        ('POST', '/admin/users/import', admin_id),
+        ('GET', f'/admin/user/{target_id}/toggle-verified', admin_id),
+        ('GET', f'/admin/user/{target_id}/toggle-paid', admin_id),
+        ('GET', '/admin/audit', admin_id),
+        ('GET', f'/admin/audit?action=user.toggle_paid&actor=budget-admin@example.com&target={target_id}', admin_id),
+        ('GET', '/payment/checkout', buyer_id),
+        ('POST', '/payment/create-payment', buyer_id),
+        ('GET', f'/payment/return?code=00&status=PAID&orderCode={pending_order}&id=tx', None),
+        ('POST', '/payment/webhook', None),
+        ('GET', '/payment/history', buyer_id),
+        ('GET', '/payment/history.json', buyer_id),
+        ('GET', f'/payment/cancel?code=00&cancel=true&status=CANCELLED&orderCode={cancelled_order}', buyer_id),
+        ('POST', '/payment/test-payment', buyer_id),
+    ]
+
+    ok = True
+    checked = set()
+    for method, path, user_id in requests_to_check:
+        client = app.test_client()
+        if user_id:
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+        kwargs = {
+            '/payment/webhook': {'json': {'data': {'orderCode': 1}}},
+            '/admin/users/bulk': {'data': {'action': 'unverify', 'user_ids': bulk_ids}},
+        }.get(path, {})
+        if (method, path) == ('POST', '/admin/users/import'):
+            # The import itself runs in a background thread, outside the request's budget
+            kwargs = {'data': {'file': (io.BytesIO(b'email\nbudget-import@example.com\n'), 'users.csv'),
+                               'send_emails': 'on'},
+                      'content_type': 'multipart/form-data'}
+        endpoint = app.url_map.bind('localhost').match(path.split('?')[0], method=method)[0]
+        checked.add(endpoint)
+        limit = getattr(app.view_functions[endpoint], 'query_budget', None)
+        try:
+            with count_queries() as statements:
+                client.open(path, method=method, **kwargs)
+            status = '✓' if limit is not None and len(statements) <= limit else '✗'
+        except QueryBudgetExceeded as e:
+            status = '✗'
+            print(e)
+        ok = ok and status == '✓'
+        print(f'{status} {method:<4} {path:<50} {len(statements):>3} statements (budget {limit})')
+
+    for rule in app.url_map.iter_rules():
+        blueprint = rule.endpoint.split('.')[0]
+        if blueprint not in CHECKED_BLUEPRINTS:
+            continue
+        if getattr(app.view_functions[rule.endpoint], 'query_budget', None) is None:
+            print(f'✗ {rule.endpoint} has no @query_budget declaration')
+            ok = False
+        elif rule.endpoint not in checked:
+            print(f'✗ {rule.endpoint} is not exercised by this script')
+            ok = False
+
+    if not ok:
+        print('✗ Some routes are over (or missing) their SQL statement budget')
+        sys.exit(1)
+    print('✓ Every admin and payment route stays within its SQL statement budget.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Run the payment reconciler against the local PayOS stand-in.
+
+Seeds stale PENDING orders that PayOS reports as PAID, CANCELLED, EXPIRED or
+still PENDING, plus orders PayOS reports as paid with another amount, orders
+PayOS does not know and fresh orders younger than --min-age. Starts
+scripts/fake_payos.py with that state, points PAYOS_API_URL at it, runs
+reconcile_pending and checks that every order ends in the expected status,
+that the report counters match, and that the PayOS calls never exceeded the
+token-bucket rate (burst included).
+
+Runs against a throwaway SQLite database by default; pass --database-url
+to use a MySQL test database instead.
+
+Usage:
+  python scripts/check_reconcile.py [--orders 300] [--rate 50] [--concurrency 8]
+                                    [--latency-ms 20] [--database-url URL]
+"""
+import argparse
+import bisect
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Add project root and scripts/ to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+os.environ.setdefault('SKIP_DB_INIT', 'true')
+
+import fake_payos
+from config import Config
+
+
+AMOUNT = 50000
+
+# What PayOS reports for order i (by i % len(SCENARIOS)) -> status expected after reconciling
+SCENARIOS = [
+    ('PAID', 'PAID'),
+    ('CANCELLED', 'CANCELLED'),
+    ('EXPIRED', 'EXPIRED'),
+    ('PENDING', 'PENDING'),
+    ('PAID_OTHER_AMOUNT', 'PENDING'),   # skipped: amount mismatch
+    ('UNKNOWN', 'PENDING'),             # PayOS error 101, counted in errors
+]
+
+
+def build_app(database_url, payos_url):
+    Config.SQLALCHEMY_DATABASE_URI = database_url
+    Config.WEBHOOK_INBOX_CONSUMER = False
+    Config.PAYOS_API_URL = payos_url
+    Config.PAYOS_CLIENT_ID, Config.PAYOS_API_KEY, Config.PAYOS_CHECKSUM_KEY = \
+        'fake-client', 'fake-key', 'fake-checksum'
+    if database_url.startswith('sqlite'):
+        Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+
+    from app import create_app, db
+    app = create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def seed(app, fake, orders, fresh):
+    """Create the payments and the matching PayOS state; returns {order_code: expected status}"""
+    from app import db
+    from app.models import User, Payment
+
+    stale = datetime.utcnow() - timedelta(hours=2)
+    expected = {}
+    with app.app_context():
+        users = [User(email=f'reconcile{i}@example.com', password_hash='-', is_verified=True)
+                 for i in range(orders + fresh)]
+        db.session.add_all(users)
+        db.session.flush()
+        for i, user in enumerate(users):
+            order_code = 1000 + i
+            is_fresh = i >= orders
+            db.session.add(Payment(user_id=user.id, payos_order_id=str(order_code), amount=AMOUNT,
+                                   status='PENDING', created_at=datetime.utcnow() if is_fresh else stale))
+            reported, expected_status = ('PAID', 'PENDING') if is_fresh else SCENARIOS[i % len(SCENARIOS)]
+            expected[str(order_code)] = expected_status
+            if reported == 'UNKNOWN':
+                continue
+            paid = reported in ('PAID', 'PAID_OTHER_AMOUNT')
+            amount = AMOUNT + 1000 if reported == 'PAID_OTHER_AMOUNT' else AMOUNT
+            fake.orders[order_code] = {
+                'id': f'link{order_code}', 'orderCode': order_code, 'amount': amount,
+                'amountPaid': amount if paid else 0, 'description': f'Mahika {order_code}',
+                'status': 'PAID' if paid else reported, 'reference': f'FT{order_code}' if paid else None,
+                'createdAt': stale.isoformat(),
+            }
+        db.session.commit()
+    return expected
+
+
+def max_calls_per_second(timestamps):
+    """Most PayOS calls that started within any one-second window"""
+    timestamps = sorted(timestamps)
+    return max((bisect.bisect_left(timestamps, t + 1.0) - i for i, t in enumerate(timestamps)), default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=300, help='stale PENDING orders')
+    parser.add_argument('--fresh', type=int, default=20, help='PENDING orders younger than --min-age')
+    parser.add_argument('--min-age', type=int, default=30)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=50.0, help='max PayOS requests per second')
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    payos_server, fake = fake_payos.make_server(port=0, latency_ms=args.latency_ms)
+    threading.Thread(target=payos_server.serve_forever, daemon=True).start()
+
+    # Mỗi lệnh gọi API của PayOS giả đều đi qua delay(): ghi lại thời điểm để kiểm tra rate
+    calls, calls_lock = [], threading.Lock()
+    delay = fake.delay
+
+    def timed_delay():
+        with calls_lock:
+            calls.append(time.monotonic())
+        delay()
+
+    fake.delay = timed_delay
+
+    database_url = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "reconcile.db")}'
+    app = build_app(database_url, f'http://127.0.0.1:{payos_server.server_port}')
+    expected = seed(app, fake, args.orders, args.fresh)
+
+    from app.models import Payment, User
+    from app.utils.reconcile import reconcile_pending
+
+    print(f'Reconciling {args.orders:,} stale orders at up to {args.rate:g} PayOS requests/s...')
+    with app.app_context():
+        report = reconcile_pending(min_age_minutes=args.min_age, page_size=args.page_size,
+                                   concurrency=args.concurrency, rate=args.rate)
+        statuses = dict(Payment.query.with_entities(Payment.payos_order_id, Payment.status).all())
+        paid_users = User.query.filter_by(has_paid=True).count()
+
+    print(f"{report['checked']:,} orders in {report['elapsed_seconds']}s ({report['orders_per_second']} orders/s)")
+    print(f"  paid: {report['paid']}, cancelled: {report['cancelled']}, expired: {report['expired']}, "
+          f"still pending: {report['still_pending']}, skipped: {report['skipped']}, errors: {report['errors']}")
+
+    ok = True
+    wrong = {code: (statuses.get(code), status) for code, status in expected.items() if statuses.get(code) != status}
+    if wrong:
+        print(f'✗ {len(wrong)} orders in the wrong status, e.g. ' +
+              ', '.join(f'{code}: {got} (expected {want})' for code, (got, want) in list(wrong.items())[:5]))
+        ok = False
+
+    per_scenario = {name: sum(1 for i in range(args.orders) if SCENARIOS[i % len(SCENARIOS)][0] == name)
+                    for name, _ in SCENARIOS}
+    expected_report = {
+        'checked': args.orders,
+        'paid': per_scenario['PAID'],
+        'cancelled': per_scenario['CANCELLED'],
+        'expired': per_scenario['EXPIRED'],
+        'still_pending': per_scenario['PENDING'],
+        'skipped': per_scenario['PAID_OTHER_AMOUNT'],
+        'errors': per_scenario['UNKNOWN'],
+    }
+    mismatched = {key: (report[key], value) for key, value in expected_report.items() if report[key] != value}
+    if mismatched:
+        print(f'✗ Report counters differ: ' +
+              ', '.join(f'{key} {got} (expected {want})' for key, (got, want) in mismatched.items()))
+        ok = False
+    if paid_users != per_scenario['PAID']:
+        print(f'✗ {paid_users} users have has_paid (expected {per_scenario["PAID"]})')
+        ok = False
+
+    # Token bucket: at most `burst` (= int(rate)) calls at once, then `rate` per second;
+    # one call of slack since the times are taken on arrival at the stand-in
+    burst = max(1, int(args.rate))
+    allowed = burst + int(args.rate) + 1
+    busiest = max_calls_per_second(calls)
+    span = calls[-1] - calls[0] if calls else 0.0
+    minimum_span = (len(calls) - burst) / args.rate
+    print(f'{len(calls):,} PayOS calls over {span:.2f}s, busiest second: {busiest} '
+          f'(allowed {allowed})')
+    if len(calls) != args.orders:
+        print(f'✗ {len(calls)} PayOS calls for {args.orders} stale orders (fresh orders must not be queried)')
+        ok = False
+    if busiest > allowed or span < minimum_span * 0.95:
+        print(f'✗ PayOS calls exceeded the {args.rate:g}/s rate limit')
+        ok = False
+
+    if not ok:
+        sys.exit(1)
+    print('✓ Every order reconciled to its PayOS status within the rate limit.')
+
+
+if __name__ == '__main__':
+    main()
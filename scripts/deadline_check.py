@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Check that outbound calls respect the per-request time budget.
+
+Starts the PayOS and Brevo stand-ins with every call hanging for a minute,
+builds the app with a short REQUEST_TIME_BUDGET against a throwaway SQLite
+database, then fires concurrent checkouts and verification-email resends.
+Every request must come back within the budget (plus a small margin), i.e.
+the worker is released even though the upstream never answers.
+
+Usage:
+  python scripts/deadline_check.py [--budget 2] [--requests 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root and scripts/ to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+os.environ.setdefault('SKIP_DB_INIT', 'true')
+
+import fake_brevo
+import fake_payos
+from config import Config
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=2.0, help='REQUEST_TIME_BUDGET in seconds')
+    parser.add_argument('--requests', type=int, default=20, help='requests per endpoint')
+    parser.add_argument('--margin', type=float, default=1.0, help='allowed seconds over budget')
+    args = parser.parse_args()
+
+    payos_server, _ = fake_payos.make_server(port=0, hang_rate=1.0, hang_ms=60000)
+    brevo_server, _ = fake_brevo.make_server(port=0, hang_rate=1.0, hang_ms=60000)
+    payos_url = start(payos_server)
+    brevo_url = start(brevo_server)
+
+    Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "deadline.db")}'
+    Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+    Config.WEBHOOK_INBOX_CONSUMER = False
+    Config.REQUEST_TIME_BUDGET = args.budget
+    Config.PAYOS_API_URL = payos_url
+    Config.PAYOS_CLIENT_ID, Config.PAYOS_API_KEY, Config.PAYOS_CHECKSUM_KEY = \
+        'fake-client', 'fake-key', 'fake-checksum'
+    Config.BREVO_API_URL = f'{brevo_url}/v3'
+    Config.BREVO_API_KEY = 'fake-brevo-key'
+    Config.MAIL_SUPPRESS_SEND = True  # SMTP fallback must not reach the network
+
+    from app import create_app, db
+    from app.models import User
+
+    app = create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+        users = [User(email=f'deadline{i}@example.com', password_hash='-', is_verified=i % 2 == 0)
+                 for i in range(args.requests * 2)]
+        db.session.add_all(users)
+        db.session.commit()
+        verified_ids = [user.id for user in users if user.is_verified]
+        unverified_ids = [user.id for user in users if not user.is_verified]
+
+    def timed(method, path):
+        def call(user_id):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+            started = time.perf_counter()
+            client.open(path, method=method)
+            return time.perf_counter() - started
+        return call
+
+    limit = args.budget + args.margin
+    ok = True
+    with ThreadPoolExecutor(args.requests * 2) as pool:
+        results = {
+            'POST /payment/create-payment': pool.map(timed('POST', '/payment/create-payment'), verified_ids),
+            'GET /auth/resend-verification': pool.map(timed('GET', '/auth/resend-verification'), unverified_ids),
+        }
+        for name, durations in results.items():
+            durations = sorted(durations)
+            worst = durations[-1]
+            print(f'{name:<32} n={len(durations):<4} median={durations[len(durations) // 2]:.2f}s '
+                  f'max={worst:.2f}s (limit {limit:.2f}s)')
+            if worst > limit:
+                ok = False
+
+    if not ok:
+        print('✗ Some requests held a worker past the time budget')
+        sys.exit(1)
+    print('✓ Every request released its worker within the time budget.')
+
+
+if __name__ == '__main__':
+    main()
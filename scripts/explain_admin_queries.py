@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Check that every admin SELECT can use an index instead of a full table scan.
+
+Seeds a throwaway database (SQLite by default), requests each admin page and
+export with typical filters, captures every SELECT with its parameters and
+runs it again under EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (MySQL). Fails if a
+plan scans the whole users, payments or admin_audit_log table, unless the statement is on the
+allowlist of intentional whole-table reads below. Walking an index in ORDER BY
+order under a LIMIT (keyset pages) stops after one page and is not a full scan.
+
+Usage:
+  python scripts/explain_admin_queries.py [--users 20000] [--payments 40000] [--database-url URL]
+"""
+import argparse
+import os
+import re
+import sys
+
+# Add project root and scripts/ to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+os.environ.setdefault('SKIP_DB_INIT', 'true')
+
+from seed_data import build_app, seed
+
+
+CHECKED_TABLES = ('users', 'payments', 'admin_audit_log')
+
+# (endpoint, statement regex, reason) - whole-table reads that are intended
+ALLOWED_SCANS = [
+    ('admin.dashboard', r'count\(users\.id\)',
+     'dashboard totals count every user in one pass (cached for DASHBOARD_STATS_TTL)'),
+    ('admin.dashboard', r'sum\(payments\.amount\)',
+     'dashboard totals sum every PAID payment in one pass (cached for DASHBOARD_STATS_TTL)'),
+    ('admin.users', r'count\(\*\)',
+     'flag-filtered totals (verified/paid) are capped and cached by list_total'),
+    ('admin.payments', r'count\(\*\)',
+     'status/email-filtered totals are capped and cached by list_total'),
+]
+
+# (path, description)
+PAGES = [
+    ('/admin/dashboard', 'dashboard counters'),
+    ('/admin/users', 'users, first page'),
+    ('/admin/users?verified=true', 'users filtered by verification'),
+    ('/admin/users?search=user1', 'users, short email prefix'),
+    ('/admin/users?search=user12345', 'users, trigram email search'),
+    ('/admin/statistics', 'monthly statistics and weekly cohorts'),
+    ('/admin/payments', 'payments, first page'),
+    ('/admin/payments?status=PAID', 'payments filtered by status'),
+    ('/admin/payments?search=user12', 'payments filtered by email'),
+    ('/admin/export/users?from=2024-01-01&to=2024-01-31', 'users export, one month'),
+    ('/admin/export/payments?status=PAID&from=2024-01-01&to=2024-01-31', 'payments export, one month'),
+    ('/admin/audit', 'audit log, first page'),
+    ('/admin/audit?action=export.users', 'audit log filtered by action'),
+    ('/admin/audit?actor=explain-admin@example.com&from=2024-01-01', 'audit log filtered by admin and date'),
+    ('/admin/audit?target=1', 'audit log filtered by target user'),
+]
+
+
+def full_scans(connection, statement, parameters):
+    """Tables from CHECKED_TABLES that the statement's plan reads in full"""
+    limited = re.search(r'\bLIMIT\b', statement.split('FROM', 1)[-1], re.IGNORECASE) is not None
+    if connection.dialect.name == 'sqlite':
+        plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        scans = set()
+        for row in plan:
+            detail = row[-1]
+            # "SCAN users" / "SCAN TABLE users" (older SQLite); a covering index scan is still a full scan
+            match = re.match(r'SCAN (?:TABLE )?(\w+)( USING INDEX)?', detail)
+            if match and match.group(1) in CHECKED_TABLES and not (limited and match.group(2)):
+                scans.add(match.group(1))
+        return scans, [row[-1] for row in plan]
+
+    plan = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+    scans = {row['table'] for row in plan
+             if row['table'] in CHECKED_TABLES and (row['type'] == 'ALL' or (row['type'] == 'index' and not limited))}
+    return scans, [f"{row['table']}: type={row['type']} key={row['key']}" for row in plan]
+
+
+def allowed(endpoint, statement):
+    for allowed_endpoint, pattern, reason in ALLOWED_SCANS:
+        if endpoint == allowed_endpoint and re.search(pattern, statement, re.IGNORECASE):
+            return reason
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--payments', type=int, default=40000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    app = build_app(args.database_url)
+    seed(app, args.users, args.payments)
+
+    from app import db
+    from app.models import User
+    from app.utils import user_search
+    from app.utils.query_budget import capture_queries
+
+    with app.app_context():
+        admin = User(email='explain-admin@example.com', password_hash='-', is_verified=True, is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+        user_search.rebuild_index()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+
+    ok = True
+    for path, description in PAGES:
+        endpoint = app.url_map.bind('localhost').match(path.split('?')[0])[0]
+        with capture_queries() as captured:
+            response = client.get(path)
+            response.get_data()  # exports run their query while the body streams
+        if response.status_code != 200:
+            print(f'✗ {path}: HTTP {response.status_code}')
+            ok = False
+            continue
+
+        print(f'{path}  ({description})')
+        with app.app_context():
+            connection = db.session.connection()
+            for statement, parameters in captured:
+                if not statement.lstrip().upper().startswith('SELECT'):
+                    continue
+                scans, plan = full_scans(connection, statement, parameters)
+                summary = ' '.join(statement.split())[:90]
+                if not scans:
+                    status = '✓'
+                elif allowed(endpoint, statement):
+                    status = '~'
+                else:
+                    status = '✗'
+                    ok = False
+                print(f'  {status} {summary}')
+                if scans:
+                    reason = allowed(endpoint, statement)
+                    print(f'      full scan of {", ".join(sorted(scans))}' + (f' - allowed: {reason}' if reason else ''))
+                if args.verbose or status == '✗':
+                    for line in plan:
+                        print(f'      | {line}')
+            db.session.rollback()
+
+    if not ok:
+        print('✗ Some admin queries scan a whole table; add an index or make the predicate sargable')
+        sys.exit(1)
+    print('✓ Every admin query uses an index (or is an allowlisted whole-table read).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Export users or payments to a CSV/NDJSON file.
+
+Same streaming export as /admin/export/<kind>, for dumps too large to finish
+within a gunicorn request timeout. Filters mirror the admin list views.
+
+Usage (from Railway):
+  python scripts/export_data.py payments --from 2024-01-01 --to 2024-01-31 --status PAID --gzip -o payments.csv.gz
+  python scripts/export_data.py users --verified true --format ndjson -o users.ndjson
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.models import User, Payment
+from app.routes.admin import _payment_filters, _user_filters
+from app.utils import export
+from app.utils.time_ranges import between
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('kind', choices=['users', 'payments'])
+    parser.add_argument('-o', '--output', required=True, help='output file')
+    parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--from', dest='date_from', help='created on or after YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', help='created on or before YYYY-MM-DD')
+    parser.add_argument('--search')
+    parser.add_argument('--verified', choices=['true', 'false'], help='users only')
+    parser.add_argument('--paid', choices=['true', 'false'], help='users only')
+    parser.add_argument('--status', help='payments only')
+    args = parser.parse_args()
+
+    filter_args = {key: value for key, value in vars(args).items()
+                   if key in ('search', 'verified', 'paid', 'status') and value}
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            start, end = export.parse_date_range(args.date_from, args.date_to)
+            if args.kind == 'users':
+                filters = _user_filters(filter_args) + between(User.created_at, start, end)
+            else:
+                filters = _payment_filters(filter_args) + between(Payment.created_at, start, end)
+
+            written = 0
+            with open(args.output, 'wb') as out:
+                for chunk in export.stream_export(args.kind, filters, fmt=args.format, compress=args.gzip):
+                    out.write(chunk)
+                    written += len(chunk)
+        except Exception as e:
+            print('✗ ERROR: Export failed:')
+            print(e)
+            sys.exit(1)
+
+    print(f'✓ Wrote {written:,} bytes to {args.output} in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Local Brevo (Sendinblue) stand-in for load tests and offline development.
+
+Accepts POST /v3/smtp/email like the transactional email API and returns a
+fake messageId without sending anything. Point the app at it with
+BREVO_API_URL=http://127.0.0.1:8766/v3 and any BREVO_API_KEY.
+
+Fault injection: --hang-rate makes that fraction of calls stall for
+--hang-ms before answering, to check the app's outbound time budgets.
+
+Usage:
+  python scripts/fake_brevo.py [--port 8766] [--latency-ms 100] [--hang-rate 0.1 --hang-ms 60000]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBrevo:
+    """Counters and fault settings shared by all handler threads"""
+
+    def __init__(self, latency_ms=0, hang_rate=0.0, hang_ms=60000):
+        self.latency_ms = latency_ms
+        self.hang_rate = hang_rate
+        self.hang_ms = hang_ms
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def delay(self):
+        if self.hang_rate and random.random() < self.hang_rate:
+            time.sleep(self.hang_ms / 1000)
+        elif self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(length)
+
+            if self.path.rstrip('/') != '/v3/smtp/email':
+                return self.send_json(404, {'code': 'not_found', 'message': 'Not found'})
+            if not self.headers.get('api-key'):
+                return self.send_json(401, {'code': 'unauthorized', 'message': 'Key not found'})
+
+            fake.delay()
+            with fake.lock:
+                fake.sent += 1
+            self.send_json(201, {'messageId': f'<{uuid.uuid4()}@fake-brevo>'})
+
+        def do_GET(self):
+            if self.path == '/_stats':
+                with fake.lock:
+                    return self.send_json(200, {'sent': fake.sent})
+            self.send_json(404, {'code': 'not_found', 'message': 'Not found'})
+
+    return Handler
+
+
+def make_server(host='127.0.0.1', port=8766, **options):
+    """Create (but do not start) a fake Brevo server; returns (server, fake)"""
+    fake = FakeBrevo(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='fraction of calls that stall')
+    parser.add_argument('--hang-ms', type=float, default=60000, help='how long a stalled call hangs')
+    args = parser.parse_args()
+
+    server, _ = make_server(args.host, args.port, latency_ms=args.latency_ms,
+                            hang_rate=args.hang_rate, hang_ms=args.hang_ms)
+    print(f'Fake Brevo listening on http://{args.host}:{args.port}/v3')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
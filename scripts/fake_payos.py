@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Local PayOS stand-in for load tests and offline development.
+
+Implements the parts of the PayOS merchant API the app uses:
+  POST /v2/payment-requests              create a payment link
+  GET  /v2/payment-requests/<orderCode>  payment status
+  GET  /web/<orderCode>                  hosted checkout: pays the order (or
+                                         cancels it with ?cancel=true), fires
+                                         the webhook and redirects to returnUrl
+  GET  /_stats                           webhook delivery latencies
+
+Fault injection: --hang-rate makes that fraction of API calls stall for
+--hang-ms before answering, to check the app's outbound time budgets.
+
+Point the app at it with PAYOS_API_URL=http://127.0.0.1:8765 and use the
+same PAYOS_CLIENT_ID / PAYOS_API_KEY / PAYOS_CHECKSUM_KEY on both sides.
+
+Usage:
+  python scripts/fake_payos.py [--port 8765] [--latency-ms 50] [--jitter-ms 20]
+                               [--error-rate 0.01] [--hang-rate 0.1 --hang-ms 60000]
+                               [--webhook-url http://127.0.0.1:5000/payment/webhook]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+
+
+def sign(data, checksum_key):
+    """Same key=value&... HMAC-SHA256 scheme as app.utils.payos.create_payos_signature"""
+    data_string = '&'.join(f'{key}={data[key]}' for key in sorted(data.keys()))
+    return hmac.new(checksum_key.encode('utf-8'), data_string.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class FakePayOS:
+    """In-memory PayOS state shared by all handler threads"""
+
+    def __init__(self, client_id='fake-client', api_key='fake-key', checksum_key='fake-checksum',
+                 latency_ms=0, jitter_ms=0, error_rate=0.0, webhook_url=None, webhook_delay_ms=0,
+                 public_url=None, hang_rate=0.0, hang_ms=60000):
+        self.client_id = client_id
+        self.api_key = api_key
+        self.checksum_key = checksum_key
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.webhook_url = webhook_url
+        self.webhook_delay_ms = webhook_delay_ms
+        self.public_url = public_url
+        self.hang_rate = hang_rate
+        self.hang_ms = hang_ms
+
+        self.orders = {}
+        self.lock = threading.Lock()
+        self.webhook_latencies = []
+        self.webhook_failures = 0
+        self.http = requests.Session()
+
+    def delay(self):
+        """Simulated upstream latency (or a stall when a hang is injected)"""
+        if self.hang_rate and random.random() < self.hang_rate:
+            time.sleep(self.hang_ms / 1000)
+            return
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+    def send_webhook(self, order):
+        """Deliver a PayOS-style webhook for a paid order"""
+        if not self.webhook_url:
+            return
+        if self.webhook_delay_ms:
+            time.sleep(self.webhook_delay_ms / 1000)
+
+        data = {
+            'orderCode': order['orderCode'],
+            'amount': order['amount'],
+            'description': order['description'],
+            'accountNumber': '0000000000',
+            'reference': order['reference'],
+            'transactionDateTime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'currency': 'VND',
+            'paymentLinkId': order['id'],
+            'code': '00',
+            'desc': 'success',
+        }
+        body = {'code': '00', 'desc': 'success', 'success': True, 'data': data,
+                'signature': sign(data, self.checksum_key)}
+
+        started = time.perf_counter()
+        try:
+            response = self.http.post(self.webhook_url, json=body, timeout=30)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        with self.lock:
+            if ok:
+                self.webhook_latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                self.webhook_failures += 1
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def api_error(self, code, desc, status=200):
+            self.send_json(status, {'code': code, 'desc': desc, 'data': None})
+
+        def authorized(self):
+            return (self.headers.get('x-client-id') == fake.client_id
+                    and self.headers.get('x-api-key') == fake.api_key)
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length)
+
+            if path != '/v2/payment-requests':
+                return self.api_error('404', 'Not found', status=404)
+
+            fake.delay()
+            if fake.should_fail():
+                return self.api_error('500', 'Injected error', status=500)
+            if not self.authorized():
+                return self.api_error('401', 'Invalid client id or api key', status=401)
+
+            payload = json.loads(raw or b'{}')
+            signed = {key: payload.get(key) for key in
+                      ('amount', 'cancelUrl', 'description', 'orderCode', 'returnUrl')}
+            if payload.get('signature') != sign(signed, fake.checksum_key):
+                return self.api_error('201', 'Invalid signature')
+
+            order_code = payload['orderCode']
+            with fake.lock:
+                if order_code in fake.orders:
+                    return self.api_error('231', 'Đơn thanh toán đã tồn tại')
+                order = {
+                    'id': f'link{order_code}',
+                    'orderCode': order_code,
+                    'amount': payload['amount'],
+                    'amountPaid': 0,
+                    'description': payload['description'],
+                    'returnUrl': payload['returnUrl'],
+                    'cancelUrl': payload['cancelUrl'],
+                    'expiredAt': payload.get('expiredAt'),
+                    'status': 'PENDING',
+                    'reference': None,
+                    'createdAt': datetime.now().isoformat(),
+                }
+                fake.orders[order_code] = order
+
+            base = fake.public_url or f'http://{self.headers.get("Host")}'
+            self.send_json(200, {'code': '00', 'desc': 'success', 'data': {
+                'paymentLinkId': order['id'],
+                'orderCode': order_code,
+                'amount': order['amount'],
+                'description': order['description'],
+                'status': order['status'],
+                'checkoutUrl': f'{base}/web/{order_code}',
+                'expiredAt': order['expiredAt'],
+            }})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip('/').split('/')
+
+            if url.path == '/_stats':
+                with fake.lock:
+                    latencies = list(fake.webhook_latencies)
+                    failures = fake.webhook_failures
+                return self.send_json(200, {'webhooks_delivered': len(latencies),
+                                            'webhooks_failed': failures,
+                                            'webhook_latencies_ms': latencies})
+
+            if len(parts) == 3 and parts[:2] == ['v2', 'payment-requests']:
+                fake.delay()
+                if fake.should_fail():
+                    return self.api_error('500', 'Injected error', status=500)
+                if not self.authorized():
+                    return self.api_error('401', 'Invalid client id or api key', status=401)
+                with fake.lock:
+                    order = fake.orders.get(int(parts[2])) if parts[2].isdigit() else None
+                    order = dict(order) if order else None
+                if not order:
+                    return self.api_error('101', 'Không tìm thấy đơn thanh toán')
+                transactions = [{'reference': order['reference'], 'amount': order['amount']}] \
+                    if order['reference'] else []
+                return self.send_json(200, {'code': '00', 'desc': 'success', 'data': {
+                    'id': order['id'], 'orderCode': order['orderCode'], 'amount': order['amount'],
+                    'amountPaid': order['amountPaid'], 'status': order['status'],
+                    'createdAt': order['createdAt'], 'transactions': transactions,
+                }})
+
+            if len(parts) == 2 and parts[0] == 'web' and parts[1].isdigit():
+                cancel = parse_qs(url.query).get('cancel', ['false'])[0] == 'true'
+                with fake.lock:
+                    order = fake.orders.get(int(parts[1]))
+                    if not order:
+                        return self.api_error('101', 'Không tìm thấy đơn thanh toán', status=404)
+                    if order['status'] == 'PENDING':
+                        if cancel:
+                            order['status'] = 'CANCELLED'
+                        else:
+                            order['status'] = 'PAID'
+                            order['amountPaid'] = order['amount']
+                            order['reference'] = f'FT{order["orderCode"]}'
+                            threading.Thread(target=fake.send_webhook, args=(dict(order),),
+                                             daemon=True).start()
+                    params = {'code': '00', 'id': order['id'], 'cancel': str(cancel).lower(),
+                              'status': order['status'], 'orderCode': order['orderCode']}
+                    target = order['cancelUrl'] if cancel else order['returnUrl']
+
+                self.send_response(302)
+                self.send_header('Location', f'{target}?{urlencode(params)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            self.api_error('404', 'Not found', status=404)
+
+    return Handler
+
+
+def make_server(host='127.0.0.1', port=8765, **options):
+    """Create (but do not start) a fake PayOS server; returns (server, fake)"""
+    fake = FakePayOS(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--client-id', default='fake-client')
+    parser.add_argument('--api-key', default='fake-key')
+    parser.add_argument('--checksum-key', default='fake-checksum')
+    parser.add_argument('--latency-ms', type=float, default=0, help='mean API latency')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='uniform +/- latency jitter')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of API calls answered with HTTP 500')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='fraction of API calls that stall')
+    parser.add_argument('--hang-ms', type=float, default=60000, help='how long a stalled call hangs')
+    parser.add_argument('--webhook-url', help='app webhook endpoint to notify when an order is paid')
+    parser.add_argument('--webhook-delay-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    server, _ = make_server(
+        args.host, args.port,
+        client_id=args.client_id, api_key=args.api_key, checksum_key=args.checksum_key,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        webhook_url=args.webhook_url, webhook_delay_ms=args.webhook_delay_ms,
+        hang_rate=args.hang_rate, hang_ms=args.hang_ms
+    )
+    print(f'Fake PayOS listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
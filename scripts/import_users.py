@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Import users from a CSV file (school and enterprise onboarding).
+
+Each line is `email` or `email,password` (an `email,password` header line is
+skipped). Emails already registered are skipped; rows with a password get a
+verification email, rows without one an activation link to set it. Passwords
+are hashed across --workers processes while the previous chunk is written.
+
+Usage (from Railway):
+  python scripts/import_users.py users.csv [--workers N] [--chunk-size 1000]
+                                 [--no-emails] [--base-url https://...]
+  python scripts/import_users.py users.csv --generate 100000 [--with-passwords 0.5]
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.utils.user_import import import_users
+from config import Config
+
+
+def generate(path, count, with_passwords):
+    """Write a synthetic CSV of `count` users, a fraction of them with a password"""
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(['email', 'password'])
+        for i in range(count):
+            password = f'Imported-{i:07d}' if random.random() < with_passwords else ''
+            writer.writerow([f'import{i:07d}@example.com', password])
+    print(f'✓ Wrote {count} rows to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv_path')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='password hashing processes (0 = hash in this process)')
+    parser.add_argument('--chunk-size', type=int, default=Config.IMPORT_CHUNK_SIZE,
+                        help='rows per INSERT / transaction')
+    parser.add_argument('--no-emails', action='store_true', help='do not queue verification / activation emails')
+    parser.add_argument('--base-url', default=Config.APP_BASE_URL, help='site URL used in email links')
+    parser.add_argument('--generate', type=int, metavar='N', help='write N synthetic rows to csv_path first')
+    parser.add_argument('--with-passwords', type=float, default=0.5,
+                        help='fraction of generated rows with a password')
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.csv_path, args.generate, args.with_passwords)
+
+    def progress(result):
+        print(f'  {result["rows"]} rows, {result["inserted"]} created, {result["duplicates"]} duplicates, '
+              f'{result["invalid"]} invalid ({result["rows_per_second"]} rows/s)', end='\r', flush=True)
+
+    pool = None
+    if args.workers:
+        pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    app = create_app()
+    try:
+        with app.test_request_context(base_url=args.base_url):
+            print(f'Importing {args.csv_path}...')
+            with open(args.csv_path, newline='', encoding='utf-8-sig') as stream:
+                result = import_users(stream, pool=pool, chunk_size=args.chunk_size,
+                                      send_emails=not args.no_emails, progress=progress)
+    except Exception as e:
+        print('\n✗ ERROR: Import failed:')
+        print(e)
+        sys.exit(1)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    print()
+    for error in result['errors']:
+        print(f'  ⚠️ {error}')
+    print(f'✓ {result["inserted"]} users created from {result["rows"]} rows '
+          f'({result["duplicates"]} duplicates, {result["invalid"]} invalid, '
+          f'{result["emails_queued"]} emails queued) in {result["elapsed"]}s '
+          f'= {result["rows_per_second"]} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Checkout load test: register -> verify -> login -> checkout -> return/webhook.
+
+Runs N simulated users with C in flight at a time against a running app
+that points at the local PayOS stand-in, then prints p50/p95/p99 latency
+and requests/second per endpoint.
+
+Every simulated user logs in from the same IP, so the app under test must
+run with login rate limiting off (RATE_LIMIT_ENABLED=false, as below) or
+with RATE_LIMIT_LOGIN_IP raised above --users; otherwise logins past the
+per-IP limit get 429 and the run fails.
+
+Setup:
+  python scripts/fake_payos.py --webhook-url http://127.0.0.1:5000/payment/webhook &
+  PAYOS_API_URL=http://127.0.0.1:8765 PAYOS_CLIENT_ID=fake-client PAYOS_API_KEY=fake-key \\
+  PAYOS_CHECKSUM_KEY=fake-checksum PAYOS_RETURN_URL=http://127.0.0.1:5000/payment/return \\
+  SECRET_KEY=load-test RATE_LIMIT_ENABLED=false gunicorn -w 4 -b 127.0.0.1:5000 main:app &
+
+Usage:
+  python scripts/load_test.py --users 200 --concurrency 20 --secret-key load-test \\
+                              [--base-url http://127.0.0.1:5000] [--payos-url http://127.0.0.1:8765]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from itsdangerous import URLSafeTimedSerializer
+
+
+PASSWORD = 'LoadTest123'
+
+
+class Recorder:
+    """Collects latencies per endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    def call(self, name, session, method, url, ok_statuses=(200, 302), **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        kwargs.setdefault('timeout', 60)
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            response = None
+        elapsed = (time.perf_counter() - started) * 1000
+
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if response is None or response.status_code not in ok_statuses:
+                self.errors[name] += 1
+            if response is not None and response.status_code == 429:
+                self.rate_limited += 1
+        return response
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_user(recorder, args, serializer):
+    session = requests.Session()
+    base = args.base_url.rstrip('/')
+    email = f'load-{uuid.uuid4().hex[:12]}@example.com'
+
+    recorder.call('POST /auth/register', session, 'POST', f'{base}/auth/register',
+                  data={'email': email, 'password': PASSWORD, 'confirm_password': PASSWORD})
+
+    token = serializer.dumps(email, salt='email-verification')
+    recorder.call('GET /auth/verify-email', session, 'GET', f'{base}/auth/verify-email/{token}')
+
+    recorder.call('POST /auth/login', session, 'POST', f'{base}/auth/login',
+                  data={'email': email, 'password': PASSWORD})
+
+    response = recorder.call('POST /payment/create-payment', session, 'POST',
+                             f'{base}/payment/create-payment')
+    checkout_url = response.headers.get('Location') if response is not None else None
+    if not checkout_url or '/web/' not in checkout_url:
+        with recorder.lock:
+            recorder.errors['POST /payment/create-payment'] += 1
+        return
+
+    # The stand-in's hosted page pays the order, fires the webhook and
+    # redirects back to the app's return URL
+    paid = requests.get(checkout_url, allow_redirects=False, timeout=60)
+    return_url = paid.headers.get('Location')
+    if return_url:
+        recorder.call('GET /payment/return', session, 'GET', return_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--payos-url', default='http://127.0.0.1:8765', help='stand-in URL, for webhook stats')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--secret-key', default=os.environ.get('SECRET_KEY'),
+                        help="the app's SECRET_KEY, used to build verification links")
+    args = parser.parse_args()
+
+    if not args.secret_key:
+        print('✗ --secret-key (or SECRET_KEY) is required to verify test users')
+        sys.exit(1)
+
+    serializer = URLSafeTimedSerializer(args.secret_key)
+    recorder = Recorder()
+
+    print(f'Running {args.users} users, {args.concurrency} concurrent, against {args.base_url}...')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(lambda _: run_user(recorder, args, serializer), range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    latencies = dict(recorder.latencies)
+    try:
+        stats = requests.get(f'{args.payos_url.rstrip("/")}/_stats', timeout=10).json()
+        latencies['POST /payment/webhook'] = stats['webhook_latencies_ms']
+        recorder.errors['POST /payment/webhook'] += stats['webhooks_failed']
+    except (requests.RequestException, ValueError, KeyError):
+        pass
+
+    print(f'\n{"endpoint":<32}{"count":>7}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}')
+    for name, values in latencies.items():
+        print(f'{name:<32}{len(values):>7}{recorder.errors[name]:>8}'
+              f'{percentile(values, 50):>10.1f}{percentile(values, 95):>10.1f}'
+              f'{percentile(values, 99):>10.1f}{len(values) / elapsed:>10.1f}')
+    print(f'\n{args.users} users in {elapsed:.2f}s')
+
+    if recorder.rate_limited:
+        print(f'✗ {recorder.rate_limited} requests were rate limited (429): start the app with '
+              f'RATE_LIMIT_ENABLED=false or RATE_LIMIT_LOGIN_IP above --users')
+
+    if any(recorder.errors.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
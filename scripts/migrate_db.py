@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Apply incremental schema changes to an existing database.
+
+db.create_all() only creates missing tables, so columns and indexes added
+to existing tables after the first deploy are applied here. Every step is
+idempotent and can be re-run safely.
+
+Usage (from Railway):
+  python scripts/migrate_db.py
+
+Usage (from local with Railway CLI):
+  railway run -- python scripts/migrate_db.py
+"""
+import os
+import sys
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import inspect, text
+
+from app import create_app, db
+
+
+# (table, column, column DDL)
+COLUMNS = [
+    ('payments', 'checkout_url', 'VARCHAR(512) NULL'),
+    ('payments', 'checkout_expires_at', 'DATETIME NULL'),
+]
+
+# (table, index name, columns)
+INDEXES = [
+    ('payments', 'ix_payments_user_created', ['user_id', 'created_at', 'id']),
+    ('payments', 'ix_payments_created', ['created_at', 'id']),
+    ('payments', 'ix_payments_status_completed', ['status', 'completed_at']),
+    ('users', 'ix_users_created', ['created_at', 'id']),
+]
+
+
+def add_column(table, column, ddl):
+    columns = [c['name'] for c in inspect(db.engine).get_columns(table)]
+    if column in columns:
+        print(f'  = {table}.{column} already exists')
+        return
+    db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    db.session.commit()
+    print(f'  + {table}.{column}')
+
+
+def add_index(table, name, columns):
+    indexes = [i['name'] for i in inspect(db.engine).get_indexes(table)]
+    if name in indexes:
+        print(f'  = {table}.{name} already exists')
+        return
+    db.session.execute(text(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})'))
+    db.session.commit()
+    print(f'  + {table}.{name}')
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        try:
+            print('Creating missing tables...')
+            db.create_all()
+            print('Adding missing columns...')
+            for table, column, ddl in COLUMNS:
+                add_column(table, column, ddl)
+            print('Adding missing indexes...')
+            for table, name, columns in INDEXES:
+                add_index(table, name, columns)
+            print('✓ Database schema is up to date.')
+        except Exception as e:
+            print('✗ ERROR: Migration failed:')
+            print(e)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Rebuild the user_email_trigrams search index from users.
+
+The app keeps the index in sync on every ORM insert/update/delete of a user;
+run this once after creating the table (scripts/migrate_db.py) and after any
+bulk load that wrote users with raw SQL.
+
+Usage (from Railway):
+  python scripts/rebuild_email_search.py [--chunk-size 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.utils.user_search import rebuild_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunk-size', type=int, default=5000, help='users indexed per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            print('Rebuilding email search index...')
+            indexed = rebuild_index(chunk_size=args.chunk_size)
+        except Exception as e:
+            print('✗ ERROR: Rebuild failed:')
+            print(e)
+            sys.exit(1)
+
+    print(f'✓ Indexed {indexed} users in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
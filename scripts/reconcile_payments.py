@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Reconcile stale PENDING payments against PayOS.
+
+Run periodically (e.g. a Railway cron every 15 minutes) to recover payments
+whose webhook was lost.
+
+Usage (from Railway):
+  python scripts/reconcile_payments.py [--min-age 30] [--concurrency 8] [--rate 10]
+
+Usage (against a local PayOS stand-in):
+  PAYOS_API_URL=http://127.0.0.1:8765 python scripts/reconcile_payments.py
+"""
+import argparse
+import os
+import sys
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.utils.reconcile import reconcile_pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-age', type=int, default=30, help='only payments older than N minutes')
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel PayOS requests')
+    parser.add_argument('--rate', type=float, default=10.0, help='max PayOS requests per second')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            print('Reconciling stale PENDING payments...')
+            report = reconcile_pending(
+                min_age_minutes=args.min_age,
+                page_size=args.page_size,
+                concurrency=args.concurrency,
+                rate=args.rate
+            )
+        except Exception as e:
+            print('✗ ERROR: Reconciliation failed:')
+            print(e)
+            sys.exit(1)
+
+    print(f"✓ Checked {report['checked']} payments in {report['elapsed_seconds']}s "
+          f"({report['orders_per_second']} orders/s)")
+    print(f"  paid: {report['paid']}, cancelled: {report['cancelled']}, expired: {report['expired']}, "
+          f"still pending: {report['still_pending']}, skipped: {report['skipped']}, errors: {report['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Recompute the daily_stats rollup from users and payments.
+
+The app updates daily_stats incrementally; run this nightly (e.g. a Railway
+cron at 00:30 UTC) to correct any day whose increments were missed, and once
+with --backfill after creating the table to fill in history.
+
+Usage (from Railway):
+  python scripts/rollup_daily_stats.py [--days 2]
+  python scripts/rollup_daily_stats.py --backfill [--chunk-days 31]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.utils import rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=2, help='rebuild the last N days (including today)')
+    parser.add_argument('--backfill', action='store_true', help='rebuild everything since the first user/payment')
+    parser.add_argument('--chunk-days', type=int, default=31, help='days recomputed per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            if args.backfill:
+                print('Backfilling daily_stats from raw tables...')
+                rows = rollup.backfill(chunk_days=args.chunk_days)
+            else:
+                print(f'Rebuilding daily_stats for the last {args.days} day(s)...')
+                rows = rollup.catch_up(days=args.days)
+        except Exception as e:
+            print('✗ ERROR: Rollup failed:')
+            print(e)
+            sys.exit(1)
+
+    print(f'✓ Wrote {rows} daily_stats rows in {time.perf_counter() - started:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Stress test the PayOS order code generator.
+
+Spawns several processes (like gunicorn workers), each generating codes
+with its own worker slot, and asserts that every code is unique, fits the
+PayOS orderCode limit and is strictly increasing within its process.
+
+Usage:
+  python scripts/stress_order_codes.py [--processes 8] [--codes 2000000]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.order_code import MAX_ORDER_CODE, OrderCodeGenerator, allocate_worker_id
+
+
+def worker(args):
+    count, lock_dir = args
+    generator = OrderCodeGenerator(allocate_worker_id(lock_dir=lock_dir))
+    codes = [generator.next_code() for _ in range(count)]
+
+    increasing = all(a < b for a, b in zip(codes, codes[1:]))
+    return generator.worker_id, increasing, codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--codes', type=int, default=2000000, help='total codes across all processes')
+    args = parser.parse_args()
+
+    per_process = args.codes // args.processes
+    lock_dir = tempfile.mkdtemp(prefix='order-code-stress-')
+
+    print(f'Generating {per_process * args.processes:,} codes in {args.processes} processes...')
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(worker, [(per_process, lock_dir)] * args.processes)
+    elapsed = time.perf_counter() - started
+
+    seen = set()
+    total = 0
+    worker_ids = set()
+    ok = True
+    for worker_id, increasing, codes in results:
+        worker_ids.add(worker_id)
+        total += len(codes)
+        seen.update(codes)
+        if not increasing:
+            print(f'✗ worker {worker_id}: codes are not strictly increasing')
+            ok = False
+        if max(codes) > MAX_ORDER_CODE:
+            print(f'✗ worker {worker_id}: code exceeds PayOS limit {MAX_ORDER_CODE}')
+            ok = False
+
+    if len(worker_ids) != args.processes:
+        print(f'✗ {args.processes} processes shared {len(worker_ids)} worker ids')
+        ok = False
+    if len(seen) != total:
+        print(f'✗ {total - len(seen):,} duplicate codes')
+        ok = False
+
+    print(f'{total:,} codes in {elapsed:.2f}s ({total / elapsed:,.0f} codes/s)')
+    if not ok:
+        sys.exit(1)
+    print('✓ All codes unique, monotonic per process and within PayOS limits.')
+
+
+if __name__ == '__main__':
+    main()
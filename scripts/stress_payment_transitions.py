@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Concurrency test for payment state transitions.
+
+For every order, fires the PayOS return redirect and the webhook at the
+same moment (through the real routes) while an inbox consumer drains the
+stored webhooks, and checks that exactly one of them applied the
+PENDING -> PAID transition and that the user got access.
+
+Runs against a throwaway SQLite database by default; pass --database-url
+to use a MySQL test database instead.
+
+Usage:
+  python scripts/stress_payment_transitions.py [--orders 2000] [--database-url URL]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+os.environ.setdefault('SKIP_DB_INIT', 'true')
+
+from config import Config
+
+
+def build_app(database_url):
+    Config.SQLALCHEMY_DATABASE_URI = database_url
+    Config.WEBHOOK_INBOX_CONSUMER = False  # drained explicitly below
+    if database_url.startswith('sqlite'):
+        Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+
+    from app import create_app, db
+    app = create_app()
+    app.logger.disabled = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def seed(app, orders):
+    from app import db
+    from app.models import User, Payment
+
+    with app.app_context():
+        users = [User(email=f'stress{i}@example.com', password_hash='-', is_verified=True) for i in range(orders)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all([
+            Payment(user_id=user.id, payos_order_id=str(1000 + i), amount=50000, status='PENDING')
+            for i, user in enumerate(users)
+        ])
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "stress.db")}'
+    app = build_app(database_url)
+    seed(app, args.orders)
+
+    from app.utils import payment_state
+
+    winners = {}
+    winners_lock = threading.Lock()
+    original = payment_state._transition
+
+    def counting_transition(order_code, target, *a, **kw):
+        result = original(order_code, target, *a, **kw)
+        if result.applied:
+            with winners_lock:
+                winners[str(order_code)] = winners.get(str(order_code), 0) + 1
+        return result
+
+    payment_state._transition = counting_transition
+
+    def fire_return(order_code, barrier):
+        client = app.test_client()
+        barrier.wait()
+        client.get(f'/payment/return?code=00&status=PAID&id=link{order_code}&orderCode={order_code}')
+
+    def fire_webhook(order_code, barrier):
+        client = app.test_client()
+        barrier.wait()
+        client.post('/payment/webhook', json={'data': {
+            'orderCode': order_code, 'amount': 50000, 'reference': f'ref{order_code}'
+        }})
+
+    def race(i):
+        order_code = 1000 + i
+        barrier = threading.Barrier(2)
+        t = threading.Thread(target=fire_webhook, args=(order_code, barrier))
+        t.start()
+        fire_return(order_code, barrier)
+        t.join()
+
+    from app.utils import webhook_inbox
+    racing = threading.Event()
+    racing.set()
+
+    def consume():
+        with app.app_context():
+            while racing.is_set():
+                if not webhook_inbox.drain_batch(100):
+                    time.sleep(0.01)
+            webhook_inbox.drain(100)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+
+    print(f'Racing return vs webhook on {args.orders:,} orders...')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(race, range(args.orders)))
+    racing.clear()
+    consumer.join()
+    elapsed = time.perf_counter() - started
+
+    from app.models import User, Payment
+    with app.app_context():
+        not_paid = Payment.query.filter(Payment.status != 'PAID').count()
+        no_access = User.query.filter_by(has_paid=False).count()
+
+    double = sum(1 for n in winners.values() if n > 1)
+    missing = args.orders - len(winners)
+
+    print(f'{args.orders:,} races in {elapsed:.2f}s ({args.orders * 2 / elapsed:,.0f} requests/s)')
+    ok = True
+    if double:
+        print(f'✗ {double} orders were transitioned more than once')
+        ok = False
+    if missing or not_paid:
+        print(f'✗ {max(missing, not_paid)} orders were never marked PAID')
+        ok = False
+    if no_access:
+        print(f'✗ {no_access} users did not get has_paid')
+        ok = False
+    if not ok:
+        sys.exit(1)
+    print('✓ Exactly one winner per order; every user has access.')
+
+
+if __name__ == '__main__':
+    main()